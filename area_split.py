@@ -0,0 +1,325 @@
+"""
+Erzeugt die Kantons-, Dispo- und Stadt-GeoJSONs lokal aus den nationalen
+Datensätzen, statt für jedes Gebiet ein eigenes Overpass-Query zu schicken.
+
+Aus jedem Query in queries/ werden die Area-Selektoren (z.B.
+area["ISO3166-2"="CH-ZH"]) und allfällige Tag-Filter (z.B.
+["opening_hours"="24/7"]) gelesen. Die Grenzpolygone werden einmalig per
+Overpass geholt und unter .overpass/boundaries/ abgelegt; danach läuft die
+Aufteilung komplett offline per Point-in-Polygon gegen
+defis_switzerland.geojson bzw. defis_liechtenstein.geojson.
+
+Die Ausgabe ist bei gleicher Grenze bytegleich mit dem, was das jeweilige
+Einzel-Query über osm_to_geojson.py ergeben würde (kanonisches Format,
+sortiert nach OSM-ID; geprüft in tests/test_area_split.py).
+Einzige Ausnahme: ["opening_hours"="24/7"] wird inhaltlich ausgewertet
+(opening_hours.py), trifft also auch "Mo-Su 00:00-24:00" usw.; "!=" ist
+das Gegenstück davon.
+
+Verwendung:
+    python area_split.py                       # alle ableitbaren Dateien schreiben
+    python area_split.py --remote-queries      # Queries, die weiterhin Overpass brauchen
+    python area_split.py --refresh-boundaries  # Grenzpolygone neu laden
+"""
+
+import json
+import re
+import sys
+from pathlib import Path
+
+from opening_hours import always_open
+from osm_to_geojson import feature_sort_key, format_feature, write_geojson
+from overpass_query import run_query
+from polygon_index import AreaIndex
+
+QUERY_DIR = Path("queries")
+JSON_DIR = Path("data/json")
+BOUNDARY_DIR = Path(".overpass/boundaries")
+
+# Nationale Datensätze, aus denen alle anderen Dateien abgeleitet werden.
+# Schlüssel ist der Area-Selektor, wie er in den Queries vorkommt.
+SOURCES = {
+    (("ISO3166-1", "=", "CH"),): "defis_switzerland",
+    (("ISO3166-1", "=", "LI"),): "defis_liechtenstein",
+}
+
+BASE_FILTER = ("emergency", "=", "defibrillator")
+
+# Tag-Filter, die lokal inhaltlich statt wörtlich verglichen werden
+SEMANTIC_FILTERS = {
+    ("opening_hours", "24/7"): always_open,
+}
+
+_FILTER_RE = re.compile(r'\[\s*"?([^"\]!=~]+?)"?\s*(!?=)\s*"([^"]*)"\s*\]')
+_AREA_RE = re.compile(r'\barea((?:\s*\[[^\]]*\])+)')
+_ELEMENT_RE = re.compile(r'\b(?:nwr|node|way|relation)((?:\s*\[[^\]]*\])+)\s*\(\s*area')
+
+
+def parse_filters(text: str):
+    """'["a"="b"][c!="d"]' -> (("a", "=", "b"), ("c", "!=", "d")) oder None."""
+    brackets = re.findall(r'\[[^\]]*\]', text)
+    filters = []
+    for b in brackets:
+        m = _FILTER_RE.fullmatch(b)
+        if not m:
+            return None
+        filters.append((m.group(1).strip(), m.group(2), m.group(3)))
+    return tuple(filters)
+
+
+def parse_query(text: str):
+    """Liest Area-Selektoren und Tag-Filter aus einem Overpass-Query.
+
+    Gibt (areas, tag_filters) zurück oder None, falls das Query nicht dem
+    üblichen Muster entspricht und daher nicht lokal abgeleitet werden kann.
+    """
+    text = re.sub(r'//[^\n]*', '', text)
+
+    areas = []
+    for m in _AREA_RE.finditer(text):
+        filters = parse_filters(m.group(1))
+        if not filters:
+            return None
+        areas.append(filters)
+
+    element_filters = set()
+    for m in _ELEMENT_RE.finditer(text):
+        filters = parse_filters(m.group(1))
+        if filters is None or BASE_FILTER not in filters:
+            return None
+        element_filters.add(tuple(f for f in filters if f != BASE_FILTER))
+
+    if not areas or len(element_filters) != 1:
+        return None
+    return tuple(areas), element_filters.pop()
+
+
+def matches_tags(props: dict, tag_filters) -> bool:
+    # Wie bei Overpass trifft "!=" auch zu, wenn der Key ganz fehlt
+    for key, op, value in tag_filters:
+        check = SEMANTIC_FILTERS.get((key, value))
+        hit = bool(check(props.get(key))) if check else props.get(key) == value
+        if hit != (op == "="):
+            return False
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Grenzpolygone
+# ---------------------------------------------------------------------------
+
+def boundary_path(selector) -> Path:
+    slug = "_".join(f"{k}_{v}" for k, _, v in selector)
+    slug = re.sub(r'\W+', '_', slug).strip('_').lower()
+    return BOUNDARY_DIR / f"{slug}.geojson"
+
+
+def _assemble_rings(parts):
+    """Verknüpft die Way-Stücke einer Relation zu geschlossenen Ringen."""
+    rings = []
+    open_parts = []
+    for coords in parts:
+        if len(coords) < 2:
+            continue
+        if coords[0] == coords[-1]:
+            rings.append(coords)
+        else:
+            open_parts.append(list(coords))
+
+    while open_parts:
+        current = open_parts.pop()
+        while current[0] != current[-1]:
+            for i, part in enumerate(open_parts):
+                if part[0] == current[-1]:
+                    current.extend(part[1:])
+                elif part[-1] == current[-1]:
+                    current.extend(reversed(part[:-1]))
+                elif part[-1] == current[0]:
+                    current[:0] = part[:-1]
+                elif part[0] == current[0]:
+                    current[:0] = list(reversed(part[1:]))
+                else:
+                    continue
+                open_parts.pop(i)
+                break
+            else:
+                # Ring lässt sich nicht schliessen (unvollständige Relation)
+                break
+        if current[0] == current[-1] and len(current) >= 4:
+            rings.append(current)
+    return rings
+
+
+def _ring_contains(ring, lon, lat) -> bool:
+    inside = False
+    x1, y1 = ring[-1]
+    for x2, y2 in ring:
+        if (y1 > lat) != (y2 > lat) and lon < (x2 - x1) * (lat - y1) / (y2 - y1) + x1:
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
+
+
+def relation_to_feature(rel: dict) -> dict:
+    """Overpass-Relation ("out geom") -> GeoJSON-Feature mit MultiPolygon."""
+    outer_parts, inner_parts = [], []
+    for member in rel.get("members", []):
+        if member.get("type") != "way" or not member.get("geometry"):
+            continue
+        coords = [[p["lon"], p["lat"]] for p in member["geometry"]]
+        (inner_parts if member.get("role") == "inner" else outer_parts).append(coords)
+
+    polygons = [[ring] for ring in _assemble_rings(outer_parts)]
+    for ring in _assemble_rings(inner_parts):
+        lon, lat = ring[0]
+        for polygon in polygons:
+            if _ring_contains(polygon[0], lon, lat):
+                polygon.append(ring)
+                break
+
+    tags = rel.get("tags", {})
+    return {
+        "type": "Feature",
+        "id": f"relation/{rel['id']}",
+        "properties": {"name": tags.get("name"), "id": f"relation/{rel['id']}"},
+        "geometry": {"type": "MultiPolygon", "coordinates": polygons},
+    }
+
+
+def fetch_boundaries(selectors) -> None:
+    """Holt alle fehlenden Grenzpolygone mit einem einzigen Overpass-Query."""
+    statements = "".join(
+        "rel" + "".join(f'["{k}"{op}"{v}"]' for k, op, v in s) + ";\n" for s in selectors
+    )
+    data = run_query(f"[out:json][timeout:300];\n(\n{statements});\nout geom;")
+
+    BOUNDARY_DIR.mkdir(parents=True, exist_ok=True)
+    for selector in selectors:
+        features = [
+            relation_to_feature(el)
+            for el in data.get("elements", [])
+            if el.get("type") == "relation" and matches_tags(el.get("tags", {}), selector)
+        ]
+        if not features:
+            print(f"  WARNUNG: keine Grenze gefunden für {selector}")
+            continue
+        with open(boundary_path(selector), "w", encoding="utf-8") as f:
+            json.dump({"type": "FeatureCollection", "features": features}, f, ensure_ascii=False)
+        print(f"  Grenze gespeichert: {boundary_path(selector).name}")
+
+
+def load_area(selector, tolerance: float = 0.0) -> AreaIndex:
+    with open(boundary_path(selector), encoding="utf-8") as f:
+        data = json.load(f)
+    return AreaIndex([feat["geometry"] for feat in data["features"]], tolerance)
+
+
+# ---------------------------------------------------------------------------
+# Aufteilung
+# ---------------------------------------------------------------------------
+
+def feature_point(feature):
+    """Repräsentativer Punkt (lon, lat) eines Features, auch für Ways."""
+    c = (feature.get("geometry") or {}).get("coordinates")
+    while isinstance(c, list) and c and isinstance(c[0], list):
+        c = c[0]
+    if isinstance(c, list) and len(c) >= 2:
+        return c[0], c[1]
+    return None, None
+
+
+def load_queries():
+    """Alle Queries mit (areas, tag_filters); None, falls nicht ableitbar."""
+    return {
+        path.stem: parse_query(path.read_text(encoding="utf-8"))
+        for path in sorted(QUERY_DIR.glob("*.overpassql"))
+    }
+
+
+def remote_queries(queries):
+    """Queries, die weiterhin direkt bei Overpass laufen müssen (Quellen zuerst)."""
+    names = [name for name in SOURCES.values() if name in queries]
+    names += [name for name, spec in queries.items() if spec is None and name not in names]
+    return names
+
+
+def split(queries, refresh_boundaries=False) -> None:
+    source_features = {}
+    for name in SOURCES.values():
+        path = JSON_DIR / f"{name}.geojson"
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                source_features[name] = json.load(f).get("features", []) or []
+
+    # Pool aller nationalen Features für Gebiete, die per Polygon bestimmt werden
+    pool = {}
+    for features in source_features.values():
+        for feature in features:
+            pool.setdefault(feature.get("id"), feature)
+    pool = sorted(pool.values(), key=feature_sort_key)
+    points = [feature_point(f) for f in pool]
+
+    derived = {
+        name: spec for name, spec in queries.items()
+        if spec is not None and name not in SOURCES.values()
+    }
+
+    selectors = {a for areas, _ in derived.values() for a in areas if a not in SOURCES}
+    missing = sorted(s for s in selectors if refresh_boundaries or not boundary_path(s).exists())
+    if missing:
+        print(f"Lade {len(missing)} Grenzpolygone von Overpass...")
+        fetch_boundaries(missing)
+
+    area_index = {s: load_area(s) for s in selectors if boundary_path(s).exists()}
+    membership = {}
+    for selector, name in SOURCES.items():
+        ids = {f.get("id") for f in source_features.get(name, [])}
+        membership[selector] = {i for i, f in enumerate(pool) if f.get("id") in ids}
+    lons = [p[0] for p in points]
+    lats = [p[1] for p in points]
+    for selector, index in area_index.items():
+        membership[selector] = {i for i, inside in enumerate(index.contains_many(lons, lats)) if inside}
+
+    # Ein Feature landet in mehreren Dateien (Kanton, Dispo, 24h, ...) und
+    # wird trotzdem nur einmal serialisiert.
+    rendered_cache = {}
+
+    def render(feature):
+        key = id(feature)
+        if key not in rendered_cache:
+            rendered_cache[key] = format_feature(feature)
+        return rendered_cache[key]
+
+    for name, (areas, tag_filters) in sorted(derived.items()):
+        if len(areas) == 1 and areas[0] in SOURCES:
+            source = SOURCES[areas[0]]
+            if source not in source_features:
+                print(f"  FEHLER bei {name}: Quelle {source}.geojson fehlt")
+                continue
+            candidates = source_features[source]
+        else:
+            if any(a not in membership for a in areas):
+                print(f"  FEHLER bei {name}: Grenzpolygon fehlt")
+                continue
+            selected = set()
+            for a in areas:
+                selected |= membership[a]
+            candidates = [pool[i] for i in sorted(selected)]
+
+        features = [f for f in candidates if matches_tags(f.get("properties") or {}, tag_filters)]
+        write_geojson(features, JSON_DIR / f"{name}.geojson", render)
+        print(f"  {name}.geojson ({len(features)} Features)")
+
+
+def main():
+    queries = load_queries()
+
+    if "--remote-queries" in sys.argv[1:]:
+        print("\n".join(remote_queries(queries)))
+        return
+
+    split(queries, refresh_boundaries="--refresh-boundaries" in sys.argv[1:])
+
+
+if __name__ == "__main__":
+    main()
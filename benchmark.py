@@ -0,0 +1,364 @@
+"""
+Benchmarks für die Daten-Pipeline, gegen die echten Daten aus data/json.
+
+Gemessen werden (pro Datensatz):
+- osm_to_geojson: Overpass-JSON -> GeoJSON-Text (convert + dumps_geojson)
+- converter:      converter.geojson_to_csv
+- diff:           zwei Stände laden, scripts/geojson_diff.diff, render_html
+- validation:     scripts/geojson_validation.py (Bounding Box + Duplikate;
+                  ohne Gebietsgrenzen, die bräuchten Overpass)
+- weekly_report:  scripts/build_weekly_report.py aus einem Pending-Store
+
+Datensätze:
+- x1:   alle Defis aus data/json, jeder einmal (nach OSM-ID), als eine
+        nationale Datei im Format von osm_to_geojson.py
+- x10, x100: synthetisch hochskaliert – Kopien mit neuen IDs und leicht
+        verschobenen Koordinaten (deterministisch)
+
+Für den Diff wird ein zweiter Stand erzeugt (1% umbenannt, 0.2% um 200 m
+verschoben, je 0.5% neu/gelöscht), für den Wochenreport ein Pending-Store
+mit Einträgen für 1% der Defis.
+
+Jeder Fall läuft in einem eigenen Python-Prozess; gemessen werden die
+Laufzeit der Operation selbst (ohne Aufbau der Eingaben), der maximale
+Speicher (peak RSS) des Prozesses und Features pro Sekunde.
+
+Baselines liegen in .benchmark/baseline.json. Ohne --save-baseline wird
+gegen sie verglichen; ist ein Fall um mehr als --tolerance (Standard 30%)
+langsamer oder speicherhungriger, endet das Script mit Exit-Code 1. Die
+Baseline gilt nur für die Maschine, auf der sie erstellt wurde; der Workflow
+benchmark.yml misst deshalb Basis- und neuen Commit auf demselben Runner.
+
+Verwendung (aus dem Repo-Root):
+    python benchmark.py                       # x1 und x10, gegen Baseline
+    python benchmark.py --scales 1,10,100     # inkl. x100 (mehrere GB RAM)
+    python benchmark.py --only diff,converter --save-baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parent
+SCRIPTS = REPO / "scripts"
+JSON_DIR = REPO / "data" / "json"
+BASELINE_FILE = REPO / ".benchmark" / "baseline.json"
+
+COMPONENTS = ("osm_to_geojson", "converter", "diff", "validation", "weekly_report")
+DEFAULT_SCALES = "1,10"
+DEFAULT_TOLERANCE = 0.3
+
+# Abstand der IDs zwischen den Kopien eines hochskalierten Datensatzes
+ID_STRIDE = 10 ** 11
+
+
+# --- Eingaben erzeugen -----------------------------------------------------
+
+def corpus_features() -> list:
+    """Alle Defis aus data/json, jeder nur einmal."""
+    seen = {}
+    for path in sorted(JSON_DIR.glob("*.geojson")):
+        with open(path, encoding="utf-8") as f:
+            for feature in json.load(f).get("features", []):
+                seen.setdefault(feature.get("id"), feature)
+    return list(seen.values())
+
+
+def _renumber(feature, copy: int, rng) -> dict:
+    osm_type, _, number = feature["id"].partition("/")
+    key = f"{osm_type}/{int(number) + copy * ID_STRIDE}"
+    lon, lat = feature["geometry"]["coordinates"][:2]
+    properties = dict(feature["properties"], id=key)
+    return {
+        "type": "Feature",
+        "id": key,
+        "properties": properties,
+        "geometry": {"type": "Point", "coordinates": [
+            round(lon + rng.uniform(-0.05, 0.05), 7), round(lat + rng.uniform(-0.05, 0.05), 7)]},
+    }
+
+
+def scaled(features, scale: int) -> list:
+    rng = random.Random(scale)
+    result = list(features)
+    for copy in range(1, scale):
+        result.extend(_renumber(f, copy, rng) for f in features)
+    return result
+
+
+def mutated(features) -> list:
+    """Zweiter Stand für den Diff."""
+    rng = random.Random(1)
+    result = []
+    for feature in features:
+        r = rng.random()
+        if r < 0.005:
+            continue  # gelöscht
+        feature = json.loads(json.dumps(feature))
+        if r < 0.015:
+            feature["properties"]["name"] = f"{feature['properties'].get('name', '')} (umbenannt)"
+        elif r < 0.017:
+            feature["geometry"]["coordinates"][1] = round(feature["geometry"]["coordinates"][1] + 0.0018, 7)
+        result.append(feature)
+    added = rng.sample(features, max(1, len(features) // 200))
+    result.extend(_renumber(f, 999, rng) for f in added)
+    return result
+
+
+def overpass_json(features) -> dict:
+    """Overpass-Antwort ("out body"), aus der osm_to_geojson dieselben
+    Features erzeugt."""
+    elements = []
+    for feature in features:
+        osm_type, _, number = feature["id"].partition("/")
+        lon, lat = feature["geometry"]["coordinates"][:2]
+        tags = {k: v for k, v in feature["properties"].items() if k != "id"}
+        elements.append({"type": "node", "id": int(number), "lat": lat, "lon": lon, "tags": tags})
+    return {"version": 0.6, "osm3s": {"timestamp_osm_base": "2026-01-01T00:00:00Z"}, "elements": elements}
+
+
+def prepare(workdir: Path, scale: int) -> dict:
+    """Schreibt alle Eingaben eines Datensatzes nach workdir/x<scale>/."""
+    sys.path.insert(0, str(SCRIPTS))
+    sys.path.insert(0, str(REPO))
+    from osm_to_geojson import dumps_geojson
+    from pending_store import PendingStore
+
+    directory = workdir / f"x{scale}"
+    directory.mkdir(parents=True, exist_ok=True)
+    features = scaled(corpus_features(), scale)
+    paths = {
+        "geojson": directory / "bench_national.geojson",
+        "geojson_new": directory / "bench_national_new.geojson",
+        "overpass": directory / "bench_overpass.json",
+        "pending": directory / "bench_pending.sqlite",
+    }
+    paths["geojson"].write_text(dumps_geojson(features), encoding="utf-8")
+    paths["geojson_new"].write_text(dumps_geojson(mutated(features)), encoding="utf-8")
+    paths["overpass"].write_text(json.dumps(overpass_json(features)), encoding="utf-8")
+    if paths["pending"].exists():
+        paths["pending"].unlink()
+    with PendingStore(str(paths["pending"])) as store:
+        store.upsert(_pending_entries(features, max(1, len(features) // 100)))
+        pending = store.count()
+    return {"features": len(features), "pending_entries": pending, **{k: str(v) for k, v in paths.items()}}
+
+
+def _pending_entries(features, n: int) -> list:
+    rng = random.Random(2)
+    entries = []
+    for i, feature in enumerate(rng.sample(features, min(n, len(features)))):
+        props = feature["properties"]
+        lon, lat = feature["geometry"]["coordinates"][:2]
+        entries.append({
+            "key": feature["id"],
+            "name": props.get("name", "(ohne Name)"),
+            "address": None,
+            "lon": lon,
+            "lat": lat,
+            "fields": [("operator", props.get("operator"), "Neuer Betreiber"),
+                       ("phone", props.get("phone"), f"+41 00 000 {i % 100:02d} {i % 97:02d}")],
+            "detected_at": f"2026-01-0{1 + i % 7}T12:00:00+00:00",
+        })
+    return entries
+
+
+# --- Fälle (laufen im Kind-Prozess) ------------------------------------------
+
+def run_case(component: str, inputs: dict) -> dict:
+    """Führt einen Fall aus und gibt {seconds, features} zurück."""
+    sys.path.insert(0, str(SCRIPTS))
+    sys.path.insert(0, str(REPO))
+    workdir = Path(inputs["geojson"]).parent
+    os.chdir(workdir)
+    features = inputs["features"]
+
+    if component == "osm_to_geojson":
+        from osm_to_geojson import convert, dumps_geojson
+        t0 = time.perf_counter()
+        with open(inputs["overpass"], encoding="utf-8") as f:
+            text = dumps_geojson(convert(json.load(f)))
+        seconds = time.perf_counter() - t0
+        assert len(text) > 0
+
+    elif component == "converter":
+        import converter
+        t0 = time.perf_counter()
+        converter.geojson_to_csv(Path(inputs["geojson"]), workdir / "bench_national.csv")
+        seconds = time.perf_counter() - t0
+
+    elif component == "diff":
+        from defi_features import changed_indexes, load_snapshot
+        from geojson_diff import diff, render_html
+        t0 = time.perf_counter()
+        render_html(diff(*changed_indexes(load_snapshot(inputs["geojson"]), load_snapshot(inputs["geojson_new"]))))
+        seconds = time.perf_counter() - t0
+
+    elif component == "validation":
+        sys.argv = ["geojson_validation.py", inputs["geojson"]]
+        t0 = time.perf_counter()
+        try:
+            runpy.run_path(str(SCRIPTS / "geojson_validation.py"), run_name="__main__")
+        except SystemExit:
+            pass
+        seconds = time.perf_counter() - t0
+
+    elif component == "weekly_report":
+        features = inputs["pending_entries"]
+        sys.argv = ["build_weekly_report.py", inputs["pending"], "Benchmark", str(workdir / "bench_weekly.html")]
+        t0 = time.perf_counter()
+        runpy.run_path(str(SCRIPTS / "build_weekly_report.py"), run_name="__main__")
+        seconds = time.perf_counter() - t0
+
+    else:
+        raise ValueError(f"Unbekannte Komponente: {component}")
+
+    return {"seconds": seconds, "features": features}
+
+
+def measure(component: str, inputs: dict) -> dict:
+    """Startet einen Fall in einem eigenen Prozess, mit peak RSS des Kinds."""
+    proc = subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve()), "--case", component, json.dumps(inputs)],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding="utf-8",
+    )
+    out, err = proc.communicate()
+    if proc.returncode:
+        raise RuntimeError(f"{component} fehlgeschlagen:\n{err.strip()}")
+    result = json.loads(out.strip().splitlines()[-1])
+    result["features_per_s"] = result["features"] / result["seconds"] if result["seconds"] else 0.0
+    return result
+
+
+def peak_rss_mb() -> float:
+    """Maximaler Speicher des eigenen Prozesses.
+
+    Bevorzugt VmHWM aus /proc: ru_maxrss wird unter Linux über exec()
+    hinweg vom Elternprozess übernommen und würde dessen Spitze (Aufbau der
+    Eingaben) mitzählen.
+    """
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _child_main(component: str, inputs_json: str):
+    # Ausgaben der gemessenen Scripts nicht mit dem Ergebnis vermischen
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w", encoding="utf-8")
+    result = run_case(component, json.loads(inputs_json))
+    sys.stdout = real_stdout
+    result["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps(result))
+
+
+# --- Baseline und Ausgabe ---------------------------------------------------
+
+def load_baseline() -> dict:
+    if BASELINE_FILE.exists():
+        with open(BASELINE_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def save_baseline(results: dict):
+    baseline = load_baseline()
+    baseline.setdefault("cases", {}).update(results)
+    baseline["machine"] = f"{platform.node()} {platform.machine()} Python {platform.python_version()}"
+    BASELINE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare(case: str, result: dict, baseline: dict, tolerance: float) -> str:
+    """Leerer String wenn ok, sonst Beschreibung der Regression."""
+    base = baseline.get("cases", {}).get(case)
+    if not base:
+        return ""
+    problems = []
+    if result["seconds"] > base["seconds"] * (1 + tolerance):
+        problems.append(f"Zeit {result['seconds']:.2f}s statt {base['seconds']:.2f}s")
+    if result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + tolerance):
+        problems.append(f"RSS {result['peak_rss_mb']:.0f} MB statt {base['peak_rss_mb']:.0f} MB")
+    return ", ".join(problems)
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--case":
+        _child_main(sys.argv[2], sys.argv[3])
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default=DEFAULT_SCALES,
+                        help=f"Skalierungen, kommagetrennt (Standard {DEFAULT_SCALES}; 100 braucht mehrere GB RAM)")
+    parser.add_argument("--only", default=",".join(COMPONENTS),
+                        help="Nur diese Komponenten, kommagetrennt")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Ergebnisse als neue Baseline speichern statt vergleichen")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Erlaubte Verschlechterung gegenüber der Baseline (0.3 = 30%%)")
+    parser.add_argument("--json", help="Ergebnisse zusätzlich als JSON in diese Datei schreiben")
+    parser.add_argument("--workdir", help="Verzeichnis für die erzeugten Datensätze (Standard: temporär)")
+    args = parser.parse_args()
+
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    components = [c for c in args.only.split(",") if c.strip()]
+    unknown = set(components) - set(COMPONENTS)
+    if unknown:
+        parser.error(f"Unbekannte Komponenten: {', '.join(sorted(unknown))}")
+
+    baseline = {} if args.save_baseline else load_baseline()
+    results = {}
+    regressions = []
+    with tempfile.TemporaryDirectory(prefix="defi-bench-") as tmp:
+        workdir = Path(args.workdir or tmp).resolve()
+        print(f"{'Fall':<26} {'Features':>10} {'Zeit':>9} {'Features/s':>12} {'peak RSS':>10}")
+        for scale in scales:
+            inputs = prepare(workdir, scale)
+            for component in components:
+                case = f"{component}@x{scale}"
+                result = measure(component, inputs)
+                results[case] = result
+                problem = compare(case, result, baseline, args.tolerance)
+                if problem:
+                    regressions.append(f"{case}: {problem}")
+                print(f"{case:<26} {result['features']:>10} {result['seconds']:>8.2f}s "
+                      f"{result['features_per_s']:>12,.0f} {result['peak_rss_mb']:>7.0f} MB"
+                      + ("  <- REGRESSION" if problem else ""))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        save_baseline(results)
+        print(f"\nBaseline gespeichert: {BASELINE_FILE.relative_to(REPO)}")
+    elif not baseline:
+        print(f"\nKeine Baseline vorhanden ({BASELINE_FILE.relative_to(REPO)}), "
+              f"mit --save-baseline anlegen.")
+    elif regressions:
+        print(f"\n{len(regressions)} Regression(en) gegenüber der Baseline "
+              f"(Toleranz {args.tolerance:.0%}):")
+        print("\n".join(f"  {r}" for r in regressions))
+        sys.exit(1)
+    else:
+        print(f"\nKeine Regression gegenüber der Baseline (Toleranz {args.tolerance:.0%}).")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,66 +1,330 @@
 import json
 import csv
+import hashlib
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from opening_hours import always_open
+from run_report import RunReport
+
+# Parquet-Export ist optional: ohne pyarrow werden nur CSVs geschrieben
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
 JSON_DIR = Path("data/json")
 CSV_DIR = Path("data/csv")
+PARQUET_DIR = Path("data/parquet")
+
+# Partitionierter Gesamtdatensatz (Kantone + Liechtenstein), Partition "kanton"
+NATIONAL_DATASET = PARQUET_DIR / "defis_national"
+NATIONAL_SOURCES = "defis_kt_*.geojson"
+LIECHTENSTEIN_SOURCE = "defis_liechtenstein.geojson"
+
+# Merkt sich pro GeoJSON den Inhalts-Hash der zuletzt konvertierten Version
+MANIFEST_FILE = Path(".converter/manifest.json")
+
+# Erhöhen, wenn sich das CSV- oder Parquet-Format ändert -> alle Dateien neu konvertieren
+CONVERTER_VERSION = 3
+
+# Feste Spalten vor den Tags; always_available ist aus opening_hours
+# abgeleitet (yes/no, leer wenn unbekannt)
+BASE_COLS = ["osm_id", "osm_type", "lat", "lon", "always_available"]
 
 CSV_DIR.mkdir(parents=True, exist_ok=True)
 
 
-def geojson_to_csv(geojson_path: Path, csv_path: Path) -> None:
+# Grösse der Lese-Blöcke beim Streamen; ein einzelnes Feature darf grösser
+# sein, der Puffer wächst dann bis es vollständig ist.
+CHUNK_SIZE = 1 << 16
+
+_decoder = json.JSONDecoder()
+_WS = " \t\n\r"
+
+
+class _Reader:
+    """Puffert eine Textdatei blockweise und dekodiert einzelne JSON-Werte."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Nächstes Zeichen ohne Whitespace ('' am Dateiende)."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"'{char}' erwartet bei Zeichen {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Wert ist noch nicht vollständig im Puffer
+                if not self._fill():
+                    raise
+                continue
+            # Zahlen am Pufferende könnten abgeschnitten sein
+            if end == len(self.buf) and not isinstance(obj, (dict, list, str)) and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_features(geojson_path: Path):
+    """Liefert die Features einer FeatureCollection einzeln, ohne die ganze
+    Datei zu laden (Speicherbedarf: ein Feature plus ein Leseblock)."""
     with open(geojson_path, encoding="utf-8") as f:
-        data = json.load(f)
+        r = _Reader(f)
+        r.expect("{")
+        while r.peek() != "}":
+            key = r.value()
+            r.expect(":")
+            if key != "features":
+                r.value()
+            else:
+                r.expect("[")
+                while r.peek() != "]":
+                    yield r.value()
+                    if r.peek() == ",":
+                        r.pos += 1
+                r.expect("]")
+            if r.peek() == ",":
+                r.pos += 1
 
-    features = data.get("features", [])
-    if not features:
+
+def feature_to_row(feature: dict) -> dict:
+    row = {}
+
+    # OSM Node-ID aus dem "id"-Feld (z.B. "node/123456")
+    raw_id = feature.get("id", "")
+    row["osm_id"] = raw_id.split("/")[-1] if "/" in str(raw_id) else raw_id
+    row["osm_type"] = raw_id.split("/")[0] if "/" in str(raw_id) else ""
+
+    # Koordinaten aus geometry
+    geometry = feature.get("geometry") or {}
+    coords = geometry.get("coordinates", [])
+    if coords and len(coords) >= 2:
+        row["lon"] = coords[0]
+        row["lat"] = coords[1]
+    else:
+        row["lon"] = ""
+        row["lat"] = ""
+
+    # Alle properties flach hinzufügen
+    properties = feature.get("properties") or {}
+    for key, value in properties.items():
+        row[key] = value
+
+    available = always_open(properties.get("opening_hours"))
+    row["always_available"] = "" if available is None else ("yes" if available else "no")
+
+    return row
+
+
+def geojson_to_csv(geojson_path: Path, csv_path: Path) -> int:
+    # 1. Durchgang: nur die Spalten sammeln (union), Reihenfolge: Basis-Felder zuerst
+    all_keys = set(BASE_COLS)
+    count = 0
+    for feature in iter_features(geojson_path):
+        all_keys.update((feature.get("properties") or {}).keys())
+        count += 1
+
+    if not count:
         print(f"  Keine Features gefunden: {geojson_path.name}")
-        return
+        return 0
 
-    rows = []
-    for feature in features:
-        row = {}
-
-        # OSM Node-ID aus dem "id"-Feld (z.B. "node/123456")
-        raw_id = feature.get("id", "")
-        row["osm_id"] = raw_id.split("/")[-1] if "/" in str(raw_id) else raw_id
-        row["osm_type"] = raw_id.split("/")[0] if "/" in str(raw_id) else ""
-
-        # Koordinaten aus geometry
-        geometry = feature.get("geometry") or {}
-        coords = geometry.get("coordinates", [])
-        if coords and len(coords) >= 2:
-            row["lon"] = coords[0]
-            row["lat"] = coords[1]
-        else:
-            row["lon"] = ""
-            row["lat"] = ""
-
-        # Alle properties flach hinzufügen
-        properties = feature.get("properties") or {}
-        for key, value in properties.items():
-            row[key] = value
-
-        rows.append(row)
-
-    # Alle Spalten über alle Rows sammeln (union), Reihenfolge: Basis-Felder zuerst
-    base_cols = ["osm_id", "osm_type", "lat", "lon"]
-    all_keys = set()
-    for row in rows:
-        all_keys.update(row.keys())
-    extra_cols = sorted(all_keys - set(base_cols))
-    fieldnames = base_cols + extra_cols
+    extra_cols = sorted(all_keys - set(BASE_COLS))
+    fieldnames = BASE_COLS + extra_cols
 
+    # 2. Durchgang: jede Zeile direkt schreiben, ohne Zwischenliste
     with open(csv_path, "w", encoding="utf-8", newline="") as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
         writer.writeheader()
-        writer.writerows(rows)
+        for feature in iter_features(geojson_path):
+            writer.writerow(feature_to_row(feature))
+
+    print(f"  {geojson_path.name} → {csv_path.name} ({count} Einträge, {len(fieldnames)} Spalten)")
+    return count
+
+
+def _int_or_none(value):
+    return int(value) if str(value).isdigit() else None
+
 
-    print(f"  {geojson_path.name} → {csv_path.name} ({len(rows)} Einträge, {len(fieldnames)} Spalten)")
+def _float_or_none(value):
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def rows_to_table(rows):
+    """Zeilen (wie im CSV) -> Arrow-Tabelle mit festen Typen.
+
+    osm_id als int64, lat/lon als float64, alle übrigen Spalten (Tags)
+    dictionary-kodiert, da sich die Werte stark wiederholen.
+    """
+    columns = {}
+    n = 0
+    for row in rows:
+        for key, value in row.items():
+            if key not in columns:
+                columns[key] = [None] * n
+            columns[key].append(value)
+        n += 1
+        for values in columns.values():
+            if len(values) < n:
+                values.append(None)
+    if not n:
+        return None
+
+    arrays = {
+        "osm_id": pa.array([_int_or_none(v) for v in columns["osm_id"]], type=pa.int64()),
+        "osm_type": pa.array(columns["osm_type"], type=pa.string()).dictionary_encode(),
+        "lat": pa.array([_float_or_none(v) for v in columns["lat"]], type=pa.float64()),
+        "lon": pa.array([_float_or_none(v) for v in columns["lon"]], type=pa.float64()),
+        "always_available": pa.array([{"yes": True, "no": False}.get(v) for v in columns["always_available"]],
+                                     type=pa.bool_()),
+    }
+    for key in sorted(set(columns) - set(BASE_COLS)):
+        values = [None if v is None or v == "" else str(v) for v in columns[key]]
+        arrays[key] = pa.array(values, type=pa.string()).dictionary_encode()
+    return pa.table(arrays)
+
+
+def geojson_to_parquet(geojson_path: Path, parquet_path: Path) -> int:
+    table = rows_to_table(feature_to_row(f) for f in iter_features(geojson_path))
+    if table is None:
+        return 0
+    pq.write_table(table, parquet_path, compression="zstd")
+    print(f"  {geojson_path.name} → {parquet_path.name} ({table.num_rows} Einträge)")
+    return table.num_rows
+
+
+def build_national_dataset() -> int:
+    """Alle Kantone plus Liechtenstein als ein nach "kanton" partitionierter Datensatz."""
+    def rows():
+        sources = sorted(JSON_DIR.glob(NATIONAL_SOURCES)) + [JSON_DIR / LIECHTENSTEIN_SOURCE]
+        for path in sources:
+            if not path.exists():
+                continue
+            kanton = "li" if path.name == LIECHTENSTEIN_SOURCE else path.stem.rsplit("_", 1)[-1]
+            for feature in iter_features(path):
+                row = feature_to_row(feature)
+                row["kanton"] = kanton
+                yield row
+
+    table = rows_to_table(rows())
+    if table is None:
+        return 0
+    # Partitionsspalte als einfacher String, nicht dictionary-kodiert
+    table = table.set_column(table.schema.get_field_index("kanton"), "kanton",
+                             table.column("kanton").cast(pa.string()))
+    ds.write_dataset(
+        table, NATIONAL_DATASET, format="parquet",
+        partitioning=["kanton"], partitioning_flavor="hive",
+        existing_data_behavior="delete_matching",
+        file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+    )
+    print(f"  Gesamtdatensatz → {NATIONAL_DATASET} ({table.num_rows} Einträge)")
+    return table.num_rows
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_manifest() -> dict:
+    try:
+        with open(MANIFEST_FILE, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if manifest.get("version") != CONVERTER_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+
+def save_manifest(files: dict) -> None:
+    MANIFEST_FILE.parent.mkdir(parents=True, exist_ok=True)
+    with open(MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump({"version": CONVERTER_VERSION, "files": files}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def csv_path_for(geojson_path: Path) -> Path:
+    return CSV_DIR / (geojson_path.stem + ".csv")
+
+
+def parquet_path_for(geojson_path: Path) -> Path:
+    return PARQUET_DIR / (geojson_path.stem + ".parquet")
+
+
+def outputs_exist(geojson_path: Path) -> bool:
+    if not csv_path_for(geojson_path).exists():
+        return False
+    return pa is None or parquet_path_for(geojson_path).exists()
+
+
+def _timed(spans: list, name: str, func, source: Path, target: Path) -> None:
+    t0 = time.monotonic()
+    features = func(source, target)
+    spans.append((name, time.monotonic() - t0, {
+        "features": features,
+        "bytes_in": source.stat().st_size,
+        "bytes_out": target.stat().st_size if target.exists() else None,
+    }))
+
+
+def convert_one(geojson_path: Path):
+    """Worker für den Prozess-Pool: gibt (None oder Fehlermeldung, Spans) zurück.
+
+    Die Spans (Name, Sekunden, Attribute) werden im Hauptprozess in den
+    Run-Report übernommen.
+    """
+    spans = []
+    try:
+        _timed(spans, "csv", geojson_to_csv, geojson_path, csv_path_for(geojson_path))
+        if pa is not None:
+            _timed(spans, "parquet", geojson_to_parquet, geojson_path, parquet_path_for(geojson_path))
+        return None, spans
+    except Exception as e:
+        return str(e), spans
 
 
 def main():
+    full = "--full" in sys.argv[1:]
     geojson_files = sorted(JSON_DIR.glob("*.geojson"))
 
     if not geojson_files:
@@ -69,13 +333,43 @@ def main():
 
     print(f"{len(geojson_files)} GeoJSON-Dateien gefunden\n")
 
-    for geojson_path in geojson_files:
-        csv_path = CSV_DIR / (geojson_path.stem + ".csv")
+    report = RunReport("converter")
+    manifest = {} if full else load_manifest()
+    with report.span("hash"):
+        hashes = {p.name: file_hash(p) for p in geojson_files}
+    todo = [
+        p for p in geojson_files
+        if manifest.get(p.name) != hashes[p.name] or not outputs_exist(p)
+    ]
+    print(f"{len(geojson_files) - len(todo)} unverändert, {len(todo)} zu konvertieren\n")
+    if pa is None:
+        print("pyarrow nicht installiert - nur CSV, kein Parquet-Export\n")
+    else:
+        PARQUET_DIR.mkdir(parents=True, exist_ok=True)
+
+    with ProcessPoolExecutor() as pool:
+        results = pool.map(convert_one, todo)
+        for geojson_path, (error, spans) in zip(todo, results):
+            for name, seconds, attrs in spans:
+                report.add(name, seconds, geojson_path.stem, **attrs)
+            if error:
+                print(f"  FEHLER bei {geojson_path.name}: {error}")
+                manifest.pop(geojson_path.name, None)
+            else:
+                manifest[geojson_path.name] = hashes[geojson_path.name]
+
+    national_inputs = {p.name for p in JSON_DIR.glob(NATIONAL_SOURCES)} | {LIECHTENSTEIN_SOURCE}
+    if pa is not None and (not NATIONAL_DATASET.exists() or any(p.name in national_inputs for p in todo)):
         try:
-            geojson_to_csv(geojson_path, csv_path)
+            with report.span("national") as span:
+                span["features"] = build_national_dataset()
         except Exception as e:
-            print(f"  FEHLER bei {geojson_path.name}: {e}")
+            print(f"  FEHLER beim Gesamtdatensatz: {e}")
+
+    # Einträge für gelöschte GeoJSON-Dateien nicht mitschleppen
+    save_manifest({name: h for name, h in manifest.items() if name in hashes})
 
+    report.finish()
     print("\nFertig.")
 
 
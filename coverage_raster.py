@@ -0,0 +1,338 @@
+"""
+Abdeckungsanalyse: Distanz zum nächsten öffentlich zugänglichen Defi als
+Raster pro Kanton.
+
+- Eingabe: data/json/defis_kt_*.geojson (plus Liechtenstein, damit Zellen
+  an der Grenze zu SG/GR den nächsten Defi auch jenseits der Grenze finden).
+  Als öffentlich zählt jeder Defi ohne einschränkendes access-Tag
+  (RESTRICTED_ACCESS)
+- Raster im Schweizer Landeskoordinatensystem LV95 (EPSG:2056), Zellen von
+  CELL_M Metern, ausgerichtet am nationalen Gitter; Zellen ausserhalb des
+  Kantons (Grenzpolygon aus .overpass/boundaries/, siehe area_split.py)
+  sind NODATA. Fehlt das Grenzpolygon, gilt die Bounding Box der Defis
+- Distanz per Distanztransformation mit NumPy: erst pro Spalte der Abstand
+  zur nächsten Defi-Zelle (kumulative Maxima/Minima), dann pro Zeile das
+  Minimum über alle Versätze bis MAX_DISTANCE_M – ganze Arrays pro Schritt,
+  keine Python-Schleife über Zellen. Exakt (zwischen Zellmitten) bis
+  MAX_DISTANCE_M, weiter entfernte Zellen erhalten MAX_DISTANCE_M
+- Ausgabe pro Kanton data/coverage/<id>.npz (uint16 Meter, zlib-komprimiert,
+  mit Ursprung und Zellgrösse) und data/coverage/summary.json mit
+  Kennzahlen (Median, 90%-Quantil, Anteil der Fläche innert THRESHOLDS_M).
+  Nur summary.json wird committet; die Raster veröffentlicht der
+  Convert-Workflow als Artefakt "coverage-raster"
+- Neu gerechnet werden nur Kantone, deren Eingaben sich geändert haben:
+  pro Kanton ein Hash über die Defi-Zellen im Rechengebiet, das
+  Grenzpolygon und die Parameter (.coverage_raster/manifest.json)
+
+Verwendung:
+    python coverage_raster.py            # geänderte Kantone neu rechnen
+    python coverage_raster.py --full     # alle
+    python coverage_raster.py zh be      # nur diese
+
+Raster lesen:
+    r = np.load("data/coverage/zh.npz")
+    dist = r["distance_m"]               # Zeile 0 = Norden
+    e = r["origin"][0] + (col + 0.5) * r["cell_m"]
+    n = r["origin"][1] - (row + 0.5) * r["cell_m"]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path
+
+# NumPy ist für die Rasterberechnung nötig
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import area_split
+
+JSON_DIR = Path("data/json")
+SOURCES = "defis_kt_*.geojson"
+# Nur als Nachbarn für Zellen an der Landesgrenze, kein eigenes Raster
+NEIGHBOUR_SOURCES = ("defis_liechtenstein.geojson",)
+
+OUTPUT_DIR = Path("data/coverage")
+SUMMARY_FILE = OUTPUT_DIR / "summary.json"
+MANIFEST_FILE = Path(".coverage_raster/manifest.json")
+
+CELL_M = int(os.environ.get("COVERAGE_CELL_M", "100"))
+MAX_DISTANCE_M = int(os.environ.get("COVERAGE_MAX_DISTANCE_M", "5000"))
+THRESHOLDS_M = (250, 500, 1000, 2000)
+NODATA = 65535
+
+RESTRICTED_ACCESS = {"no", "private", "customers", "employees", "residents", "members", "permit"}
+
+# Erhöhen, wenn sich Berechnung oder Ausgabeformat ändern -> alles neu
+COVERAGE_VERSION = 1
+
+# Punkte pro contains_many()-Aufruf, begrenzt den Speicher der Punkt/Kanten-Paare
+MASK_CHUNK = 100_000
+
+
+def wgs84_to_lv95(lon, lat):
+    """WGS84 -> LV95 (E, N) nach den Näherungsformeln von swisstopo (~1 m)."""
+    phi = (np.asarray(lat, dtype=float) * 3600 - 169028.66) / 10000
+    lam = (np.asarray(lon, dtype=float) * 3600 - 26782.5) / 10000
+    e = (2600072.37 + 211455.93 * lam - 10938.51 * lam * phi
+         - 0.36 * lam * phi ** 2 - 44.54 * lam ** 3)
+    n = (1200147.07 + 308807.95 * phi + 3745.25 * lam ** 2 + 76.63 * phi ** 2
+         - 194.56 * lam ** 2 * phi + 119.79 * phi ** 3)
+    return e, n
+
+
+def lv95_to_wgs84(e, n):
+    """LV95 -> WGS84 (lon, lat), Umkehrung von wgs84_to_lv95."""
+    y = (np.asarray(e, dtype=float) - 2600000) / 1e6
+    x = (np.asarray(n, dtype=float) - 1200000) / 1e6
+    lam = 2.6779094 + 4.728982 * y + 0.791484 * y * x + 0.1306 * y * x ** 2 - 0.0436 * y ** 3
+    phi = (16.9023892 + 3.238272 * x - 0.270978 * y ** 2 - 0.002528 * x ** 2
+           - 0.0447 * y ** 2 * x - 0.0140 * x ** 3)
+    return lam * 100 / 36, phi * 100 / 36
+
+
+def is_public(props: dict) -> bool:
+    return props.get("access") not in RESTRICTED_ACCESS
+
+
+def file_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def kanton_id(path: Path) -> str:
+    return path.stem.rsplit("_", 1)[-1]
+
+
+def load_points(paths):
+    """Öffentliche Defis aller Dateien -> (E, N) als Arrays, dazu die
+    eigenen Punkte pro Kanton. Doppelte OSM-IDs zählen einmal."""
+    seen = set()
+    es, ns, own = [], [], {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            features = json.load(f).get("features", []) or []
+        lons, lats = [], []
+        for feature in features:
+            coords = (feature.get("geometry") or {}).get("coordinates")
+            if not coords or not is_public(feature.get("properties") or {}):
+                continue
+            lons.append(coords[0])
+            lats.append(coords[1])
+            if feature.get("id") not in seen:
+                seen.add(feature.get("id"))
+                es.append(coords[0])
+                ns.append(coords[1])
+        if path.name not in NEIGHBOUR_SOURCES:
+            own[kanton_id(path)] = np.stack(wgs84_to_lv95(lons, lats), axis=1).reshape(-1, 2)
+    e, n = wgs84_to_lv95(es, ns)
+    return np.stack([e, n], axis=1).reshape(-1, 2), own
+
+
+def load_boundary(kid):
+    """AreaIndex des Kantons und Pfad der Grenzdatei, (None, None) wenn nicht vorhanden."""
+    query = area_split.QUERY_DIR / f"defis_kt_{kid}.overpassql"
+    spec = area_split.parse_query(query.read_text(encoding="utf-8")) if query.exists() else None
+    if spec is None or len(spec[0]) != 1:
+        return None, None
+    path = area_split.boundary_path(spec[0][0])
+    if not path.exists():
+        return None, None
+    return area_split.load_area(spec[0][0]), path
+
+
+def grid_extent(area, own_points):
+    """(e_min, n_min, e_max, n_max) auf CELL_M ausgerichtet."""
+    if area is not None and area.parts:
+        lon_min = min(p[0] for p in area.parts)
+        lon_max = max(p[1] for p in area.parts)
+        lat_min = min(p[2] for p in area.parts)
+        lat_max = max(p[3] for p in area.parts)
+        e, n = wgs84_to_lv95([lon_min, lon_min, lon_max, lon_max], [lat_min, lat_max, lat_min, lat_max])
+    else:
+        e, n = own_points[:, 0], own_points[:, 1]
+    return (int(e.min() // CELL_M) * CELL_M, int(n.min() // CELL_M) * CELL_M,
+            int(e.max() // CELL_M + 1) * CELL_M, int(n.max() // CELL_M + 1) * CELL_M)
+
+
+def distance_transform(seeds, max_cells: int):
+    """Abstand jeder Zelle zur nächsten True-Zelle in `seeds`, in Zellen.
+
+    Exakt bis max_cells, darüber max_cells. Zwei Durchgänge über ganze
+    Arrays: pro Spalte der Zeilenabstand g zur nächsten Seed-Zelle, dann
+    pro Zeile min(o² + g²) über alle Spaltenversätze |o| <= max_cells.
+    """
+    h, w = seeds.shape
+    rows = np.arange(h)[:, None]
+    far = h + max_cells + 1
+    above = np.maximum.accumulate(np.where(seeds, rows, -far), axis=0)
+    below = np.minimum.accumulate(np.where(seeds, rows, h + far)[::-1], axis=0)[::-1]
+    g = np.minimum(np.minimum(rows - above, below - rows), max_cells + 1).astype(np.float32)
+    g2 = g * g
+    best = g2.copy()
+    for o in range(1, min(max_cells, w - 1) + 1):
+        o2 = np.float32(o * o)
+        np.minimum(best[:, o:], g2[:, :-o] + o2, out=best[:, o:])
+        np.minimum(best[:, :-o], g2[:, o:] + o2, out=best[:, :-o])
+    return np.minimum(np.sqrt(best), max_cells)
+
+
+def canton_mask(area, e0, n_top, height, width):
+    """Zellmitten innerhalb des Kantons (bool-Array height x width)."""
+    if area is None:
+        return np.ones((height, width), dtype=bool)
+    e = e0 + (np.arange(width) + 0.5) * CELL_M
+    n = n_top - (np.arange(height) + 0.5) * CELL_M
+    lon, lat = lv95_to_wgs84(*np.meshgrid(e, n))
+    lon, lat = lon.ravel(), lat.ravel()
+    inside = np.zeros(lon.size, dtype=bool)
+    for start in range(0, lon.size, MASK_CHUNK):
+        end = start + MASK_CHUNK
+        inside[start:end] = area.contains_many(lon[start:end], lat[start:end])
+    return inside.reshape(height, width)
+
+
+def input_digest(points, extent, boundary_path) -> str:
+    """Hash über alles, was das Raster eines Kantons beeinflusst."""
+    h = hashlib.sha256(f"{COVERAGE_VERSION}:{CELL_M}:{MAX_DISTANCE_M}:{extent}".encode())
+    h.update(file_hash(boundary_path).encode() if boundary_path else b"-")
+    h.update(np.round(points).astype(np.int64).tobytes())
+    return h.hexdigest()
+
+
+def compute(kid, area, extent, points, own_count):
+    """Raster (uint16 Meter, NODATA ausserhalb) und Kennzahlen eines Kantons."""
+    e_min, n_min, e_max, n_max = extent
+    width = (e_max - e_min) // CELL_M
+    height = (n_max - n_min) // CELL_M
+    pad = -(-MAX_DISTANCE_M // CELL_M)
+
+    # Rechengebiet um MAX_DISTANCE_M erweitert, damit Defis jenseits der
+    # Kantonsgrenze mitzählen; Zeile 0 ist der Norden
+    seeds = np.zeros((height + 2 * pad, width + 2 * pad), dtype=bool)
+    cols = np.floor((points[:, 0] - e_min) / CELL_M).astype(np.int64) + pad
+    rows = np.floor((n_max - points[:, 1]) / CELL_M).astype(np.int64) + pad
+    ok = (rows >= 0) & (rows < seeds.shape[0]) & (cols >= 0) & (cols < seeds.shape[1])
+    seeds[rows[ok], cols[ok]] = True
+
+    cells = distance_transform(seeds, pad)[pad:pad + height, pad:pad + width]
+    meters = np.minimum(np.rint(cells * CELL_M), MAX_DISTANCE_M).astype(np.uint16)
+    inside = canton_mask(area, e_min, n_max, height, width)
+    raster = np.where(inside, meters, NODATA).astype(np.uint16)
+
+    values = meters[inside]
+    stats = {
+        "defis_public": int(own_count),
+        "cells": int(values.size),
+        "area_km2": round(values.size * CELL_M * CELL_M / 1e6, 1),
+        "median_m": int(np.median(values)) if values.size else None,
+        "p90_m": int(np.percentile(values, 90)) if values.size else None,
+        "max_m": int(values.max()) if values.size else None,
+        "share_within_m": {
+            str(t): round(float((values <= t).mean()) * 100, 1) if values.size else None
+            for t in THRESHOLDS_M
+        },
+        "boundary": area is not None,
+    }
+    return raster, stats
+
+
+def write_raster(kid, raster, extent):
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    e_min, _, _, n_max = extent
+    np.savez_compressed(
+        OUTPUT_DIR / f"{kid}.npz",
+        distance_m=raster,
+        origin=np.array([e_min, n_max]),
+        cell_m=np.array(CELL_M),
+        nodata=np.array(NODATA),
+        crs=np.array("EPSG:2056"),
+    )
+
+
+def load_json(path: Path, default):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def save_json(path: Path, data) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("kantone", nargs="*", help="Nur diese Kantone (z.B. zh be)")
+    parser.add_argument("--full", action="store_true", help="Alle Kantone neu rechnen")
+    args = parser.parse_args()
+
+    if np is None:
+        print("NumPy nicht installiert - Abdeckungsanalyse übersprungen")
+        sys.exit(1)
+
+    sources = sorted(JSON_DIR.glob(SOURCES))
+    if not sources:
+        print(f"Keine {SOURCES} gefunden in {JSON_DIR}")
+        return
+    neighbours = [JSON_DIR / name for name in NEIGHBOUR_SOURCES if (JSON_DIR / name).exists()]
+
+    manifest = load_json(MANIFEST_FILE, {})
+    if manifest.get("version") != COVERAGE_VERSION or args.full:
+        manifest = {}
+    hashes = {p.name: file_hash(p) for p in sources + neighbours}
+    wanted = set(args.kantone) or {kanton_id(p) for p in sources}
+    outputs_exist = all((OUTPUT_DIR / f"{kid}.npz").exists() for kid in wanted)
+    # Schneller Ausweg: keine Eingabedatei hat sich seit dem letzten
+    # vollständigen Lauf geändert
+    if manifest.get("files") == hashes and outputs_exist and not args.kantone:
+        print("Keine GeoJSON-Änderungen - Abdeckung unverändert")
+        return
+
+    points, own = load_points(sources + neighbours)
+    summary = load_json(SUMMARY_FILE, {}).get("kantone", {})
+    digests = manifest.get("kantone", {})
+    computed = 0
+    for path in sources:
+        kid = kanton_id(path)
+        if kid not in wanted:
+            continue
+        area, boundary = load_boundary(kid)
+        if area is None and not len(own[kid]):
+            print(f"  {kid}: weder Grenzpolygon noch öffentliche Defis - übersprungen")
+            continue
+        extent = grid_extent(area, own[kid])
+        e_min, n_min, e_max, n_max = extent
+        near = points[(points[:, 0] >= e_min - MAX_DISTANCE_M) & (points[:, 0] <= e_max + MAX_DISTANCE_M)
+                      & (points[:, 1] >= n_min - MAX_DISTANCE_M) & (points[:, 1] <= n_max + MAX_DISTANCE_M)]
+        near = near[np.lexsort((near[:, 1], near[:, 0]))]
+        digest = input_digest(near, extent, boundary)
+        if digests.get(kid) == digest and (OUTPUT_DIR / f"{kid}.npz").exists():
+            continue
+
+        raster, stats = compute(kid, area, extent, near, len(own[kid]))
+        write_raster(kid, raster, extent)
+        summary[kid] = stats
+        digests[kid] = digest
+        computed += 1
+        note = "" if area is not None else "  (ohne Grenzpolygon, Bounding Box)"
+        print(f"  {kid}: {stats['area_km2']} km², Median {stats['median_m']} m, "
+              f"innert 1 km: {stats['share_within_m']['1000']}%{note}")
+
+    save_json(SUMMARY_FILE, {"cell_m": CELL_M, "max_distance_m": MAX_DISTANCE_M,
+                             "thresholds_m": list(THRESHOLDS_M), "kantone": summary})
+    # Bei Teilläufen bleiben die Datei-Hashes des letzten vollständigen Laufs
+    files = manifest.get("files") if args.kantone else hashes
+    save_json(MANIFEST_FILE, {"version": COVERAGE_VERSION, "files": files, "kantone": digests})
+    print(f"\n{computed} Kantone neu gerechnet, übrige unverändert.")
+
+
+if __name__ == "__main__":
+    main()
@@ -105,6 +105,16 @@ jobs:
             echo "Push failed, retry $i..."
             sleep 2
           done
+
+      - name: Run-Report hochladen
+        if: always()
+        uses: actions/upload-artifact@v4
+        with:
+          name: run-report-reporting
+          path: |
+            ${{{{ runner.temp }}}}/reporting.json
+            ${{{{ runner.temp }}}}/reporting.prom
+          if-no-files-found: ignore
 """
 
 
@@ -131,32 +141,26 @@ jobs:
         with:
           ref: main
 
+      - name: Setup Python
+        uses: actions/setup-python@v5
+        with:
+          python-version: "3.11"
+
       - name: Check if pending changes exist
         run: |
-          FILE=".reporting/pending_changes_{kid}.json"
-          if [ -f "$FILE" ] && [ -s "$FILE" ]; then
-            COUNT=$(python3 -c "import json; data=json.load(open('$FILE')); print(len(data))")
-            if [ "$COUNT" -gt "0" ]; then
-              echo "HAS_PENDING=true" >> $GITHUB_ENV
-              echo "PENDING_COUNT=$COUNT" >> $GITHUB_ENV
-            else
-              echo "HAS_PENDING=false" >> $GITHUB_ENV
-            fi
+          COUNT=$(python3 scripts/pending_store.py count .reporting/pending_changes_{kid}.sqlite)
+          if [ "$COUNT" -gt "0" ]; then
+            echo "HAS_PENDING=true" >> $GITHUB_ENV
+            echo "PENDING_COUNT=$COUNT" >> $GITHUB_ENV
           else
             echo "HAS_PENDING=false" >> $GITHUB_ENV
           fi
 
-      - name: Setup Python
-        if: env.HAS_PENDING == 'true'
-        uses: actions/setup-python@v5
-        with:
-          python-version: "3.11"
-
       - name: Weekly-HTML generieren
         if: env.HAS_PENDING == 'true'
         run: |
           python3 scripts/build_weekly_report.py \\
-            .reporting/pending_changes_{kid}.json \\
+            .reporting/pending_changes_{kid}.sqlite \\
             "{name}" \\
             diff_weekly.html
 
@@ -178,11 +182,11 @@ jobs:
         if: env.HAS_PENDING == 'true'
         run: |
           set -euo pipefail
-          echo "[]" > .reporting/pending_changes_{kid}.json
+          python3 scripts/pending_store.py clear .reporting/pending_changes_{kid}.sqlite
 
           git config user.name "defikarte.ch Reporting Bot"
           git config user.email "chrigi@chnuessli.ch"
-          git add .reporting/pending_changes_{kid}.json
+          git add .reporting/
 
           rm -f diff_weekly.html
           git commit -m "clear pending changes {kid} after weekly report"
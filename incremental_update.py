@@ -0,0 +1,136 @@
+"""
+Inkrementelle Aktualisierung der nationalen Datensätze per Overpass
+Augmented Diff (adiff), statt jede Stunde alles neu zu laden.
+
+Die nationale GeoJSON-Datei (z.B. defis_switzerland.geojson) dient als
+Feature-Store: sie wird nach "node/<id>" (bzw. way/…, relation/…) indiziert,
+die seit dem letzten osm_base erfolgten Aktionen werden angewendet
+(create/modify -> Feature ersetzen, delete -> entfernen) und die Datei im
+kanonischen Format von osm_to_geojson.py neu geschrieben. Das Ergebnis ist
+bytegleich mit einem vollständigen Download; übertragen werden aber nur die Änderungen der
+letzten Stunde.
+
+Ways und Relationen kommen mit "out geom", damit ihre Koordinate wie beim
+vollständigen Download der Schwerpunkt der Member-Nodes ist (und nicht die
+Bounding-Box-Mitte von "out center").
+
+Die Kennung "node/<id>" ist dieselbe, die get_key()/normalize_osm_id() in
+scripts/defi_features.py verwenden.
+
+Wird von overpass_fetch.py --incremental verwendet.
+"""
+
+import re
+import xml.etree.ElementTree as ET
+from datetime import datetime, timedelta, timezone
+
+from osm_to_geojson import _centroid, _number, convert
+
+# Nach spätestens dieser Zeit wird trotzdem vollständig geladen, damit sich
+# allfällige Abweichungen nicht über Wochen halten.
+FULL_REFRESH_AFTER = timedelta(hours=24)
+
+
+def adiff_query(query: str, since: str) -> str:
+    """Macht aus einem Query die Augmented-Diff-Abfrage seit `since`."""
+    body = re.sub(r'//[^\n]*', '', query)
+    body = re.sub(r'(?m)^\s*(out\b[^;]*|>)\s*;', '', body).rstrip()
+    body = re.sub(r'\[out:json\]', f'[out:xml][adiff:"{since}"]', body, count=1)
+    return f"{body}\nout geom;"
+
+
+def needs_full_refresh(last_full: str | None, now=None) -> bool:
+    if not last_full:
+        return True
+    try:
+        ts = datetime.fromisoformat(last_full.replace("Z", "+00:00"))
+    except ValueError:
+        return True
+    return (now or datetime.now(timezone.utc)) - ts > FULL_REFRESH_AFTER
+
+
+def _position(el):
+    if el.get("lat") is None:
+        return None
+    return [_number(float(el.get("lon"))), _number(float(el.get("lat")))]
+
+
+def _geometry_centroid(el):
+    """Schwerpunkt wie in osm_to_geojson.convert(): bei Ways über die Nodes,
+    bei Relationen über Member-Nodes und die Schwerpunkte der Member-Ways."""
+    if el.tag == "way":
+        return _centroid(_position(nd) for nd in el.findall("nd"))
+    points = []
+    for m in el.findall("member"):
+        if m.get("type") == "node":
+            points.append(_position(m))
+        elif m.get("type") == "way":
+            points.append(_centroid(_position(nd) for nd in m.findall("nd")))
+    return _centroid(points)
+
+
+def _element(el) -> dict:
+    """XML-Element (node/way/relation) -> Overpass-JSON-Element.
+
+    Die Geometrie von Ways und Relationen ("out geom") wird zum Schwerpunkt
+    zusammengefasst und als "center" übergeben, den convert() unverändert
+    übernimmt.
+    """
+    out = {"type": el.tag, "id": int(el.get("id"))}
+    if el.get("lat") is not None:
+        out["lat"] = float(el.get("lat"))
+        out["lon"] = float(el.get("lon"))
+    center = el.find("center")
+    coordinates = _geometry_centroid(el) if el.tag != "node" else None
+    if coordinates:
+        out["center"] = {"lat": coordinates[1], "lon": coordinates[0]}
+    elif center is not None:
+        out["center"] = {"lat": float(center.get("lat")), "lon": float(center.get("lon"))}
+    tags = {t.get("k"): t.get("v") for t in el.findall("tag")}
+    if tags:
+        out["tags"] = tags
+    return out
+
+
+def parse_adiff(text: str):
+    """Liefert (osm_base, [(aktion, element), ...]) aus einem Augmented Diff.
+
+    Bei "modify" und "delete" zählt die neue Version; "delete" umfasst auch
+    Objekte, die nicht mehr auf das Query passen (Tag entfernt, aus dem
+    Gebiet verschoben).
+    """
+    root = ET.fromstring(text)
+    remark = root.find("remark")
+    if remark is not None and remark.text and "error" in remark.text.lower():
+        raise RuntimeError(remark.text.strip())
+
+    meta = root.find("meta")
+    osm_base = meta.get("osm_base") if meta is not None else None
+
+    actions = []
+    for action in root.findall("action"):
+        kind = action.get("type")
+        new = action.find("new")
+        container = new if new is not None else action
+        for el in container:
+            if el.tag in ("node", "way", "relation"):
+                actions.append((kind, _element(el)))
+    return osm_base, actions
+
+
+def apply_adiff(features_by_id: dict, actions) -> dict:
+    """Wendet die Aktionen auf den Store an, gibt die Anzahl pro Aktion zurück."""
+    counts = {"create": 0, "modify": 0, "delete": 0}
+    for kind, el in actions:
+        key = f"{el['type']}/{el['id']}"
+        if kind == "delete":
+            if features_by_id.pop(key, None) is not None:
+                counts["delete"] += 1
+            continue
+        converted = convert({"elements": [el]})
+        if converted:
+            features_by_id[key] = converted[0]
+            counts[kind if kind in counts else "modify"] += 1
+        elif features_by_id.pop(key, None) is not None:
+            counts["delete"] += 1
+    return counts
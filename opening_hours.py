@@ -0,0 +1,183 @@
+"""
+Auswertung von opening_hours-Werten für die 24h-Datensätze und den
+CSV-Export.
+
+Bisher galt nur der wörtliche Wert "24/7" als rund um die Uhr zugänglich;
+gleichbedeutende Angaben wie "Mo-Su 00:00-24:00", "00:00-23:59" oder
+"24 / 7" landeten in den nicht-24h-Dateien. parse() liest die gängige
+Teilmenge der opening_hours-Syntax in einen Wochenplan:
+
+- Regeln mit ";" (spätere überschreiben frühere für ihre Tage) und
+  ergänzende Regeln mit "," ("Mo-Fr 08:00-12:00, Sa 09:00-12:00")
+- Wochentage und -bereiche (auch über das Wochenende, "Su-Th"), PH/SH
+- Zeitspannen, auch über Mitternacht ("22:00-02:00"; eine spätere Regel
+  für einen der beiden Tage ersetzt auch den Überhang); "23:59" als Tagesende,
+  gleicher Start und Ende ("12:00-12:00") als leere Spanne
+- "24/7", "off"/"closed", "open"
+
+Alles andere (Monate, Datumsangaben, sunrise, Kommentare, "||", Freitext)
+ergibt None – solche Werte gelten nicht als rund um die Uhr.
+
+Die Werte wiederholen sich stark (rund 1800 verschiedene bei 17'000 Defis),
+deshalb wird jedes Ergebnis pro Prozess zwischengespeichert.
+
+Verwendung:
+    always_open("Mo-Su 00:00-24:00")          # True
+    is_open("Mo-Fr 08:00-17:00", datetime.now())
+"""
+
+import re
+
+DAYS = ("Mo", "Tu", "We", "Th", "Fr", "Sa", "Su")
+HOLIDAYS = ("PH", "SH")
+DAY_MINUTES = 24 * 60
+FULL_DAY = ((0, DAY_MINUTES),)
+
+_DAY = r"(?:Mo|Tu|We|Th|Fr|Sa|Su|PH|SH)"
+_DAY_SELECTOR_RE = re.compile(rf"{_DAY}(?:-{_DAY})?(?:,{_DAY}(?:-{_DAY})?)*")
+_TIME_SPAN_RE = re.compile(r"(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})")
+# Ergänzende Regel: Komma nach einer Uhrzeit, vor einem Wochentag
+_ADDITIVE_RE = re.compile(rf"(?<=\d),(?={_DAY}\b)")
+
+# Wert -> Schedule oder None; unbeschränkt, da es nur wenige Werte gibt
+_cache = {}
+
+
+class Schedule:
+    """Wochenplan: pro Wochentag (Mo=0) die offenen Intervalle in Minuten."""
+
+    __slots__ = ("days", "holidays_restricted")
+
+    def __init__(self, days, holidays_restricted: bool):
+        self.days = days
+        self.holidays_restricted = holidays_restricted
+
+    def always_open(self) -> bool:
+        return not self.holidays_restricted and all(d == FULL_DAY for d in self.days)
+
+    def is_open(self, when) -> bool:
+        """Offen zum Zeitpunkt `when` (Ortszeit; Feiertage unberücksichtigt)."""
+        minute = when.hour * 60 + when.minute
+        return any(start <= minute < end for start, end in self.days[when.weekday()])
+
+
+def _day_selector(text):
+    """"Mo-Fr,PH" -> ([0, 1, 2, 3, 4], True) oder None."""
+    weekdays, holidays = [], False
+    for item in text.split(","):
+        first, _, last = item.partition("-")
+        if first in HOLIDAYS or last in HOLIDAYS:
+            if last:
+                return None
+            holidays = True
+            continue
+        start = DAYS.index(first)
+        end = DAYS.index(last) if last else start
+        weekdays += [(start + i) % 7 for i in range((end - start) % 7 + 1)]
+    return weekdays, holidays
+
+
+def _time_spans(text):
+    """"08:00-12:00,13:00-17:00" -> [(480, 720), (780, 1020)] oder None."""
+    if text in ("", "24/7", "open"):
+        return list(FULL_DAY)
+    if text in ("off", "closed"):
+        return []
+    spans = []
+    for item in text.split(","):
+        m = _TIME_SPAN_RE.fullmatch(item)
+        if not m:
+            return None
+        h1, m1, h2, m2 = map(int, m.groups())
+        start, end = h1 * 60 + m1, h2 * 60 + m2
+        if m1 > 59 or m2 > 59 or start >= DAY_MINUTES or end > DAY_MINUTES:
+            return None
+        if start == end:
+            # "12:00-12:00" ist leer, nicht 24 Stunden (dafür gibt es 00:00-24:00)
+            continue
+        if end == DAY_MINUTES - 1:
+            end = DAY_MINUTES
+        if end <= start:
+            end += DAY_MINUTES
+        spans.append((start, end))
+    return spans
+
+
+def _rule(text):
+    """Eine Regel -> (Wochentage, PH/SH, Intervalle) oder None."""
+    selector, _, rest = text.partition(" ")
+    if _DAY_SELECTOR_RE.fullmatch(selector):
+        weekdays, holidays = _day_selector(selector)
+    else:
+        weekdays, holidays, rest = list(range(7)), False, text
+    spans = _time_spans(rest.strip())
+    if spans is None:
+        return None
+    return weekdays, holidays, spans
+
+
+def _merge(spans):
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return tuple(merged)
+
+
+def _parse(value: str):
+    # "Mo - Fr 08:00 - 17:00", "24 / 7" -> ohne Leerzeichen um - , /
+    text = re.sub(r"\s*([-,/])\s*", r"\1", " ".join(value.split()))
+    days = [[] for _ in DAYS]
+    # Überhang über Mitternacht, nach dem Tag, an dem die Spanne beginnt
+    spill = [[] for _ in DAYS]
+    holidays_restricted = False
+    for rule in text.split(";"):
+        rule = rule.strip()
+        if not rule:
+            continue
+        for n, part in enumerate(_ADDITIVE_RE.split(rule)):
+            parsed = _rule(part.strip())
+            if parsed is None:
+                return None
+            weekdays, holidays, spans = parsed
+            if holidays and _merge(spans) != FULL_DAY:
+                holidays_restricted = True
+            if n == 0:
+                # Die Regel ersetzt ihre Tage ganz: eigene Spannen, den
+                # Überhang in den Folgetag und den Überhang vom Vortag.
+                # Erst für alle Tage, damit "Mo-Su 22:00-02:00" sich nicht
+                # selbst den Überhang wegnimmt
+                for wd in weekdays:
+                    days[wd], spill[wd], spill[(wd - 1) % 7] = [], [], []
+            for wd in weekdays:
+                for start, end in spans:
+                    days[wd].append((start, min(end, DAY_MINUTES)))
+                    if end > DAY_MINUTES:
+                        spill[wd].append((0, end - DAY_MINUTES))
+    days = [days[wd] + spill[(wd - 1) % 7] for wd in range(len(DAYS))]
+    return Schedule(tuple(_merge(d) for d in days), holidays_restricted)
+
+
+def parse(value):
+    """opening_hours-Wert -> Schedule, None wenn fehlend oder nicht lesbar."""
+    if not value:
+        return None
+    try:
+        return _cache[value]
+    except KeyError:
+        schedule = _cache[value] = _parse(value)
+        return schedule
+
+
+def always_open(value) -> bool | None:
+    """True wenn rund um die Uhr (auch an Feiertagen), None wenn unbekannt."""
+    schedule = parse(value)
+    return None if schedule is None else schedule.always_open()
+
+
+def is_open(value, when) -> bool | None:
+    """Offen zum Zeitpunkt `when`, None wenn unbekannt."""
+    schedule = parse(value)
+    return None if schedule is None else schedule.is_open(when)
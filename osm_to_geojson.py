@@ -0,0 +1,174 @@
+"""
+Wandelt Overpass-JSON ("elements") in eine GeoJSON-FeatureCollection um –
+Ersatz für die npm-CLI osmtogeojson, ohne Node und ohne Zwischentext.
+
+Die Features entsprechen dem, was osmtogeojson für unsere Queries
+("out body; >; out skel qt;") liefert:
+- ein Feature pro getaggtem Node (oder Node, der in keinem Way/keiner
+  Relation steckt), id "node/<id>"
+- flache properties: Tags alphabetisch sortiert, danach "id"
+
+Ways und Relationen werden – anders als bei osmtogeojson – als Point im
+Schwerpunkt ihrer Nodes ausgegeben (nicht die Bbox-Mitte von "out center"), da alle
+nachgelagerten Scripts nur mit Punkt-Koordinaten arbeiten.
+
+Geschrieben wird ein kanonisches, kompaktes Format (dumps_geojson), damit
+die stündlichen Commits nur die tatsächlich geänderten Zeilen enthalten:
+- ein Feature pro Zeile, ohne Einrückung
+- Features sortiert nach OSM-Typ und -ID (Nodes, Ways, Relationen)
+- Schlüssel in fester Reihenfolge, Koordinaten auf COORD_PRECISION
+  Nachkommastellen gerundet (so genau wie OSM selbst speichert)
+Gleiche Daten ergeben so immer dieselben Bytes, egal ob voll geladen,
+per Augmented Diff nachgeführt oder lokal aus dem nationalen Datensatz
+abgeleitet.
+
+Verwendung (drop-in für osmtogeojson):
+    cat queries/defis_kt_zh.overpassql | python overpass_query.py | python osm_to_geojson.py
+"""
+
+import json
+import sys
+
+from overpass_query import write_atomic
+
+# OSM speichert Koordinaten mit 7 Nachkommastellen (ca. 1 cm)
+COORD_PRECISION = 7
+
+# Reihenfolge der Elementtypen, wie in der Overpass-Ausgabe ("out body")
+TYPE_ORDER = {"node": 0, "way": 1, "relation": 2}
+
+
+def _number(x):
+    # JSON.stringify schreibt 47.0 als "47" – wie bisher in den Dateien
+    return int(x) if isinstance(x, float) and x.is_integer() else x
+
+
+def _centroid(points):
+    points = [p for p in points if p is not None]
+    if not points:
+        return None
+    lon = sum(p[0] for p in points) / len(points)
+    lat = sum(p[1] for p in points) / len(points)
+    return [_number(lon), _number(lat)]
+
+
+def _feature(osm_type, osm_id, tags, coordinates):
+    key = f"{osm_type}/{osm_id}"
+    # Tags sortiert, wie sie bisher (json.dumps(sort_keys=True)) bei
+    # osmtogeojson ankamen
+    properties = dict(sorted((tags or {}).items()))
+    properties["id"] = key
+    return {
+        "type": "Feature",
+        "id": key,
+        "properties": properties,
+        "geometry": {"type": "Point", "coordinates": coordinates},
+    }
+
+
+def convert(data: dict) -> list:
+    """Overpass-JSON -> Liste von GeoJSON-Features."""
+    nodes, ways, relations = {}, {}, {}
+    referenced = set()
+
+    for el in data.get("elements", []) or []:
+        t = el.get("type")
+        if t == "node":
+            known = nodes.get(el["id"])
+            # Getaggte Version ("out body") gewinnt gegen "out skel"
+            if known is None or (el.get("tags") and not known.get("tags")):
+                nodes[el["id"]] = el
+        elif t == "way":
+            ways.setdefault(el["id"], el)
+            referenced.update(el.get("nodes", []))
+        elif t == "relation":
+            relations.setdefault(el["id"], el)
+            referenced.update(m["ref"] for m in el.get("members", []) if m.get("type") == "node")
+
+    node_pos = {
+        nid: [_number(n["lon"]), _number(n["lat"])]
+        for nid, n in nodes.items() if "lon" in n and "lat" in n
+    }
+
+    features = []
+    for nid, n in nodes.items():
+        if nid not in node_pos:
+            continue
+        if n.get("tags") or nid not in referenced:
+            features.append(_feature("node", nid, n.get("tags"), node_pos[nid]))
+
+    way_pos = {}
+    for wid, w in ways.items():
+        way_pos[wid] = (
+            _centroid(node_pos.get(nid) for nid in w.get("nodes", []))
+            or _centroid([[w["center"]["lon"], w["center"]["lat"]]] if "center" in w else [])
+        )
+        if w.get("tags") and way_pos[wid]:
+            features.append(_feature("way", wid, w["tags"], way_pos[wid]))
+
+    for rid, r in relations.items():
+        if not r.get("tags"):
+            continue
+        points = []
+        for m in r.get("members", []):
+            if m.get("type") == "node":
+                points.append(node_pos.get(m["ref"]))
+            elif m.get("type") == "way":
+                points.append(way_pos.get(m["ref"]))
+        if "center" in r:
+            points.append([r["center"]["lon"], r["center"]["lat"]])
+        coordinates = _centroid(points)
+        if coordinates:
+            features.append(_feature("relation", rid, r["tags"], coordinates))
+
+    return features
+
+
+def feature_sort_key(feature):
+    osm_type, _, osm_id = str(feature.get("id", "")).partition("/")
+    return TYPE_ORDER.get(osm_type, 3), int(osm_id) if osm_id.isdigit() else 0
+
+
+def _canonical_geometry(geometry):
+    if not geometry or geometry.get("type") != "Point":
+        return geometry
+    return {
+        "type": "Point",
+        "coordinates": [_number(round(c, COORD_PRECISION)) for c in geometry["coordinates"]],
+    }
+
+
+def format_feature(feature) -> str:
+    """Ein Feature als eine Zeile in kanonischer Form."""
+    properties = feature.get("properties") or {}
+    canonical = {
+        "type": "Feature",
+        "id": feature.get("id"),
+        # Tags sortiert, "id" zuletzt (wie in _feature)
+        "properties": {
+            **{k: v for k, v in sorted(properties.items()) if k != "id"},
+            **({"id": properties["id"]} if "id" in properties else {}),
+        },
+        "geometry": _canonical_geometry(feature.get("geometry")),
+    }
+    return json.dumps(canonical, ensure_ascii=False, separators=(",", ":"))
+
+
+def dumps_geojson(features, render=format_feature) -> str:
+    """FeatureCollection als Text: ein Feature pro Zeile, sortiert nach OSM-ID."""
+    lines = [render(f) for f in sorted(features, key=feature_sort_key)]
+    body = ",\n".join(lines) + "\n" if lines else ""
+    return '{"type":"FeatureCollection","features":[\n' + body + ']}\n'
+
+
+def write_geojson(features, path, render=format_feature) -> None:
+    write_atomic(path, dumps_geojson(features, render))
+
+
+def main():
+    data = json.load(sys.stdin)
+    sys.stdout.write(dumps_geojson(convert(data)))
+
+
+if __name__ == "__main__":
+    main()
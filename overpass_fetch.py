@@ -0,0 +1,277 @@
+"""
+Führt die Overpass-Queries aus queries/ parallel aus und schreibt die
+GeoJSON-Dateien nach data/json/ (ersetzt die serielle Schleife in
+run_queries.sh).
+
+- Ein gemeinsamer HTTP-Session-Pool: Keep-Alive statt neuer TLS-Verbindung
+  pro Query, kein neuer Python-Interpreter pro Datei
+- Konvertierung nach GeoJSON direkt im Prozess (osm_to_geojson.py), ohne
+  Node und ohne pretty-printed Zwischentext
+- Begrenzte Parallelität (--workers bzw. OVERPASS_WORKERS, Standard 4),
+  damit ein langsamer Kanton die anderen nicht aufhält
+- Jede Datei wird atomar geschrieben (nie halbe Dateien im Repo)
+- Bedingtes Laden: zuerst eine billige Zählabfrage gegen den gespeicherten
+  Stand (.overpass/state.json); hat sich nichts geändert, entfallen
+  Download, Konvertierung und Schreiben (--force schaltet das ab)
+- Inkrementell (--incremental): die nationalen Datensätze werden per
+  Augmented Diff seit dem letzten osm_base nachgeführt, mindestens einmal
+  pro Tag aber vollständig geladen (siehe incremental_update.py)
+- Am Ende eine Zusammenfassung mit Laufzeit und Fehler pro Query, in
+  GitHub Actions zusätzlich als Job-Summary ($GITHUB_STEP_SUMMARY)
+- Run-Report (run_report.py): pro Query je ein Span für Overpass,
+  Konvertierung und Schreiben (Bytes, Features, Alter von osm_base), dazu
+  die lokale Aufteilung; als JSON/OpenMetrics unter RUN_REPORT_DIR
+
+Im Split-Modus (Standard) laufen nur die Queries, die area_split.py nicht
+lokal ableiten kann; alle anderen Dateien werden danach lokal erzeugt.
+
+Verwendung:
+    python overpass_fetch.py [--workers N] [--no-split] [--incremental] [--force] [query ...]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import area_split
+from incremental_update import adiff_query, apply_adiff, needs_full_refresh, parse_adiff
+from osm_to_geojson import convert, dumps_geojson
+from overpass_query import (
+    check_unchanged, content_hash, count_matches, load_state, osm_base, run_query_sized,
+    run_query_text, save_state, write_atomic,
+)
+from run_report import RunReport, osm_base_lag
+
+DEFAULT_WORKERS = int(os.getenv("OVERPASS_WORKERS", "4"))
+
+
+def make_session(workers: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def update_incremental(name: str, session: requests.Session, entry: dict, result: dict) -> dict:
+    """Nationalen Datensatz per Augmented Diff seit entry["osm_base"] nachführen."""
+    query = (area_split.QUERY_DIR / f"{name}.overpassql").read_text(encoding="utf-8")
+    path = area_split.JSON_DIR / f"{name}.geojson"
+
+    t0 = time.monotonic()
+    text = run_query_text(adiff_query(query, entry["osm_base"]), session)
+    new_base, actions = parse_adiff(text)
+    t1 = time.monotonic()
+
+    if not actions:
+        # osm_base trotzdem nachführen, sonst wächst das Diff-Fenster jede Stunde
+        result.update(ok=True, skipped=True, fetch_s=t1 - t0, bytes_in=len(text), osm_base=new_base,
+                      state={**entry, "osm_base": new_base or entry["osm_base"]})
+        return result
+
+    with open(path, encoding="utf-8") as f:
+        store = {feature["id"]: feature for feature in json.load(f).get("features", [])}
+    counts = apply_adiff(store, actions)
+    features = list(store.values())
+    out = dumps_geojson(features)
+    digest = content_hash(out)
+    changed = digest != entry.get("sha256")
+    t2 = time.monotonic()
+    if changed:
+        write_atomic(path, out)
+    t3 = time.monotonic()
+
+    print(f"  {name}: adiff {counts['create']} neu, {counts['modify']} geändert, "
+          f"{counts['delete']} gelöscht")
+    result.update(ok=True, changed=changed, fetch_s=t1 - t0, convert_s=t2 - t1, write_s=t3 - t2,
+                  bytes=len(out.encode("utf-8")), bytes_in=len(text), features=len(features),
+                  osm_base=new_base,
+                  state={**entry, "osm_base": new_base or entry["osm_base"],
+                         "total": len(features), "sha256": digest})
+    return result
+
+
+def fetch_one(name: str, session: requests.Session, entry=None, force=False, incremental=False) -> dict:
+    """Ein Query ausführen, nach GeoJSON konvertieren und atomar schreiben.
+
+    Mit einem gespeicherten Stand (entry) wird zuerst per Zählabfrage
+    geprüft, ob sich überhaupt etwas geändert hat; falls nicht, entfallen
+    Download und Schreiben. Mit incremental werden die nationalen
+    Datensätze per Augmented Diff nachgeführt statt neu geladen.
+    """
+    result = {"name": name, "ok": False, "skipped": False, "changed": False, "state": entry,
+              "fetch_s": 0.0, "convert_s": 0.0, "write_s": 0.0, "bytes": 0, "bytes_in": 0,
+              "features": None, "osm_base": None, "error": None}
+    try:
+        query = (area_split.QUERY_DIR / f"{name}.overpassql").read_text(encoding="utf-8")
+        path = area_split.JSON_DIR / f"{name}.geojson"
+
+        if (incremental and not force and name in area_split.SOURCES.values() and path.exists()
+                and entry and entry.get("osm_base") and not needs_full_refresh(entry.get("last_full"))):
+            try:
+                return update_incremental(name, session, entry, result)
+            except Exception as e:
+                print(f"  {name}: Augmented Diff fehlgeschlagen ({e}), lade vollständig")
+
+        t0 = time.monotonic()
+        if not force and path.exists():
+            try:
+                unchanged = check_unchanged(query, entry, session)
+            except Exception as e:
+                print(f"  {name}: Vorab-Prüfung fehlgeschlagen ({e}), lade vollständig")
+                unchanged = False
+            if unchanged:
+                result.update(ok=True, skipped=True, fetch_s=time.monotonic() - t0)
+                return result
+
+        data, bytes_in = run_query_sized(query, session)
+        t1 = time.monotonic()
+
+        features = convert(data)
+        text = dumps_geojson(features)
+        digest = content_hash(text)
+        changed = force or not path.exists() or not entry or entry.get("sha256") != digest
+        t2 = time.monotonic()
+        if changed:
+            write_atomic(path, text)
+        t3 = time.monotonic()
+
+        base = osm_base(data)
+        result.update(ok=True, changed=changed, fetch_s=t1 - t0, convert_s=t2 - t1, write_s=t3 - t2,
+                      bytes=len(text.encode("utf-8")), bytes_in=bytes_in, features=len(features),
+                      osm_base=base,
+                      state={"osm_base": base, "last_full": base,
+                             "total": count_matches(data), "sha256": digest})
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def _total_s(r) -> float:
+    return r["fetch_s"] + r["convert_s"] + r["write_s"]
+
+
+def record_spans(report: RunReport, results) -> None:
+    """Pro Query Spans für Overpass, Konvertierung und Schreiben."""
+    for r in results:
+        lag = osm_base_lag(r["osm_base"])
+        report.add("fetch", r["fetch_s"], r["name"], bytes_in=r["bytes_in"] or None,
+                   osm_base_lag_s=round(lag, 1) if lag is not None else None,
+                   error=r["error"], skipped=r["skipped"] or None)
+        if r["ok"] and not r["skipped"]:
+            report.add("convert", r["convert_s"], r["name"], features=r["features"], bytes_out=r["bytes"])
+            if r["changed"]:
+                report.add("write", r["write_s"], r["name"], bytes_out=r["bytes"])
+
+
+def _status(r) -> str:
+    if not r["ok"]:
+        return f"FEHLER: {r['error']}"
+    if r["skipped"]:
+        return "unverändert (nur Zählabfrage/Diff)"
+    return "ok" if r["changed"] else "ok, Inhalt gleich"
+
+
+def run_all(names, workers: int, state=None, force=False, incremental=False):
+    state = state or {}
+    session = make_session(workers)
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(fetch_one, name, session, state.get(name), force, incremental) for name in names]
+        for future in as_completed(futures):
+            r = future.result()
+            status = _status(r)
+            print(f"  {r['name']}: {_total_s(r):.1f}s - {status}", flush=True)
+            results.append(r)
+    return results
+
+
+def print_summary(results, total_s: float) -> None:
+    results = sorted(results, key=_total_s, reverse=True)
+    failed = [r for r in results if not r["ok"]]
+    skipped = [r for r in results if r["skipped"]]
+
+    lines = [
+        "| Query | Overpass | Konvertierung | Grösse | Status |",
+        "|---|---:|---:|---:|---|",
+    ]
+    for r in results:
+        status = _status(r) if r["ok"] else f"❌ {r['error']}"
+        lines.append(f"| {r['name']} | {r['fetch_s']:.1f}s | {r['convert_s'] + r['write_s']:.1f}s "
+                     f"| {r['bytes'] / 1024:.0f} KB | {status} |")
+
+    print(f"\n{len(results)} Queries in {total_s:.1f}s, {len(skipped)} unverändert, "
+          f"{len(failed)} fehlgeschlagen")
+    print("\n".join(lines))
+
+    summary_file = os.environ.get("GITHUB_STEP_SUMMARY")
+    if summary_file:
+        with open(summary_file, "a", encoding="utf-8") as f:
+            f.write(f"### Overpass: {len(results)} Queries in {total_s:.1f}s, "
+                    f"{len(skipped)} unverändert, {len(failed)} fehlgeschlagen\n\n")
+            f.write("\n".join(lines) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("queries", nargs="*", help="Nur diese Queries (Dateiname ohne Endung)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--no-split", action="store_true",
+                        help="Jedes Query einzeln bei Overpass abfragen, nichts lokal ableiten")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Nationale Datensätze per Augmented Diff nachführen statt neu laden")
+    parser.add_argument("--force", action="store_true",
+                        help="Immer vollständig laden und schreiben, ohne Vorab-Prüfung")
+    args = parser.parse_args()
+
+    queries = area_split.load_queries()
+    split = not args.no_split and not args.queries
+    if args.queries:
+        names = args.queries
+    elif args.no_split:
+        names = list(queries)
+    else:
+        names = area_split.remote_queries(queries)
+
+    report = RunReport("overpass")
+    state = load_state()
+    print(f"{len(names)} Queries, {args.workers} parallel\n")
+    t0 = time.monotonic()
+    results = run_all(names, max(1, args.workers), state, args.force, args.incremental)
+    print_summary(results, time.monotonic() - t0)
+    record_spans(report, results)
+
+    for r in results:
+        if r["ok"] and r["state"]:
+            state[r["name"]] = r["state"]
+    save_state(state)
+
+    failed = {r["name"] for r in results if not r["ok"]}
+    sources = set(area_split.SOURCES.values())
+    if split:
+        derived_missing = any(
+            not (area_split.JSON_DIR / f"{name}.geojson").exists()
+            for name, spec in queries.items() if spec is not None and name not in sources
+        )
+        if failed & sources:
+            print("\nNationaler Datensatz fehlgeschlagen - lokale Aufteilung übersprungen.")
+        elif args.force or derived_missing or any(r["changed"] for r in results):
+            print("\nGebiete lokal aufteilen...")
+            with report.span("area_split"):
+                area_split.split(queries)
+        else:
+            print("\nKeine Änderungen - lokale Aufteilung übersprungen.")
+
+    report.finish()
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
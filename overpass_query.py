@@ -1,26 +1,128 @@
 # -*- coding: utf-8 -*-
 """
-Query OpenStreetMap data from OverPass API
-This script reads a query from stdin and writes the resulting GeoJSON to stdout
+Gemeinsame Overpass-Helfer für overpass_fetch.py, area_split.py und
+osm_to_geojson.py.
 
-Example:
-    cat queries/defis_stadt_zh.txt | python query_overpass.py > data/defis_stadt_zh.geojson
+- run_query() / run_query_sized() / run_query_text(): ein Query an
+  API_ENDPOINT (OVERPASS_API_ENDPOINT) schicken, optional über eine
+  gemeinsame requests-Session
+- probe_query() / check_unchanged(): billige Zählabfrage ("out count" mit
+  newer:), um unveränderte Queries gar nicht erst zu laden
+- load_state() / save_state(): Stand pro Query in STATE_FILE
+  (.overpass/state.json: osm_base, Trefferzahl, Hash). Die Datei wird vom
+  Workflow bewusst mitcommittet, weil die Runner keinen Zustand behalten
+- write_atomic(): Dateien ersetzen, ohne dass Leser eine halbe Datei sehen
+
+Direkt aufgerufen liest das Script ein Query von stdin und gibt die rohe
+Overpass-Antwort aus, z.B. zum Testen zusammen mit osm_to_geojson.py:
+    cat queries/defis_kt_zh.overpassql | python overpass_query.py | python osm_to_geojson.py
 """
 
+import hashlib
 import os
+import re
 import sys
+import tempfile
 import traceback
 import json
 import requests
 from dotenv import load_dotenv, find_dotenv
 load_dotenv(find_dotenv())
 
-try:
-    API_ENDPOINT = os.getenv('OVERPASS_API_ENDPOINT', 'https://overpass.osm.ch/api/interpreter')
-    query = "".join(sys.stdin.readlines())
-    r = requests.get(API_ENDPOINT, params={'data': query})
-    print(json.dumps(r.json(), sort_keys=True, indent=2))
-except Exception as e:
-    print("Error: %s" % e, file=sys.stderr)
-    print(traceback.format_exc(), file=sys.stderr)
-    sys.exit(1)
+API_ENDPOINT = os.getenv('OVERPASS_API_ENDPOINT', 'https://overpass.osm.ch/api/interpreter')
+
+# Stand pro Query: {"osm_base": ..., "total": ..., "sha256": ...}
+STATE_FILE = ".overpass/state.json"
+
+
+def run_query(query, session=None):
+    r = (session or requests).get(API_ENDPOINT, params={'data': query})
+    return r.json()
+
+
+def run_query_sized(query, session=None):
+    """Wie run_query, gibt zusätzlich die Grösse der Antwort in Bytes zurück."""
+    r = (session or requests).get(API_ENDPOINT, params={'data': query})
+    return r.json(), len(r.content)
+
+
+def run_query_text(query, session=None):
+    """Wie run_query, aber für Nicht-JSON-Ausgaben (z.B. Augmented Diffs als XML)."""
+    r = (session or requests).get(API_ENDPOINT, params={'data': query})
+    r.raise_for_status()
+    return r.text
+
+
+def osm_base(data):
+    return (data.get("osm3s") or {}).get("timestamp_osm_base")
+
+
+def count_matches(data):
+    """Anzahl Treffer einer vollen Abfrage (nur "out body"-Elemente haben Tags)."""
+    return sum(1 for el in data.get("elements", []) if el.get("tags"))
+
+
+def probe_query(query, since):
+    """Baut aus einem Query eine billige Zählabfrage.
+
+    Liefert zwei "count"-Elemente: alle Treffer und die seit `since`
+    geänderten. Zusammen erkennen sie neue/geänderte Objekte (newer > 0)
+    wie auch gelöschte oder aus dem Gebiet verschobene (total sinkt).
+    """
+    body = re.sub(r'//[^\n]*', '', query)
+    body = re.sub(r'(?m)^\s*(out\b[^;]*|>)\s*;', '', body).rstrip()
+    return f'{body}\nout count;\nnwr._(newer:"{since}");\nout count;'
+
+
+def check_unchanged(query, entry, session=None):
+    """True, wenn sich seit dem gespeicherten Stand nichts geändert hat."""
+    if not entry or not entry.get("osm_base"):
+        return False
+    data = run_query(probe_query(query, entry["osm_base"]), session)
+    counts = [int(el["tags"]["total"]) for el in data.get("elements", []) if el.get("type") == "count"]
+    return len(counts) == 2 and counts[0] == entry.get("total") and counts[1] == 0
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def load_state(path=STATE_FILE):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(state, path=STATE_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_atomic(path, json.dumps(state, sort_keys=True, indent=2) + "\n")
+
+
+def write_atomic(path, text):
+    """Schreibt text nach path, ohne dass Leser je eine halbe Datei sehen."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="\n") as f:
+            f.write(text)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def main():
+    try:
+        query = "".join(sys.stdin.readlines())
+        print(json.dumps(run_query(query), sort_keys=True, indent=2))
+    except Exception as e:
+        print("Error: %s" % e, file=sys.stderr)
+        print(traceback.format_exc(), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Point-in-Polygon-Tests gegen Gebietsgrenzen (Kantone, Dispo-Gebiete,
+Länder), für area_split.py und scripts/geojson_validation.py.
+
+- AreaIndex: alle Kanten einer Fläche nach Breitenbändern indiziert; ein
+  Punkt prüft nur die Kanten seines Bandes (Even-Odd-Regel)
+- contains_many(): viele Punkte auf einmal; mit NumPy vektorisiert (alle
+  Punkt/Kanten-Paare der jeweiligen Bänder in einem Schritt), ohne NumPy
+  dieselbe Logik in reinem Python
+- simplify_ring(): Douglas-Peucker, um Grenzen mit zehntausenden Punkten
+  für einen schnellen Vortest auszudünnen
+
+Die Grenzen liegen als GeoJSON (MultiPolygon pro Relation) unter
+.overpass/boundaries/, siehe area_split.fetch_boundaries().
+"""
+
+import math
+
+# NumPy ist optional: ohne wird punktweise in Python getestet
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def simplify_ring(ring, tolerance: float):
+    """Douglas-Peucker für einen geschlossenen Ring (Toleranz in Grad)."""
+    n = len(ring)
+    if tolerance <= 0 or n < 5:
+        return ring
+    keep = [False] * n
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        x1, y1 = ring[i]
+        x2, y2 = ring[j]
+        dx, dy = x2 - x1, y2 - y1
+        norm = math.hypot(dx, dy)
+        max_d, max_k = 0.0, None
+        for k in range(i + 1, j):
+            px, py = ring[k]
+            if norm:
+                d = abs(dy * (px - x1) - dx * (py - y1)) / norm
+            else:
+                d = math.hypot(px - x1, py - y1)
+            if d > max_d:
+                max_d, max_k = d, k
+        if max_k is not None and max_d > tolerance:
+            keep[max_k] = True
+            stack.append((i, max_k))
+            stack.append((max_k, j))
+    out = [p for p, k in zip(ring, keep) if k]
+    return out if len(out) >= 4 else ring
+
+
+class AreaIndex:
+    """Point-in-Polygon-Test für eine Fläche aus einer oder mehreren Relationen.
+
+    Pro Relation werden alle Kanten (äussere und innere Ringe) nach
+    Breitenbändern einsortiert; ein Punkt prüft nur die Kanten seines Bandes
+    (Even-Odd-Regel). Damit kostet ein Test ein paar Dutzend statt zehntausende
+    Kantenvergleiche. Mit tolerance > 0 werden die Ringe vorher vereinfacht.
+    """
+
+    def __init__(self, geometries, tolerance: float = 0.0):
+        self.parts = []
+        for geometry in geometries:
+            edges = []
+            for polygon in geometry["coordinates"]:
+                for ring in polygon:
+                    ring = simplify_ring(ring, tolerance)
+                    for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+                        if y1 != y2:
+                            edges.append((x1, y1, x2, y2))
+            if not edges:
+                continue
+            min_x = min(min(e[0], e[2]) for e in edges)
+            max_x = max(max(e[0], e[2]) for e in edges)
+            min_y = min(min(e[1], e[3]) for e in edges)
+            max_y = max(max(e[1], e[3]) for e in edges)
+            n_bands = max(1, min(4096, len(edges) // 4))
+            band_h = (max_y - min_y) / n_bands or 1.0
+            bands = [[] for _ in range(n_bands)]
+            for e in edges:
+                lo = int((min(e[1], e[3]) - min_y) / band_h)
+                hi = int((max(e[1], e[3]) - min_y) / band_h)
+                for b in range(max(lo, 0), min(hi, n_bands - 1) + 1):
+                    bands[b].append(e)
+            self.parts.append((min_x, max_x, min_y, max_y, band_h, bands))
+        self._arrays = None
+
+    def contains(self, lon, lat) -> bool:
+        for min_x, max_x, min_y, max_y, band_h, bands in self.parts:
+            if not (min_x <= lon <= max_x and min_y <= lat <= max_y):
+                continue
+            b = min(int((lat - min_y) / band_h), len(bands) - 1)
+            inside = False
+            for x1, y1, x2, y2 in bands[b]:
+                if (y1 > lat) != (y2 > lat) and lon < (x2 - x1) * (lat - y1) / (y2 - y1) + x1:
+                    inside = not inside
+            if inside:
+                return True
+        return False
+
+    def _band_arrays(self):
+        # Pro Teilfläche alle Kanten bandweise hintereinander als (4, m)-Array
+        # plus Startindex jedes Bandes; einmal pro Index aufgebaut
+        if self._arrays is None:
+            self._arrays = []
+            for part in self.parts:
+                bands = part[5]
+                sizes = np.array([len(band) for band in bands])
+                starts = np.concatenate(([0], np.cumsum(sizes)))
+                flat = np.array([e for band in bands for e in band], dtype=float).reshape(-1, 4).T
+                self._arrays.append((flat, starts, sizes))
+        return self._arrays
+
+    def contains_many(self, lons, lats) -> list:
+        """contains() für viele Punkte; None-Koordinaten ergeben False.
+
+        Mit NumPy werden alle (Punkt, Kante-im-Band)-Paare auf einmal
+        gebildet und die Kreuzungen pro Punkt gezählt – ohne Python-Schleife
+        über Punkte oder Bänder.
+        """
+        if np is None:
+            return [
+                lon is not None and lat is not None and self.contains(lon, lat)
+                for lon, lat in zip(lons, lats)
+            ]
+
+        x = np.array([math.nan if v is None else v for v in lons], dtype=float)
+        y = np.array([math.nan if v is None else v for v in lats], dtype=float)
+        result = np.zeros(len(x), dtype=bool)
+
+        for (min_x, max_x, min_y, max_y, band_h, bands), (flat, starts, sizes) in zip(self.parts, self._band_arrays()):
+            with np.errstate(invalid="ignore"):
+                candidates = ~result & (x >= min_x) & (x <= max_x) & (y >= min_y) & (y <= max_y)
+            idx = np.nonzero(candidates)[0]
+            if not len(idx):
+                continue
+            band_of = np.minimum(((y[idx] - min_y) / band_h).astype(int), len(bands) - 1)
+            counts = sizes[band_of]
+            total = int(counts.sum())
+            if not total:
+                continue
+            # Paar k gehört zu Punkt pair_point[k] und Kante pair_edge[k]
+            pair_point = np.repeat(np.arange(len(idx)), counts)
+            offsets = np.repeat(np.cumsum(counts) - counts, counts)
+            pair_edge = np.arange(total) - offsets + np.repeat(starts[band_of], counts)
+            x1, y1, x2, y2 = flat[:, pair_edge]
+            px, py = x[idx][pair_point], y[idx][pair_point]
+            crosses = ((y1 > py) != (y2 > py)) & (px < (x2 - x1) * (py - y1) / (y2 - y1) + x1)
+            inside = np.bincount(pair_point, weights=crosses, minlength=len(idx)) % 2 == 1
+            result[idx[inside]] = True
+        return result.tolist()
@@ -0,0 +1,219 @@
+"""
+Zeitmessung und Lauf-Report für die stündliche Pipeline.
+
+Jeder Schritt (ein Query in overpass_fetch.py, eine Konvertierung in
+converter.py, ein Kanton in process_all_kantone.py) wird als Span erfasst:
+Dauer, Bytes rein/raus, Anzahl Features und – bei Overpass – wie alt der
+Datenstand des Servers (osm_base) war. Am Ende wird pro Lauf geschrieben:
+
+- <job>.json: alle Spans maschinenlesbar
+- <job>.prom: dieselben Werte im OpenMetrics-Textformat
+- eine Zusammenfassung im Job-Log und, in GitHub Actions, als Job-Summary
+
+Die Dateien landen in RUN_REPORT_DIR (Standard: $RUNNER_TEMP bzw. das
+Temp-Verzeichnis) – nicht im Repo, sonst würden sie stündlich mit
+committet. Die Workflows laden sie als Artefakt hoch.
+
+Verwendung:
+    report = RunReport("overpass")
+    with report.span("fetch", item="defis_switzerland") as s:
+        data = run_query(query)
+        s["bytes_in"] = len(raw)
+    report.finish()
+
+Für Schritte ausserhalb von Python (z.B. den Git-Commit im Workflow):
+    python run_report.py add overpass git_commit --start <unix-zeit>
+    python run_report.py summary overpass
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+REPORT_DIR = os.environ.get("RUN_REPORT_DIR") or os.environ.get("RUNNER_TEMP") or tempfile.gettempdir()
+
+# Attribute eines Spans, die als eigene Metrik exportiert werden. Mehrere
+# Spans mit gleichem Namen und Item (z.B. mehrere Mails eines Kantons)
+# werden zu einer Serie zusammengefasst, sonst gäbe es doppelte Serien.
+METRICS = {
+    "seconds": ("defi_span_seconds", "Dauer eines Schritts (Summe)", sum),
+    "bytes_in": ("defi_span_bytes_in", "Gelesene Bytes (Summe)", sum),
+    "bytes_out": ("defi_span_bytes_out", "Geschriebene Bytes (Summe)", sum),
+    "features": ("defi_span_features", "Anzahl Features (Summe)", sum),
+    "osm_base_lag_s": ("defi_osm_base_lag_seconds", "Alter des Overpass-Datenstands (osm_base, Maximum)", max),
+}
+
+SUMMARY_TOP = 10
+
+
+def osm_base_lag(timestamp) -> float | None:
+    """Sekunden zwischen osm_base ("2026-01-01T12:00:00Z") und jetzt."""
+    if not timestamp:
+        return None
+    try:
+        base = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return (datetime.now(timezone.utc) - base).total_seconds()
+
+
+def report_path(job: str, suffix: str = ".json") -> str:
+    return os.path.join(REPORT_DIR, f"{job}{suffix}")
+
+
+class RunReport:
+    """Spans eines Laufs; thread-sicher (overpass_fetch.py misst parallel)."""
+
+    def __init__(self, job: str):
+        self.job = job
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.spans = []
+        self._t0 = time.monotonic()
+        self._wall_before = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, job: str) -> "RunReport":
+        """Bestehenden Report eines Jobs weiterführen (oder neu beginnen)."""
+        report = cls(job)
+        try:
+            with open(report_path(job), encoding="utf-8") as f:
+                data = json.load(f)
+            report.started_at = data.get("started_at", report.started_at)
+            report.spans = data.get("spans", [])
+            report._wall_before = data.get("wall_seconds", 0.0)
+        except (FileNotFoundError, json.JSONDecodeError):
+            pass
+        return report
+
+    @contextmanager
+    def span(self, name: str, item: str = "", **attrs):
+        """Misst den Block; Attribute können im Block ergänzt werden."""
+        t0 = time.monotonic()
+        try:
+            yield attrs
+        finally:
+            self.add(name, time.monotonic() - t0, item, **attrs)
+
+    def add(self, name: str, seconds: float, item: str = "", **attrs):
+        """Span hinzufügen, der anderswo gemessen wurde (z.B. im Worker-Prozess)."""
+        span = {"name": name, "item": item, "seconds": round(seconds, 4)}
+        span.update((k, v) for k, v in attrs.items() if v is not None)
+        with self._lock:
+            self.spans.append(span)
+
+    def totals(self) -> dict:
+        """Summe der Dauer pro Span-Name."""
+        totals = {}
+        for span in self.spans:
+            totals[span["name"]] = totals.get(span["name"], 0.0) + span["seconds"]
+        return totals
+
+    def to_json(self) -> dict:
+        return {
+            "job": self.job,
+            "started_at": self.started_at,
+            "wall_seconds": round(self._wall_before + time.monotonic() - self._t0, 3),
+            "totals": {k: round(v, 3) for k, v in sorted(self.totals().items())},
+            "spans": self.spans,
+        }
+
+    def to_openmetrics(self) -> str:
+        # Spans pro (Name, Item), in der Reihenfolge ihres ersten Auftretens
+        series = {}
+        for s in self.spans:
+            series.setdefault((s["name"], s["item"]), []).append(s)
+        lines = ["# TYPE defi_span_count gauge", "# HELP defi_span_count Anzahl Spans"]
+        lines += [f"defi_span_count{{{self._labels(*key)}}} {len(spans)}" for key, spans in series.items()]
+        for attr, (metric, help_text, aggregate) in METRICS.items():
+            samples = [(key, [s[attr] for s in spans if attr in s]) for key, spans in series.items()]
+            samples = [(key, values) for key, values in samples if values]
+            if not samples:
+                continue
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"# HELP {metric} {help_text}")
+            for key, values in samples:
+                lines.append(f"{metric}{{{self._labels(*key)}}} {round(aggregate(values), 4)}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def _labels(self, name, item) -> str:
+        return f'job="{_escape(self.job)}",span="{_escape(name)}",item="{_escape(item)}"'
+
+    def write(self) -> str:
+        os.makedirs(REPORT_DIR, exist_ok=True)
+        path = report_path(self.job)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, ensure_ascii=False, indent=2)
+        with open(report_path(self.job, ".prom"), "w", encoding="utf-8") as f:
+            f.write(self.to_openmetrics())
+        return path
+
+    def summary_lines(self) -> list:
+        totals = sorted(self.totals().items(), key=lambda kv: kv[1], reverse=True)
+        lines = [f"Laufzeit nach Schritt ({self.job}):"]
+        lines += [f"  {name:<20} {seconds:8.1f}s" for name, seconds in totals]
+        slowest = sorted(self.spans, key=lambda s: s["seconds"], reverse=True)[:SUMMARY_TOP]
+        lines.append("Langsamste Spans:")
+        for s in slowest:
+            extra = _describe(s)
+            lines.append(f"  {s['name']:<12} {s['item']:<28} {s['seconds']:8.2f}s" + (f"  ({extra})" if extra else ""))
+        return lines
+
+    def finish(self) -> str:
+        """Report schreiben und zusammenfassen; gibt den JSON-Pfad zurück."""
+        path = self.write()
+        lines = self.summary_lines()
+        print("\n" + "\n".join(lines) + f"\nRun-Report: {path}")
+
+        summary_file = os.environ.get("GITHUB_STEP_SUMMARY")
+        if summary_file:
+            with open(summary_file, "a", encoding="utf-8") as f:
+                f.write(f"\n### Run-Report {self.job}\n\n```\n" + "\n".join(lines) + "\n```\n")
+        return path
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _describe(span) -> str:
+    parts = []
+    if "features" in span:
+        parts.append(f"{span['features']} Features")
+    if "bytes_in" in span:
+        parts.append(f"{span['bytes_in'] / 1024:.0f} KB rein")
+    if "bytes_out" in span:
+        parts.append(f"{span['bytes_out'] / 1024:.0f} KB raus")
+    if "osm_base_lag_s" in span:
+        parts.append(f"osm_base {span['osm_base_lag_s']:.0f}s alt")
+    return ", ".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    add = sub.add_parser("add", help="Span zu einem bestehenden Report hinzufügen")
+    add.add_argument("job")
+    add.add_argument("name")
+    add.add_argument("--start", type=float, required=True, help="Startzeit (Unix-Sekunden)")
+    add.add_argument("--item", default="")
+    summary = sub.add_parser("summary", help="Report zusammenfassen")
+    summary.add_argument("job")
+    args = parser.parse_args()
+
+    report = RunReport.load(args.job)
+    if args.command == "add":
+        report.add(args.name, time.time() - args.start, args.item)
+        report.write()
+    else:
+        report.finish()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,20 @@
 """
-Erzeugt das HTML für den wöchentlichen Änderungs-Report aus einer
-pending_changes_<id>.json Datei.
+Erzeugt das HTML für den wöchentlichen Änderungs-Report aus dem
+Pending-Store .reporting/pending_changes_<id>.sqlite (siehe pending_store.py).
 
 Verwendung:
     python build_weekly_report.py <pending_file> <kanton_name> <output_html>
 """
 
-import json
 import html
 import sys
 from datetime import datetime, timezone
 
-DEFIKARTE_LOGO_URL = "https://github.com/defikarte/defi_data/raw/main/img/logo.png"
-
+from defi_features import maps_links
+from geojson_diff import POSITION_FIELD
+from pending_store import PendingStore
 
-def maps_links(lon, lat, key=None):
-    links = []
-    if key and key.startswith(("node/", "way/", "relation/")):
-        links.append(f'<a href="https://www.openstreetmap.org/{key}">OSM</a>')
-    elif lon is not None and lat is not None:
-        links.append(f'<a href="https://www.openstreetmap.org/?mlat={lat}&mlon={lon}#map=19/{lat}/{lon}">OSM</a>')
-    if lon is not None and lat is not None:
-        links.append(f'<a href="https://www.google.com/maps?q={lat},{lon}">Google Maps</a>')
-    return " | ".join(links)
+DEFIKARTE_LOGO_URL = "https://github.com/defikarte/defi_data/raw/main/img/logo.png"
 
 
 def main():
@@ -30,8 +22,8 @@ def main():
     kanton_name = sys.argv[2]
     output_file = sys.argv[3]
 
-    with open(pending_file, encoding="utf-8") as f:
-        entries = json.load(f)
+    with PendingStore(pending_file, readonly=True) as store:
+        entries = store.entries()
 
     rows = []
     for e in entries:
@@ -42,10 +34,11 @@ def main():
         changes = e.get("changes", [])
         detected = e.get("detected_at", "")[:10]
         links = maps_links(lon, lat, key)
+        moved = any(f[0] == POSITION_FIELD for f in e.get("fields", []))
 
         rows.append(f"""
-        <tr class="changed">
-          <td>geändert</td>
+        <tr class="{'moved' if moved else 'changed'}">
+          <td>{'verschoben' if moved else 'geändert'}</td>
           <td>{html.escape(name)}<br><small>ID: {html.escape(key)}</small></td>
           <td>{html.escape(addr)}</td>
           <td>{html.escape(f"{lon}, {lat}") if lon is not None and lat is not None else ""}</td>
@@ -66,6 +59,7 @@ def main():
     th, td {{ border: 1px solid #ddd; padding: 8px; vertical-align: top; }}
     th {{ background-color: #f4f4f4; }}
     tr.changed {{ background-color: #fff8e6; }}
+    tr.moved {{ background-color: #e6f0ff; }}
     small {{ color: #666; }}
     </style>
     </head>
@@ -82,7 +76,7 @@ def main():
       {"".join(rows)}
     </table>
     <br>
-    <p>Zur Erklärung: Die Tabelle zeigt geänderte Datensätze mit Pfeilen alt → neu.</p>
+    <p>Zur Erklärung: Die Tabelle zeigt geänderte Datensätze mit Pfeilen alt → neu, verschobene mit der Distanz seit Wochenbeginn.</p>
     <h6>Dies ist eine automatisch generierte E-Mail von defikarte.ch</h6>
     </body>
     </html>
@@ -0,0 +1,235 @@
+"""
+Gemeinsames Feature-Modell für die Reporting-Scripts (Diff, BE-Diff,
+Validierung, Wochenreport).
+
+Früher hatte jedes Script eigene Kopien von coords/address/get_key/
+normalize_osm_id/maps_links. Hier gibt es sie einmal:
+
+- Defibrillator: kompakter Datensatz (__slots__) pro Feature, einmal pro
+  Datei geparst; Adresse, Kartenlinks und das Tupel der relevanten Felder
+  (für den Vergleich im Diff) werden erst bei Bedarf berechnet
+- load()/loads()/index(): GeoJSON-Datei bzw. -Text -> Liste bzw. Dict
+  key -> Defibrillator
+- load_snapshot()/changed_indexes(): für Dateien im kanonischen Format von
+  osm_to_geojson.py (ein Feature pro Zeile) werden nur die Zeilen geparst,
+  die sich zwischen zwei Ständen unterscheiden
+- die bisherigen Hilfsfunktionen mit unverändertem Verhalten
+
+Verwendung (die Scripts laufen als "python3 scripts/<name>.py", scripts/
+liegt damit auf dem Importpfad):
+    from defi_features import load, index
+"""
+
+import json
+import re
+
+RELEVANT_FIELDS = [
+    "name", "status", "operator", "phone", "access", "opening_hours",
+    "defibrillator:location", "description", "level",
+    "addr:street", "addr:housenumber", "addr:postcode", "addr:city", "indoor",
+]
+
+ID_PROPERTIES = ("@id", "osm_id", "osm:id", "id", "osmid", "osmId")
+
+# Anfang der von osm_to_geojson.dumps_geojson geschriebenen Dateien
+CANONICAL_HEADER = '{"type":"FeatureCollection","features":[\n'
+
+_OSM_KEY_RE = re.compile(r"^(node|way|relation)/\d+$")
+_NUMERIC_RE = re.compile(r"^\d+$")
+
+
+def normalize_osm_id(s) -> str:
+    s = str(s).strip()
+    if _OSM_KEY_RE.match(s):
+        return s
+    if _NUMERIC_RE.match(s):
+        return f"node/{s}"
+    return s
+
+
+def coords(feature):
+    try:
+        g = feature.get("geometry") or {}
+        if g.get("type") != "Point":
+            return None, None
+        c = g.get("coordinates")
+        if not (isinstance(c, list) and len(c) >= 2):
+            return None, None
+        return c[0], c[1]  # lon, lat
+    except Exception:
+        return None, None
+
+
+def address(props: dict):
+    parts = []
+    street = props.get("addr:street")
+    housenumber = props.get("addr:housenumber")
+    postcode = props.get("addr:postcode")
+    city = props.get("addr:city")
+    if street or housenumber:
+        parts.append(" ".join(p for p in [street, housenumber] if p))
+    if postcode or city:
+        parts.append(" ".join(p for p in [postcode, city] if p))
+    return ", ".join(parts) if parts else None
+
+
+def _key(props: dict, feature_id, lon, lat) -> str | None:
+    for k in ID_PROPERTIES:
+        v = props.get(k)
+        if v is not None and str(v).strip():
+            return normalize_osm_id(v)
+    if feature_id is not None and str(feature_id).strip():
+        return normalize_osm_id(feature_id)
+    if lon is not None and lat is not None:
+        return f"fallback:{props.get('name', '')}:{lon}:{lat}"
+    return None
+
+
+def get_key(feature) -> str | None:
+    lon, lat = coords(feature)
+    return _key(feature.get("properties", {}) or {}, feature.get("id"), lon, lat)
+
+
+def osm_url(key: str) -> str:
+    return f"https://www.openstreetmap.org/{key}"
+
+
+def maps_links(lon, lat, key=None):
+    links = []
+    if key and key.startswith(("node/", "way/", "relation/")):
+        links.append(f'<a href="{osm_url(key)}">OSM</a>')
+    elif lon is not None and lat is not None:
+        links.append(f'<a href="https://www.openstreetmap.org/?mlat={lat}&mlon={lon}#map=19/{lat}/{lon}">OSM</a>')
+    if lon is not None and lat is not None:
+        links.append(f'<a href="https://www.google.com/maps?q={lat},{lon}">Google Maps</a>')
+    return " | ".join(links)
+
+
+_UNSET = object()
+
+
+class Defibrillator:
+    """Ein Defi-Standort aus einem GeoJSON-Feature."""
+
+    __slots__ = ("key", "lon", "lat", "props", "_address", "_links", "_relevant")
+
+    def __init__(self, key, lon, lat, props):
+        self.key = key
+        self.lon = lon
+        self.lat = lat
+        self.props = props
+        self._address = _UNSET
+        self._links = None
+        self._relevant = None
+
+    @classmethod
+    def from_feature(cls, feature: dict) -> "Defibrillator":
+        props = feature.get("properties", {}) or {}
+        lon, lat = coords(feature)
+        return cls(_key(props, feature.get("id"), lon, lat), lon, lat, props)
+
+    @property
+    def name(self) -> str:
+        return str(self.props.get("name", "(ohne Name)"))
+
+    @property
+    def address(self):
+        if self._address is _UNSET:
+            self._address = address(self.props)
+        return self._address
+
+    @property
+    def links(self) -> str:
+        if self._links is None:
+            self._links = maps_links(self.lon, self.lat, self.key)
+        return self._links
+
+    @property
+    def relevant(self) -> tuple:
+        """Alle RELEVANT_FIELDS plus Koordinaten als ein Tupel.
+
+        Zwei Stände mit gleichem Tupel unterscheiden sich in keinem
+        relevanten Feld. Kein Hash: das Tupel wird pro Defi neu gebaut und
+        lohnt sich nur für die wenigen Zeilen, die changed_indexes() übrig
+        lässt.
+        """
+        if self._relevant is None:
+            self._relevant = (*map(self.props.get, RELEVANT_FIELDS), self.lon, self.lat)
+        return self._relevant
+
+    def get(self, field, default=None):
+        return self.props.get(field, default)
+
+
+def from_collection(data: dict) -> list:
+    """Geparste FeatureCollection -> Liste von Defibrillator."""
+    return [Defibrillator.from_feature(f) for f in data.get("features", []) or []]
+
+
+def loads(text) -> list:
+    """GeoJSON-Text (str oder bytes) -> Liste von Defibrillator."""
+    return from_collection(json.loads(text))
+
+
+def load(path: str) -> list:
+    """GeoJSON-Datei einmal parsen -> Liste von Defibrillator."""
+    with open(path, encoding="utf-8") as f:
+        return from_collection(json.load(f))
+
+
+def index(defis) -> dict:
+    """key -> Defibrillator (Einträge ohne Schlüssel fallen weg)."""
+    return {d.key: d for d in defis if d.key}
+
+
+def feature_lines(text):
+    """Feature-Zeilen einer Datei im kanonischen Format (ein Feature pro
+    Zeile, siehe osm_to_geojson.dumps_geojson), ungeparst als frozenset.
+
+    Gibt None zurück, wenn der Text nicht in diesem Format ist (z.B. ältere,
+    noch mit osmtogeojson geschriebene Stände). Das Komma am Zeilenende
+    wird entfernt, damit ein neues letztes Feature die bisher letzte Zeile
+    nicht "ändert".
+    """
+    if isinstance(text, bytes):
+        text = text.decode("utf-8")
+    if not text.startswith(CANONICAL_HEADER):
+        return None
+    return frozenset(
+        line.rstrip(",") for line in text[len(CANONICAL_HEADER):].split("\n") if line.startswith("{")
+    )
+
+
+def _lines_index(lines) -> dict:
+    return index(Defibrillator.from_feature(json.loads(line)) for line in lines)
+
+
+def changed_indexes(old, new):
+    """(alter, neuer) Index für diff() aus zwei Ständen.
+
+    old/new sind jeweils das Ergebnis von feature_lines() oder, für Stände
+    in anderem Format, ein fertiger Index. Sind beide kanonisch, werden nur
+    die Zeilen geparst, die nicht in beiden Ständen vorkommen; unveränderte
+    Features kosten so nur einen Set-Vergleich der Zeilen. Da jeder
+    Schlüssel nur einmal pro Datei vorkommt, liefert diff() darauf dasselbe
+    Ergebnis wie auf den vollständigen Indizes.
+    """
+    if isinstance(old, frozenset) and isinstance(new, frozenset):
+        return _lines_index(old - new), _lines_index(new - old)
+    if isinstance(old, frozenset):
+        old = _lines_index(old)
+    if isinstance(new, frozenset):
+        new = _lines_index(new)
+    return old, new
+
+
+def loads_snapshot(text):
+    """GeoJSON-Text -> feature_lines() bzw. Index (für changed_indexes)."""
+    lines = feature_lines(text)
+    return lines if lines is not None else index(loads(text))
+
+
+def load_snapshot(path: str):
+    """GeoJSON-Datei -> feature_lines() bzw. Index (für changed_indexes)."""
+    with open(path, encoding="utf-8") as f:
+        return loads_snapshot(f.read())
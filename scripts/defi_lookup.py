@@ -0,0 +1,292 @@
+"""
+Nächste Defis zu einer Koordinate – als Modul und als kleiner HTTP-Dienst
+für Leitstellen, statt die defis_dispo_*-Dateien selbst zu durchsuchen.
+
+- Die nationalen Datensätze (Schweiz und Liechtenstein) werden einmal
+  geladen und in einen KD-Baum (spatial_index.KDTree) gepackt
+- nearest(): die k nächsten Defis, within(): alle im Umkreis, jeweils mit
+  optionalen Filtern auf access, indoor und opening_hours ("24/7" =
+  rund um die Uhr laut opening_hours.py, "open_now" = jetzt offen)
+- Hot-Reload: ein Hintergrund-Thread prüft alle RELOAD_INTERVAL Sekunden
+  Grösse und Änderungszeit der Dateien. Bei einer Änderung (stündlicher
+  Overpass-Lauf) wird der neue Stand vollständig aufgebaut und dann mit
+  einer einzigen Zuweisung ausgetauscht; laufende Anfragen arbeiten auf
+  dem alten Stand zu Ende. Schlägt das Laden fehl – auch wenn eine der
+  Dateien fehlt, z.B. während sie neu geschrieben wird –, bleibt der alte
+  Stand; sonst würde etwa ein reiner Liechtenstein-Stand falsche nächste
+  Defis liefern.
+
+HTTP (GET, Antwort JSON):
+    /nearest?lat=47.37&lon=8.54&k=5&access=yes,permissive&indoor=no&opening_hours=24/7
+    /within?lat=47.37&lon=8.54&radius=500
+    /health
+
+Verwendung (aus dem Repo-Root):
+    python scripts/defi_lookup.py nearest 47.37 8.54 -k 3 --opening-hours 24/7
+    python scripts/defi_lookup.py serve --port 8080
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+# opening_hours.py liegt im Repo-Root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from defi_features import load, osm_url  # noqa: E402
+from opening_hours import always_open, is_open  # noqa: E402
+from spatial_index import KDTree  # noqa: E402
+
+SOURCES = ("data/json/defis_switzerland.geojson", "data/json/defis_liechtenstein.geojson")
+
+RELOAD_INTERVAL = float(os.environ.get("LOOKUP_RELOAD_INTERVAL", "30"))
+
+DEFAULT_K = 5
+MAX_RESULTS = 100
+MAX_RADIUS_M = 50_000
+
+FILTERS = ("access", "indoor", "opening_hours")
+OPENING_HOURS_FILTERS = ("24/7", "open_now")
+
+
+def _signature(paths):
+    """(Grösse, mtime) pro Datei; fehlende Dateien zählen mit None."""
+    result = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            result.append((st.st_size, st.st_mtime_ns))
+        except FileNotFoundError:
+            result.append(None)
+    return tuple(result)
+
+
+class Snapshot:
+    """Ein geladener Stand: Defis plus KD-Baum, danach unveränderlich.
+
+    Wirft FileNotFoundError, wenn eine der Dateien fehlt: ein Stand ohne
+    einen der Datensätze wäre unvollständig.
+    """
+
+    def __init__(self, paths):
+        self.signature = _signature(paths)
+        missing = [path for path in paths if not os.path.exists(path)]
+        if missing:
+            raise FileNotFoundError(f"Datei fehlt: {', '.join(missing)}")
+        self.defis = []
+        seen = set()
+        for path in paths:
+            for d in load(path):
+                if d.key not in seen and d.lon is not None and d.lat is not None:
+                    seen.add(d.key)
+                    self.defis.append(d)
+        self.tree = KDTree((d.lon, d.lat) for d in self.defis)
+        # Filter-Spalten einmal pro Stand, damit die Suche nur Listen indiziert
+        self.columns = {field: [d.get(field) for d in self.defis] for field in ("access", "indoor")}
+        self.always_open = [always_open(d.get("opening_hours")) is True for d in self.defis]
+        self.loaded_at = datetime.now().astimezone().isoformat(timespec="seconds")
+
+
+def make_filter(snapshot, access=None, indoor=None, opening_hours=None, now=None):
+    """Filter-Funktion index -> bool für KDTree, None wenn ungefiltert.
+
+    access und indoor sind kommagetrennte Listen erlaubter Werte.
+    """
+    if opening_hours not in (None, *OPENING_HOURS_FILTERS):
+        raise ValueError(f"opening_hours muss {' oder '.join(OPENING_HOURS_FILTERS)} sein")
+    checks = []
+    for field, allowed in (("access", access), ("indoor", indoor)):
+        if allowed:
+            column, values = snapshot.columns[field], {v.strip() for v in allowed.split(",")}
+            checks.append(lambda i, column=column, values=values: column[i] in values)
+    if opening_hours == "24/7":
+        checks.append(snapshot.always_open.__getitem__)
+    elif opening_hours == "open_now":
+        when, defis = now or datetime.now(), snapshot.defis
+        checks.append(lambda i: is_open(defis[i].get("opening_hours"), when) is True)
+    if not checks:
+        return None
+    if len(checks) == 1:
+        return checks[0]
+    return lambda i: all(check(i) for check in checks)
+
+
+def describe(d, distance) -> dict:
+    return {
+        "id": d.key,
+        "name": d.get("name"),
+        "lat": d.lat,
+        "lon": d.lon,
+        "distance_m": round(distance, 1),
+        "access": d.get("access"),
+        "indoor": d.get("indoor"),
+        "opening_hours": d.get("opening_hours"),
+        "always_available": always_open(d.get("opening_hours")),
+        "address": d.address,
+        "location": d.get("defibrillator:location"),
+        "osm": osm_url(d.key),
+    }
+
+
+class DefiLookup:
+    """Abfragen auf dem jeweils aktuellen Snapshot, mit Hot-Reload."""
+
+    def __init__(self, paths=SOURCES):
+        self.paths = tuple(paths)
+        self.snapshot = Snapshot(self.paths)
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def reload_if_changed(self) -> bool:
+        if _signature(self.paths) == self.snapshot.signature:
+            return False
+        try:
+            snapshot = Snapshot(self.paths)
+        except Exception as e:
+            # Auch unerwartete Fehler: der Reload-Thread darf nicht sterben
+            print(f"WARNUNG: Neuladen fehlgeschlagen, alter Stand bleibt: {e}", file=sys.stderr)
+            return False
+        self.snapshot = snapshot
+        print(f"Neu geladen: {len(snapshot.defis)} Defis", file=sys.stderr)
+        return True
+
+    def watch(self, interval: float = RELOAD_INTERVAL):
+        """Hintergrund-Thread, der die Dateien auf Änderungen prüft."""
+        def run():
+            while not self._stop.wait(interval):
+                self.reload_if_changed()
+        self._watcher = threading.Thread(target=run, name="defi-lookup-reload", daemon=True)
+        self._watcher.start()
+
+    def close(self):
+        self._stop.set()
+
+    def nearest(self, lat, lon, k=DEFAULT_K, **filters) -> list:
+        snapshot = self.snapshot
+        accept = make_filter(snapshot, **filters)
+        hits = snapshot.tree.nearest(lon, lat, min(k, MAX_RESULTS), accept)
+        return [describe(snapshot.defis[i], dist) for i, dist in hits]
+
+    def within(self, lat, lon, radius_m, **filters) -> list:
+        snapshot = self.snapshot
+        accept = make_filter(snapshot, **filters)
+        hits = snapshot.tree.within(lon, lat, min(radius_m, MAX_RADIUS_M), accept)
+        return [describe(snapshot.defis[i], dist) for i, dist in hits[:MAX_RESULTS]]
+
+    def health(self) -> dict:
+        snapshot = self.snapshot
+        return {"defis": len(snapshot.defis), "loaded_at": snapshot.loaded_at}
+
+
+def _params(query: str):
+    """Query-String -> (lat, lon, übrige Parameter als dict)."""
+    params = {k: v[-1] for k, v in parse_qs(query).items()}
+    lat, lon = float(_required(params, "lat")), float(_required(params, "lon"))
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("lat/lon ausserhalb des gültigen Bereichs")
+    return lat, lon, params
+
+
+def _required(params, name):
+    if name not in params:
+        raise ValueError(f"Parameter {name} fehlt")
+    return params.pop(name)
+
+
+def _filters(params) -> dict:
+    unknown = set(params) - set(FILTERS)
+    if unknown:
+        raise ValueError(f"Unbekannte Parameter: {', '.join(sorted(unknown))}")
+    return params
+
+
+class Handler(BaseHTTPRequestHandler):
+    lookup: DefiLookup = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        t0 = time.perf_counter()
+        try:
+            if url.path == "/health":
+                body = self.lookup.health()
+            elif url.path == "/nearest":
+                lat, lon, params = _params(url.query)
+                k = int(params.pop("k", DEFAULT_K))
+                body = {"results": self.lookup.nearest(lat, lon, k, **_filters(params))}
+            elif url.path == "/within":
+                lat, lon, params = _params(url.query)
+                radius = float(_required(params, "radius"))
+                body = {"results": self.lookup.within(lat, lon, radius, **_filters(params))}
+            else:
+                self._send(404, {"error": f"Unbekannter Pfad: {url.path}"})
+                return
+        except ValueError as e:
+            self._send(400, {"error": str(e)})
+            return
+        body["took_ms"] = round((time.perf_counter() - t0) * 1000, 3)
+        self._send(200, body)
+
+    def _send(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve(lookup: DefiLookup, host: str, port: int):
+    Handler.lookup = lookup
+    lookup.watch()
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"{len(lookup.snapshot.defis)} Defis geladen, http://{host}:{port}/nearest?lat=..&lon=..")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        lookup.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", action="append", help="GeoJSON-Datei (mehrfach möglich, Standard: CH + LI)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    nearest = sub.add_parser("nearest", help="k nächste Defis ausgeben")
+    nearest.add_argument("lat", type=float)
+    nearest.add_argument("lon", type=float)
+    nearest.add_argument("-k", type=int, default=DEFAULT_K)
+    nearest.add_argument("--radius", type=float, help="Stattdessen alle im Umkreis (Meter)")
+    nearest.add_argument("--access", help="z.B. yes,permissive")
+    nearest.add_argument("--indoor", help="z.B. no")
+    nearest.add_argument("--opening-hours", choices=OPENING_HOURS_FILTERS)
+    srv = sub.add_parser("serve", help="HTTP-Dienst starten")
+    srv.add_argument("--host", default="127.0.0.1")
+    srv.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    lookup = DefiLookup(args.source or SOURCES)
+    if args.command == "serve":
+        serve(lookup, args.host, args.port)
+        return
+
+    filters = {"access": args.access, "indoor": args.indoor, "opening_hours": args.opening_hours}
+    if args.radius is not None:
+        results = lookup.within(args.lat, args.lon, args.radius, **filters)
+    else:
+        results = lookup.nearest(args.lat, args.lon, args.k, **filters)
+    for r in results:
+        print(f"{r['distance_m']:8.0f} m  {r['id']:<20} {r['name'] or '(ohne Name)'}"
+              f"  [{r['access'] or '-'}, {r['opening_hours'] or '-'}]")
+
+
+if __name__ == "__main__":
+    main()
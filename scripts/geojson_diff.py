@@ -1,116 +1,194 @@
+"""
+Vergleicht zwei Stände einer GeoJSON-Datei und rendert die Änderungen als
+HTML-Mail.
+
+Als Bibliothek (process_all_kantone.py):
+    d = diff(old_idx, new_idx)      # Indizes aus defi_features.index()
+    html_body = render_html(d)      # None, wenn nichts zu melden ist
+
+Als Script (schreibt diff.html, wenn es Änderungen gibt):
+    python3 scripts/geojson_diff.py <alt.geojson> <neu.geojson>
+
+Verschiebungen unter MOVE_THRESHOLD_M werden nicht gemeldet, aber auch
+nicht vergessen: diff() merkt sich für solche Defis die zuletzt gemeldete
+Position ("Anker", Diff.anchors) und misst spätere Verschiebungen von dort
+aus. Viele kleine Korrekturen fallen so spätestens auf, wenn sie zusammen
+die Schwelle erreichen. process_all_kantone.py speichert die Anker pro
+Kanton in .reporting/move_anchors_<id>.json (anchors_path).
+"""
+
 import json
+import os
 import sys
 import html
-import re
 
-old_file = sys.argv[1]
-new_file = sys.argv[2]
+from defi_features import RELEVANT_FIELDS, Defibrillator, changed_indexes, load_snapshot
+from spatial_index import haversine_m
 
 DEFIKARTE_LOGO_URL = "https://github.com/defikarte/defi_data/raw/main/img/logo.png"
 
-RELEVANT_FIELDS = [
-    "name", "status", "operator", "phone", "access", "opening_hours",
-    "defibrillator:location", "description", "level",
-    "addr:street", "addr:housenumber", "addr:postcode", "addr:city", "indoor",
-]
+CSS_CLASS = {"neu": "new", "gelöscht": "removed", "geändert": "changed", "verschoben": "moved"}
+
+# Ab dieser Distanz gilt ein Defi als verschoben; kleinere Korrekturen der
+# Position werden nicht gemeldet.
+MOVE_THRESHOLD_M = float(os.environ.get("DIFF_MOVE_THRESHOLD_M", "50"))
+
+# Pseudo-Feld für die Position in Feld-Deltas (Werte: [lon, lat])
+POSITION_FIELD = "position"
+
+
+class Diff:
+    """Neue, gelöschte, geänderte und verschobene Defis zwischen zwei Ständen.
+
+    added/removed: Listen von Defibrillator (sortiert nach Schlüssel)
+    changed: Liste von (Defibrillator alt, Defibrillator neu, [Änderungstexte])
+    moved: Liste von (Defibrillator alt, Defibrillator neu, Distanz in m,
+        [Änderungstexte]) – verschobene Defis, ggf. mit geänderten Feldern;
+        sie stehen nicht zusätzlich in changed. "alt" steht dabei an der
+        zuletzt gemeldeten Position (Anker), falls es eine gibt
+    anchors: Schlüssel -> [lon, lat] der zuletzt gemeldeten Position aller
+        Defis mit noch nicht gemeldeter Verschiebung (Stand nach diesem Diff)
+    """
+
+    __slots__ = ("added", "removed", "changed", "moved", "anchors")
+
+    def __init__(self, added, removed, changed, moved=(), anchors=None):
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        self.moved = list(moved)
+        self.anchors = anchors if anchors is not None else {}
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.changed or self.moved)
+
+    @property
+    def summary(self) -> dict:
+        return {"neu": len(self.added), "geändert": len(self.changed),
+                "verschoben": len(self.moved), "gelöscht": len(self.removed)}
+
+
+def field_deltas(op: dict, np: dict) -> list:
+    """(Feld, alt, neu) für alle geänderten RELEVANT_FIELDS."""
+    return [(f, op.get(f), np.get(f)) for f in RELEVANT_FIELDS if op.get(f) != np.get(f)]
+
+
+def format_move(old, new, distance=None) -> str:
+    """Positionsänderung als Text; old/new sind [lon, lat]."""
+    if distance is None:
+        distance = haversine_m([old[0]], [old[1]], [new[0]], [new[1]])[0]
+    return f"verschoben um {distance:.0f} m: {old[0]}, {old[1]} → {new[0]}, {new[1]}"
+
+
+def format_change(field, old, new) -> str:
+    if field == POSITION_FIELD:
+        return format_move(old, new)
+    return f"{field}: '{old}' → '{new}'"
+
+
+def field_changes(op: dict, np: dict) -> list:
+    return [format_change(*delta) for delta in field_deltas(op, np)]
 
-def load(path: str):
-    with open(path, encoding="utf-8") as f:
-        return json.load(f)
 
-def coords(feature):
+def diff(old_idx: dict, new_idx: dict, anchors=None) -> Diff:
+    """Vergleicht zwei Indizes key -> Defibrillator (siehe defi_features.index).
+
+    Join über die Schlüssel der beiden Dicts: pro gemeinsamem Defi wird
+    zuerst das Tupel der relevanten Felder (Defibrillator.relevant)
+    verglichen, Feld für Feld nur bei Abweichung. Mit changed_indexes()
+    enthalten die Indizes nur noch die geänderten Zeilen. Sortiert werden nur
+    die (wenigen) Treffer, nicht alle Schlüssel. Die Distanzen aller
+    Positionsänderungen werden in einem Schritt berechnet (haversine_m);
+    ab MOVE_THRESHOLD_M gilt ein Defi als verschoben.
+
+    anchors (Schlüssel -> [lon, lat], siehe Diff.anchors) ist der Stand des
+    vorherigen Diffs; gemessen wird ab dem Anker statt ab dem alten Stand.
+    """
+    anchors = dict(anchors or {})
+    added = [new_idx[k] for k in sorted(new_idx.keys() - old_idx.keys())]
+    removed = [old_idx[k] for k in sorted(old_idx.keys() - new_idx.keys())]
+    for defi in removed:
+        anchors.pop(defi.key, None)
+    candidates = []
+    for k, new in new_idx.items():
+        old = old_idx.get(k)
+        if old is None or old.props is new.props or old.relevant == new.relevant:
+            continue
+        candidates.append(k)
+    candidates.sort()
+
+    relocated = [
+        k for k in candidates
+        if (old_idx[k].lon, old_idx[k].lat) != (new_idx[k].lon, new_idx[k].lat)
+        and None not in (old_idx[k].lon, old_idx[k].lat, new_idx[k].lon, new_idx[k].lat)
+    ]
+    origins = {k: anchors.get(k) or [old_idx[k].lon, old_idx[k].lat] for k in relocated}
+    distances = dict(zip(relocated, haversine_m(
+        [origins[k][0] for k in relocated], [origins[k][1] for k in relocated],
+        [new_idx[k].lon for k in relocated], [new_idx[k].lat for k in relocated],
+    )))
+
+    changed = []
+    moved = []
+    for k in candidates:
+        old, new = old_idx[k], new_idx[k]
+        changes = field_changes(old.props, new.props)
+        distance = distances.get(k, 0.0)
+        if distance >= MOVE_THRESHOLD_M:
+            if k in anchors:
+                # Gemeldet wird die Verschiebung seit der letzten Meldung
+                lon, lat = anchors.pop(k)
+                old = Defibrillator(old.key, lon, lat, old.props)
+            moved.append((old, new, distance, changes))
+        else:
+            if k in relocated:
+                if distance:
+                    anchors[k] = origins[k]
+                else:
+                    # Zurück an der gemeldeten Position
+                    anchors.pop(k, None)
+            if changes:
+                changed.append((old, new, changes))
+    return Diff(added, removed, changed, moved, anchors)
+
+
+def anchors_path(kid: str) -> str:
+    return f".reporting/move_anchors_{kid}.json"
+
+
+def load_anchors(path: str) -> dict:
     try:
-        g = feature.get("geometry") or {}
-        if g.get("type") != "Point":
-            return None, None
-        c = g.get("coordinates")
-        if not (isinstance(c, list) and len(c) >= 2):
-            return None, None
-        return c[0], c[1]
-    except Exception:
-        return None, None
-
-def address(props: dict):
-    parts = []
-    street = props.get("addr:street")
-    housenumber = props.get("addr:housenumber")
-    postcode = props.get("addr:postcode")
-    city = props.get("addr:city")
-    if street or housenumber:
-        parts.append(" ".join(p for p in [street, housenumber] if p))
-    if postcode or city:
-        parts.append(" ".join(p for p in [postcode, city] if p))
-    return ", ".join(parts) if parts else None
-
-def normalize_osm_id(s: str) -> str:
-    s = str(s).strip()
-    if re.match(r"^(node|way|relation)/\d+$", s):
-        return s
-    if re.match(r"^\d+$", s):
-        return f"node/{s}"
-    return s
-
-def get_key(feature):
-    p = feature.get("properties", {}) or {}
-    for k in ("@id", "osm_id", "osm:id", "id", "osmid", "osmId"):
-        v = p.get(k)
-        if v is not None and str(v).strip():
-            return normalize_osm_id(v)
-    v = feature.get("id")
-    if v is not None and str(v).strip():
-        return normalize_osm_id(v)
-    lon, lat = coords(feature)
-    name = p.get("name", "")
-    if lon is not None and lat is not None:
-        return f"fallback:{name}:{lon}:{lat}"
-    return None
-
-def osm_url(key: str) -> str:
-    return f"https://www.openstreetmap.org/{key}"
-
-def maps_links(lon, lat, key=None):
-    links = []
-    if key and key.startswith(("node/", "way/", "relation/")):
-        links.append(f'<a href="{osm_url(key)}">OSM</a>')
-    elif lon is not None and lat is not None:
-        links.append(f'<a href="https://www.openstreetmap.org/?mlat={lat}&mlon={lon}#map=19/{lat}/{lon}">OSM</a>')
-    if lon is not None and lat is not None:
-        links.append(f'<a href="https://www.google.com/maps?q={lat},{lon}">Google Maps</a>')
-    return " | ".join(links)
-
-def index(features):
-    out = {}
-    for f in features:
-        k = get_key(f)
-        if k:
-            out[k] = f
-    return out
-
-def props(feature):
-    return feature.get("properties", {}) or {}
-
-old = load(old_file)
-new = load(new_file)
-
-old_idx = index(old.get("features", []) or [])
-new_idx = index(new.get("features", []) or [])
-
-added   = sorted(set(new_idx) - set(old_idx))
-removed = sorted(set(old_idx) - set(new_idx))
-common  = sorted(set(new_idx) & set(old_idx))
-
-rows = []
-summary = {"neu": 0, "geändert": 0, "gelöscht": 0}
-
-def add_row(category, feature, changes=None):
-    p = props(feature)
-    lon, lat = coords(feature)
-    key = get_key(feature)
-    addr = address(p)
-    links = maps_links(lon, lat, key)
-    css = {"neu": "new", "gelöscht": "removed", "geändert": "changed"}[category]
-    name = str(p.get("name", "(ohne Name)"))
-    rows.append(f"""
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_anchors(path: str, anchors: dict) -> None:
+    """Anker speichern; ohne Anker wird die Datei entfernt."""
+    if not anchors:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(anchors, f, sort_keys=True, indent=1)
+        f.write("\n")
+
+
+def move_changes(old, new, distance, changes) -> list:
+    """Details-Texte eines verschobenen Defis: Verschiebung, dann Felder."""
+    return [format_move([old.lon, old.lat], [new.lon, new.lat], distance)] + changes
+
+
+def build_row(category, defi, changes=None):
+    lon, lat = defi.lon, defi.lat
+    key = defi.key
+    addr = defi.address
+    links = defi.links
+    css = CSS_CLASS[category]
+    name = defi.name
+    return f"""
     <tr class="{css}">
       <td>{html.escape(category)}</td>
       <td>{html.escape(name)}<br><small>ID: {html.escape(key or "")}</small></td>
@@ -119,31 +197,21 @@ def add_row(category, feature, changes=None):
       <td>{links}</td>
       <td>{("<br>".join(html.escape(c) for c in changes)) if changes else ""}</td>
     </tr>
-    """)
-
-for k in added:
-    add_row("neu", new_idx[k])
-    summary["neu"] += 1
-
-for k in removed:
-    add_row("gelöscht", old_idx[k])
-    summary["gelöscht"] += 1
-
-for k in common:
-    op = props(old_idx[k])
-    np = props(new_idx[k])
-    changes = []
-    for f in RELEVANT_FIELDS:
-        if op.get(f) != np.get(f):
-            changes.append(f"{f}: '{op.get(f)}' → '{np.get(f)}'")
-    if changes:
-        add_row("geändert", new_idx[k], changes)
-        summary["geändert"] += 1
-
-if not rows:
-    sys.exit(0)
-
-html_mail = f"""
+    """
+
+
+def render_html(d: Diff):
+    """HTML-Mail für alle Änderungen, oder None wenn es keine gibt."""
+    if not d:
+        return None
+
+    rows = [build_row("neu", defi) for defi in d.added]
+    rows += [build_row("gelöscht", defi) for defi in d.removed]
+    rows += [build_row("verschoben", m[1], move_changes(*m)) for m in d.moved]
+    rows += [build_row("geändert", new, changes) for _, new, changes in d.changed]
+    summary = d.summary
+
+    return f"""
 <html>
 <head>
 <meta charset="utf-8"/>
@@ -155,13 +223,14 @@ th {{ background-color: #f4f4f4; }}
 tr.new {{ background-color: #e6ffe6; }}
 tr.removed {{ background-color: #ffe6e6; }}
 tr.changed {{ background-color: #fff8e6; }}
+tr.moved {{ background-color: #e6f0ff; }}
 small {{ color: #666; }}
 </style>
 </head>
 <body>
 <img src="{DEFIKARTE_LOGO_URL}" alt="defikarte.ch" style="width:200px;"/>
 <h2>Änderungen an Defibrillatoren im Einzugsgebiet.</h2>
-<p><strong>Zusammenfassung:</strong> {summary['neu']} neu, {summary['geändert']} geändert, {summary['gelöscht']} gelöscht</p>
+<p><strong>Zusammenfassung:</strong> {summary['neu']} neu, {summary['geändert']} geändert, {summary['verschoben']} verschoben, {summary['gelöscht']} gelöscht</p>
 <table class="data">
   <tr>
     <th>Status</th>
@@ -174,12 +243,25 @@ small {{ color: #666; }}
   {''.join(rows)}
 </table>
 <br>
-<p>Zur Erklärung: Die Tabelle zeigt immer den Status (neu, geändert, gelöscht) des neuen Datensatzes an. Weiter sind die Änderungen mit Pfeilen alt/neu gekennzeichnet.</p>
+<p>Zur Erklärung: Die Tabelle zeigt immer den Status (neu, geändert, verschoben, gelöscht) des neuen Datensatzes an. Weiter sind die Änderungen mit Pfeilen alt/neu gekennzeichnet, bei verschobenen Defis mit der Distanz (ab {MOVE_THRESHOLD_M:.0f} m).</p>
 <br>
 <h6>Dies ist eine automatisch generierte E-Mail von defikarte.ch</h6>
 </body>
 </html>
 """
 
-with open("diff.html", "w", encoding="utf-8") as f:
-    f.write(html_mail)
+
+def main():
+    old_file = sys.argv[1]
+    new_file = sys.argv[2]
+
+    html_mail = render_html(diff(*changed_indexes(load_snapshot(old_file), load_snapshot(new_file))))
+    if html_mail is None:
+        sys.exit(0)
+
+    with open("diff.html", "w", encoding="utf-8") as f:
+        f.write(html_mail)
+
+
+if __name__ == "__main__":
+    main()
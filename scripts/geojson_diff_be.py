@@ -1,112 +1,26 @@
-import json
+"""
+BE-Stil: neue und gelöschte Defis sofort als HTML-Mail, geänderte werden im
+Pending-Store (SQLite, siehe pending_store.py) gesammelt und wöchentlich
+versendet (build_weekly_report.py).
+
+Als Bibliothek (process_all_kantone.py):
+    d = diff(old_idx, new_idx)
+    update_pending(pending_file, pending_entries(d))
+    html_body = render_immediate_html(d)   # None ohne neue/gelöschte
+
+Als Script (schreibt diff_immediate.html, wenn es neue/gelöschte gibt):
+    python3 scripts/geojson_diff_be.py <alt.geojson> <neu.geojson> [pending_file]
+"""
+
 import sys
-import html
-import re
-import os
 from datetime import datetime, timezone
 
-old_file = sys.argv[1]
-new_file = sys.argv[2]
-pending_file = sys.argv[3] if len(sys.argv) > 3 else ".reporting/pending_changes_be.json"
-
-DEFIKARTE_LOGO_URL = "https://github.com/defikarte/defi_data/raw/main/img/logo.png"
-
-RELEVANT_FIELDS = [
-    "name", "status", "operator", "phone", "access", "opening_hours",
-    "defibrillator:location", "description", "level",
-    "addr:street", "addr:housenumber", "addr:postcode", "addr:city", "indoor",
-]
-
-def load(path: str):
-    with open(path, encoding="utf-8") as f:
-        return json.load(f)
-
-def coords(feature):
-    try:
-        g = feature.get("geometry") or {}
-        if g.get("type") != "Point":
-            return None, None
-        c = g.get("coordinates")
-        if not (isinstance(c, list) and len(c) >= 2):
-            return None, None
-        return c[0], c[1]
-    except Exception:
-        return None, None
-
-def address(props: dict):
-    parts = []
-    street = props.get("addr:street")
-    housenumber = props.get("addr:housenumber")
-    postcode = props.get("addr:postcode")
-    city = props.get("addr:city")
-    if street or housenumber:
-        parts.append(" ".join(p for p in [street, housenumber] if p))
-    if postcode or city:
-        parts.append(" ".join(p for p in [postcode, city] if p))
-    return ", ".join(parts) if parts else None
-
-def normalize_osm_id(s: str) -> str:
-    s = str(s).strip()
-    if re.match(r"^(node|way|relation)/\d+$", s):
-        return s
-    if re.match(r"^\d+$", s):
-        return f"node/{s}"
-    return s
-
-def get_key(feature) -> str | None:
-    p = feature.get("properties", {}) or {}
-    for k in ("@id", "osm_id", "osm:id", "id", "osmid", "osmId"):
-        v = p.get(k)
-        if v is not None and str(v).strip():
-            return normalize_osm_id(v)
-    v = feature.get("id")
-    if v is not None and str(v).strip():
-        return normalize_osm_id(v)
-    lon, lat = coords(feature)
-    name = p.get("name", "")
-    if lon is not None and lat is not None:
-        return f"fallback:{name}:{lon}:{lat}"
-    return None
-
-def maps_links(lon, lat, key=None):
-    links = []
-    if key and key.startswith(("node/", "way/", "relation/")):
-        links.append(f'<a href="https://www.openstreetmap.org/{key}">OSM</a>')
-    elif lon is not None and lat is not None:
-        links.append(f'<a href="https://www.openstreetmap.org/?mlat={lat}&mlon={lon}#map=19/{lat}/{lon}">OSM</a>')
-    if lon is not None and lat is not None:
-        links.append(f'<a href="https://www.google.com/maps?q={lat},{lon}">Google Maps</a>')
-    return " | ".join(links)
-
-def index(features):
-    out = {}
-    for f in features:
-        k = get_key(f)
-        if k:
-            out[k] = f
-    return out
-
-def props(feature):
-    return feature.get("properties", {}) or {}
-
-def build_row(category, feature, changes=None):
-    p = props(feature)
-    lon, lat = coords(feature)
-    key = get_key(feature)
-    addr = address(p)
-    links = maps_links(lon, lat, key)
-    css = {"neu": "new", "gelöscht": "removed", "geändert": "changed"}[category]
-    name = str(p.get("name", "(ohne Name)"))
-    return f"""
-    <tr class="{css}">
-      <td>{html.escape(category)}</td>
-      <td>{html.escape(name)}<br><small>ID: {html.escape(key or "")}</small></td>
-      <td>{html.escape(addr) if addr else ""}</td>
-      <td>{html.escape(f"{lon}, {lat}") if lon is not None and lat is not None else ""}</td>
-      <td>{links}</td>
-      <td>{("<br>".join(html.escape(c) for c in changes)) if changes else ""}</td>
-    </tr>
-    """
+from defi_features import changed_indexes, load_snapshot
+from geojson_diff import DEFIKARTE_LOGO_URL, POSITION_FIELD, build_row, diff, field_deltas
+from pending_store import PendingStore, pending_path
+
+DEFAULT_PENDING_FILE = pending_path("be")
+
 
 def build_html(rows, summary):
     return f"""
@@ -142,69 +56,68 @@ small {{ color: #666; }}
 </html>
 """
 
-old = load(old_file)
-new = load(new_file)
-
-old_idx = index(old.get("features", []) or [])
-new_idx = index(new.get("features", []) or [])
-
-added   = sorted(set(new_idx) - set(old_idx))
-removed = sorted(set(old_idx) - set(new_idx))
-common  = sorted(set(new_idx) & set(old_idx))
-
-immediate_rows = []
-immediate_summary = {"neu": 0, "gelöscht": 0}
-
-for k in added:
-    immediate_rows.append(build_row("neu", new_idx[k]))
-    immediate_summary["neu"] += 1
-
-for k in removed:
-    immediate_rows.append(build_row("gelöscht", old_idx[k]))
-    immediate_summary["gelöscht"] += 1
-
-changed_entries = []
-for k in common:
-    op = props(old_idx[k])
-    np = props(new_idx[k])
-    changes = []
-    for f in RELEVANT_FIELDS:
-        if op.get(f) != np.get(f):
-            changes.append(f"{f}: '{op.get(f)}' → '{np.get(f)}'")
-    if changes:
-        lon, lat = coords(new_idx[k])
-        changed_entries.append({
-            "key": k,
-            "name": np.get("name", "(ohne Name)"),
-            "address": address(np),
-            "lon": lon,
-            "lat": lat,
-            "changes": changes,
-            "detected_at": datetime.now(timezone.utc).isoformat(),
-        })
-
-os.makedirs(os.path.dirname(pending_file), exist_ok=True)
-existing = []
-if os.path.exists(pending_file):
-    try:
-        with open(pending_file, encoding="utf-8") as f:
-            existing = json.load(f)
-    except (json.JSONDecodeError, ValueError):
-        existing = []
-
-existing_by_key = {e["key"]: e for e in existing}
-for entry in changed_entries:
-    existing_by_key[entry["key"]] = entry
-
-with open(pending_file, "w", encoding="utf-8") as f:
-    json.dump(list(existing_by_key.values()), f, ensure_ascii=False, indent=2)
-
-print(f"Pending changes gespeichert: {len(changed_entries)} neu/aktualisiert, "
-      f"{len(existing_by_key)} total in {pending_file}")
-
-if immediate_rows:
-    with open("diff_immediate.html", "w", encoding="utf-8") as f:
-        f.write(build_html(immediate_rows, immediate_summary))
-    print(f"diff_immediate.html geschrieben: {immediate_summary}")
-else:
-    print("Keine sofortigen Änderungen (neu/gelöscht).")
+
+def render_immediate_html(d):
+    """HTML-Mail für neue und gelöschte Defis, oder None wenn es keine gibt."""
+    rows = [build_row("neu", defi) for defi in d.added]
+    rows += [build_row("gelöscht", defi) for defi in d.removed]
+    if not rows:
+        return None
+    return build_html(rows, {"neu": len(d.added), "gelöscht": len(d.removed)})
+
+
+def pending_entries(d) -> list:
+    """Einträge für den Pending-Store aus den geänderten und verschobenen
+    Defis, mit den Feld-Deltas (feld, alt, neu) zum Falten über die Woche.
+    Eine Verschiebung ist das Delta POSITION_FIELD mit [lon, lat]."""
+    detected_at = datetime.now(timezone.utc).isoformat()
+    pairs = [(old, new, []) for old, new, _ in d.changed]
+    pairs += [(old, new, [(POSITION_FIELD, [old.lon, old.lat], [new.lon, new.lat])])
+              for old, new, _, _ in d.moved]
+    return [
+        {
+            "key": new.key,
+            "name": new.props.get("name", "(ohne Name)"),
+            "address": new.address,
+            "lon": new.lon,
+            "lat": new.lat,
+            "fields": position + field_deltas(old.props, new.props),
+            "detected_at": detected_at,
+        }
+        for old, new, position in pairs
+    ]
+
+
+def update_pending(pending_file: str, entries: list) -> int:
+    """Neue Einträge auf den Pending-Store falten (Netto-Änderung pro Feld),
+    gibt die Gesamtzahl zurück. Ohne Einträge wird nur gelesen, damit die
+    Datenbank-Datei unverändert bleibt."""
+    with PendingStore(pending_file, readonly=not entries) as store:
+        if entries:
+            store.upsert(entries)
+        return store.count()
+
+
+def main():
+    old_file = sys.argv[1]
+    new_file = sys.argv[2]
+    pending_file = sys.argv[3] if len(sys.argv) > 3 else DEFAULT_PENDING_FILE
+
+    d = diff(*changed_indexes(load_snapshot(old_file), load_snapshot(new_file)))
+
+    entries = pending_entries(d)
+    total = update_pending(pending_file, entries)
+    print(f"Pending changes gespeichert: {len(entries)} neu/aktualisiert, "
+          f"{total} total in {pending_file}")
+
+    html_body = render_immediate_html(d)
+    if html_body:
+        with open("diff_immediate.html", "w", encoding="utf-8") as f:
+            f.write(html_body)
+        print(f"diff_immediate.html geschrieben: {{'neu': {len(d.added)}, 'gelöscht': {len(d.removed)}}}")
+    else:
+        print("Keine sofortigen Änderungen (neu/gelöscht).")
+
+
+if __name__ == "__main__":
+    main()
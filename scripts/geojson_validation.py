@@ -1,66 +1,51 @@
-import json
+"""
+Prüft die Koordinaten der Defis in den angegebenen GeoJSON-Dateien und
+schreibt validation_report.html, falls etwas verdächtig ist.
+
+Zwei Prüfungen pro Feature:
+1. Grobe Bounding Box Schweiz + Liechtenstein
+2. Liegt der Punkt im Gebiet, das die Datei laut ihrem Query abdeckt
+   (Kanton, Dispo-Gebiet, Stadt, Land)? Die Grenzpolygone kommen aus dem
+   Cache .overpass/boundaries/ (fehlende werden einmalig geladen, siehe
+   area_split.py). Getestet wird zuerst gegen eine vereinfachte Grenze,
+   alle Punkte einer Datei auf einmal (polygon_index.py, mit NumPy
+   vektorisiert); nur was dort ausserhalb liegt, wird gegen die exakte
+   Grenze nachgeprüft.
+
+Über alle Dateien zusammen (jeder Defi einmal, nach OSM-ID) zusätzlich:
+3. Mögliche Duplikate – derselbe Defi doppelt gemappt (z.B. Node und Way
+   wenige Meter auseinander). Paare innerhalb DUPLICATE_RADIUS_M werden
+   über ein Gitter gesucht (spatial_index.py, kein Vergleich aller Paare)
+   und nach Abstand sowie Ähnlichkeit von Name und Betreiber bewertet;
+   gemeldet wird ab DUPLICATE_MIN_SCORE.
+
+Verwendung (aus dem Repo-Root):
+    python scripts/geojson_validation.py data/json/*.geojson
+"""
+
+import os
 import sys
 import html
+from difflib import SequenceMatcher
 from pathlib import Path
 
+# area_split.py und polygon_index.py liegen im Repo-Root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import area_split  # noqa: E402
+from defi_features import load  # noqa: E402
+from spatial_index import GridIndex  # noqa: E402
+
 # Kombinierte Bounding Box Schweiz + Liechtenstein (mit kleinem Puffer)
 LON_MIN, LON_MAX = 5.9, 10.6
 LAT_MIN, LAT_MAX = 45.8, 47.9
 
-def load(path: str):
-    with open(path, encoding="utf-8") as f:
-        return json.load(f)
+# Toleranz für die vereinfachten Grenzen (Grad, ca. 20 m)
+SIMPLIFY_TOLERANCE = 0.0002
 
-def coords(feature):
-    try:
-        g = feature.get("geometry") or {}
-        if g.get("type") != "Point":
-            return None, None
-        c = g.get("coordinates")
-        if not (isinstance(c, list) and len(c) >= 2):
-            return None, None
-        return c[0], c[1]  # lon, lat
-    except Exception:
-        return None, None
-
-def address(props: dict):
-    parts = []
-    street = props.get("addr:street")
-    housenumber = props.get("addr:housenumber")
-    postcode = props.get("addr:postcode")
-    city = props.get("addr:city")
-    if street or housenumber:
-        parts.append(" ".join(p for p in [street, housenumber] if p))
-    if postcode or city:
-        parts.append(" ".join(p for p in [postcode, city] if p))
-    return ", ".join(parts) if parts else None
-
-def get_key(feature):
-    p = feature.get("properties", {}) or {}
-    for k in ("@id", "osm_id", "osm:id", "id", "osmid", "osmId"):
-        v = p.get(k)
-        if v is not None and str(v).strip():
-            s = str(v).strip()
-            import re
-            if re.match(r"^(node|way|relation)/\d+$", s):
-                return s
-            if re.match(r"^\d+$", s):
-                return f"node/{s}"
-            return s
-    v = feature.get("id")
-    if v is not None and str(v).strip():
-        return str(v).strip()
-    return None
-
-def maps_links(lon, lat, key=None):
-    links = []
-    if key and key.startswith(("node/", "way/", "relation/")):
-        links.append(f'<a href="https://www.openstreetmap.org/{key}">OSM</a>')
-    elif lon is not None and lat is not None:
-        links.append(f'<a href="https://www.openstreetmap.org/?mlat={lat}&mlon={lon}#map=19/{lat}/{lon}">OSM</a>')
-    if lon is not None and lat is not None:
-        links.append(f'<a href="https://www.google.com/maps?q={lat},{lon}">Google Maps</a>')
-    return " | ".join(links)
+# Duplikat-Erkennung: Suchradius in Metern und Mindest-Score (0..1)
+DUPLICATE_RADIUS_M = float(os.environ.get("DUPLICATE_RADIUS_M", "10"))
+DUPLICATE_MIN_SCORE = float(os.environ.get("DUPLICATE_MIN_SCORE", "0.75"))
 
 def is_valid(lon, lat):
     if lon is None or lat is None:
@@ -71,44 +56,178 @@ def is_valid(lon, lat):
         return False, f"Latitude {lat} ausserhalb [{LAT_MIN}, {LAT_MAX}]"
     return True, None
 
+def area_label(selector) -> str:
+    return " ".join(f"{k}{op}{v}" for k, op, v in selector)
+
+def claimed_areas(filepath):
+    """Area-Selektoren aus dem Query zur Datei, None wenn unbekannt."""
+    query = area_split.QUERY_DIR / f"{Path(filepath).stem}.overpassql"
+    if not query.exists():
+        return None
+    spec = area_split.parse_query(query.read_text(encoding="utf-8"))
+    return spec[0] if spec else None
+
+class AreaChecker:
+    """Vereinfachte und (bei Bedarf) exakte Grenze eines Gebiets."""
+
+    def __init__(self, selector):
+        self.selector = selector
+        self.simplified = area_split.load_area(selector, SIMPLIFY_TOLERANCE)
+        self._exact = None
+
+    def exact(self):
+        if self._exact is None:
+            self._exact = area_split.load_area(self.selector)
+        return self._exact
+
+def load_checkers(selectors) -> dict:
+    missing = sorted(s for s in selectors if not area_split.boundary_path(s).exists())
+    if missing:
+        print(f"Lade {len(missing)} Grenzpolygone von Overpass...")
+        try:
+            area_split.fetch_boundaries(missing)
+        except Exception as e:
+            print(f"WARNUNG: Grenzpolygone nicht verfügbar ({e}) - nur Bounding Box")
+    return {s: AreaChecker(s) for s in selectors if area_split.boundary_path(s).exists()}
+
+def outside_area(defis, areas, checkers):
+    """Indizes der Defis, die in keinem der Gebiete liegen."""
+    lons = [d.lon for d in defis]
+    lats = [d.lat for d in defis]
+    inside = [False] * len(defis)
+    for selector in areas:
+        for i, hit in enumerate(checkers[selector].simplified.contains_many(lons, lats)):
+            inside[i] = inside[i] or hit
+    suspects = [i for i, hit in enumerate(inside) if not hit and lons[i] is not None]
+    return [
+        i for i in suspects
+        if not any(checkers[s].exact().contains(lons[i], lats[i]) for s in areas)
+    ]
+
+def similarity(a, b):
+    """Ähnlichkeit zweier Tag-Werte (0..1), None wenn beide fehlen."""
+    a = str(a or "").casefold().strip()
+    b = str(b or "").casefold().strip()
+    if not a and not b:
+        return None
+    return SequenceMatcher(None, a, b).ratio()
+
+def duplicate_score(a, b, distance):
+    """Wie wahrscheinlich zwei nahe Defis derselbe sind (0..1).
+
+    Hälftig aus dem Abstand (0 m -> 1, Radius -> 0) und der Ähnlichkeit
+    von Name und Betreiber; fehlen beide Tags auf beiden Seiten, zählt die
+    Ähnlichkeit als unbekannt (0.5). Verschiedene Stockwerke (level auf
+    beiden Seiten gesetzt) sind keine Duplikate.
+    """
+    level_a, level_b = a.get("level"), b.get("level")
+    if level_a is not None and level_b is not None and str(level_a) != str(level_b):
+        return 0.0, None, None
+    name = similarity(a.get("name"), b.get("name"))
+    operator = similarity(a.get("operator"), b.get("operator"))
+    known = [s for s in (name, operator) if s is not None]
+    text = sum(known) / len(known) if known else 0.5
+    nearness = 1 - distance / DUPLICATE_RADIUS_M if DUPLICATE_RADIUS_M else 1.0
+    return (text + nearness) / 2, name, operator
+
+def osm_order(key):
+    """Sortierschlüssel: innerhalb eines OSM-Typs die kleinere ID zuerst."""
+    kind, _, number = key.partition("/")
+    return (kind, int(number)) if number.isdigit() else (kind, 0, key)
+
+def find_duplicates(defis):
+    """Verdächtige Paare als (Score, Abstand, Original, Duplikat,
+    Name-Ähnlichkeit, Betreiber-Ähnlichkeit), bester Score zuerst.
+
+    Als Duplikat gilt jeweils der später erfasste Defi (höhere OSM-ID); er
+    wird nur einmal gemeldet, mit seinem ähnlichsten Partner – ein Stapel
+    aus fünf Nodes am selben Punkt ergibt so vier Zeilen statt zehn.
+    """
+    grid = GridIndex([(d.lon, d.lat) for d in defis], cell_m=max(DUPLICATE_RADIUS_M, 1.0))
+    best = {}
+    for i, j, distance in grid.pairs_within(DUPLICATE_RADIUS_M):
+        original, duplicate = sorted((defis[i], defis[j]), key=lambda d: osm_order(d.key))
+        score, name, operator = duplicate_score(original, duplicate, distance)
+        if score < DUPLICATE_MIN_SCORE:
+            continue
+        found = (score, distance, original, duplicate, name, operator)
+        current = best.get(duplicate.key)
+        if current is None or (score, -distance) > (current[0], -current[1]):
+            best[duplicate.key] = found
+    return sorted(best.values(), key=lambda f: (-f[0], f[1], osm_order(f[3].key)))
+
+def percent(value):
+    return "–" if value is None else f"{value:.0%}"
+
 # Dateien aus Argumenten einlesen
 files = sys.argv[1:]
 if not files:
     print("Keine GeoJSON-Dateien angegeben.")
     sys.exit(0)
 
-invalid_entries = []
-
+loaded = []
 for filepath in files:
-    source = Path(filepath).name
     try:
-        data = load(filepath)
+        loaded.append((filepath, load(filepath), claimed_areas(filepath)))
     except Exception as e:
         print(f"Fehler beim Laden von {filepath}: {e}")
+
+checkers = load_checkers({s for _, _, areas in loaded if areas for s in areas})
+
+invalid_entries = []
+
+def report(source, defi, reason, other=None):
+    invalid_entries.append({
+        "source": source,
+        "key": defi.key or "",
+        "name": defi.name,
+        "address": defi.address or "",
+        "lon": defi.lon,
+        "lat": defi.lat,
+        "reason": reason,
+        "links": defi.links if other is None else f"{defi.links}<br>{other.links}",
+    })
+
+for filepath, defis, areas in loaded:
+    source = Path(filepath).name
+    in_bbox = []
+    for defi in defis:
+        valid, reason = is_valid(defi.lon, defi.lat)
+        if valid:
+            in_bbox.append(defi)
+        else:
+            report(source, defi, reason)
+
+    if not areas:
         continue
+    if any(s not in checkers for s in areas):
+        print(f"{source}: Grenzpolygon fehlt - nur Bounding Box geprüft")
+        continue
+    label = " / ".join(area_label(s) for s in areas)
+    for i in outside_area(in_bbox, areas, checkers):
+        report(source, in_bbox[i], f"ausserhalb des Gebiets der Datei ({label})")
+
+# Alle Dateien zusammen, jeder Defi nur einmal (Kantons-, Dispo- und
+# Landesdateien überlappen); Quelle ist die erste Datei, in der er vorkommt
+national = {}
+for filepath, defis, _ in loaded:
+    for defi in defis:
+        if defi.key and defi.lon is not None and defi.lat is not None:
+            national.setdefault(defi.key, (Path(filepath).name, defi))
 
-    for feature in data.get("features", []) or []:
-        lon, lat = coords(feature)
-        valid, reason = is_valid(lon, lat)
-        if not valid:
-            p = feature.get("properties", {}) or {}
-            key = get_key(feature)
-            name = p.get("name", "(ohne Name)")
-            addr = address(p)
-            links = maps_links(lon, lat, key)
-            invalid_entries.append({
-                "source": source,
-                "key": key or "",
-                "name": name,
-                "address": addr or "",
-                "lon": lon,
-                "lat": lat,
-                "reason": reason,
-                "links": links,
-            })
+sources = {key: source for key, (source, _) in national.items()}
+duplicates = find_duplicates([defi for _, defi in national.values()])
+for score, distance, original, duplicate, name, operator in duplicates:
+    report(sources[duplicate.key], duplicate,
+           f"mögliches Duplikat von {original.key} «{original.name}», "
+           f"{distance:.1f} m entfernt; Ähnlichkeit Name {percent(name)}, "
+           f"Betreiber {percent(operator)}; Score {score:.0%}",
+           other=original)
+if duplicates:
+    print(f"{len(duplicates)} mögliche Duplikate (Radius {DUPLICATE_RADIUS_M:g} m)")
 
 if not invalid_entries:
-    print("Alle Koordinaten sind plausibel. Kein Report nötig.")
+    print("Alle Koordinaten sind plausibel, keine Duplikate. Kein Report nötig.")
     sys.exit(0)
 
 # HTML-Report generieren
@@ -126,7 +245,7 @@ for e in invalid_entries:
     </tr>
     """)
 
-report = f"""
+report_html = f"""
 <html>
 <head>
 <meta charset="utf-8"/>
@@ -141,9 +260,11 @@ small {{ color: #666; }}
 </head>
 <body>
 <img src="https://defikarte.ch/defikarte-logo-quer-gruen-positiv-rgb.png" alt="defikarte.ch" style="width:200px;"/>
-<h2>⚠️ GeoJSON-Validierung: Verdächtige Koordinaten</h2>
+<h2>⚠️ GeoJSON-Validierung: Verdächtige Einträge</h2>
 <p>Die folgenden Defi-Einträge haben Koordinaten ausserhalb der erwarteten Bounding Box
-(Lon {LON_MIN}–{LON_MAX} / Lat {LAT_MIN}–{LAT_MAX}).</p>
+(Lon {LON_MIN}–{LON_MAX} / Lat {LAT_MIN}–{LAT_MAX}) oder ausserhalb des Gebiets
+(Kanton, Dispo-Gebiet, Stadt), das ihre Datei abdeckt, oder sind vermutlich doppelt
+gemappt (anderer Defi mit ähnlichem Namen/Betreiber innerhalb von {DUPLICATE_RADIUS_M:g} m).</p>
 <p><strong>{len(invalid_entries)} verdächtige Einträge gefunden</strong></p>
 <table>
   <tr>
@@ -164,6 +285,6 @@ small {{ color: #666; }}
 """
 
 with open("validation_report.html", "w", encoding="utf-8") as f:
-    f.write(report)
+    f.write(report_html)
 
 print(f"validation_report.html geschrieben: {len(invalid_entries)} verdächtige Einträge.")
@@ -0,0 +1,109 @@
+"""
+Lesezugriff auf die Git-Historie der GeoJSON-Dateien für
+process_all_kantone.py, ohne pro Kanton mehrere git-Prozesse zu starten.
+
+- last_commits(): letzter Commit pro Datei, für alle Dateien zusammen in
+  einem einzigen "git log"-Aufruf
+- blob_id(): Blob-ID eines Stands ("<sha>:<pfad>", "<sha>^:<pfad>");
+  "geändert" heisst unterschiedliche Blob-IDs, ohne "git diff"
+- read_blob(): Inhalt direkt in den Speicher, über einen langlebigen
+  "git cat-file --batch"-Prozess statt "git show" in eine /tmp-Datei
+
+Verwendung:
+    with GitHistory() as history:
+        shas = history.last_commits(["data/json/defis_kt_zh.geojson", ...])
+        data = history.read_blob(history.blob_id(f"{sha}:{path}"))
+"""
+
+import subprocess
+
+
+class GitHistory:
+    def __init__(self, repo="."):
+        self.repo = repo
+        self._batch = None
+        self._check = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _git(self, *args):
+        return ["git", "-C", self.repo, *args]
+
+    def _cat_file(self, mode):
+        return subprocess.Popen(self._git("cat-file", mode),
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def last_commits(self, paths) -> dict:
+        """Pfad -> SHA des letzten Commits, der ihn geändert hat.
+
+        Entspricht "git log -1 --format=%H -- <pfad>" pro Datei, liest aber
+        die Historie nur einmal und bricht ab, sobald alle Pfade gefunden
+        sind. Nie committete Pfade fehlen im Ergebnis.
+        """
+        pending = set(paths)
+        found = {}
+        if not pending:
+            return found
+
+        proc = subprocess.Popen(
+            self._git("log", "--format=%x00%H", "--name-only", "--no-renames", "--", *sorted(pending)),
+            stdout=subprocess.PIPE, text=True, encoding="utf-8",
+        )
+        try:
+            sha = None
+            for line in proc.stdout:
+                line = line.rstrip("\n")
+                if line.startswith("\0"):
+                    sha = line[1:]
+                elif line in pending:
+                    found[line] = sha
+                    pending.discard(line)
+                    if not pending:
+                        break
+        finally:
+            proc.stdout.close()
+            if pending:
+                proc.wait()
+            else:
+                proc.kill()
+                proc.wait()
+        if pending and proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, proc.args)
+        return found
+
+    def blob_id(self, spec: str) -> str | None:
+        """Objekt-ID für "<rev>:<pfad>", None wenn es den Stand nicht gibt."""
+        if self._check is None:
+            self._check = self._cat_file("--batch-check")
+        self._check.stdin.write(spec.encode("utf-8") + b"\n")
+        self._check.stdin.flush()
+        header = self._check.stdout.readline().decode("utf-8").split()
+        if not header or header[-1] in ("missing", "ambiguous"):
+            return None
+        return header[0]
+
+    def read_blob(self, spec: str) -> bytes:
+        """Inhalt eines Objekts ("<rev>:<pfad>" oder Blob-ID)."""
+        if self._batch is None:
+            self._batch = self._cat_file("--batch")
+        self._batch.stdin.write(spec.encode("utf-8") + b"\n")
+        self._batch.stdin.flush()
+        header = self._batch.stdout.readline().decode("utf-8").split()
+        if not header or header[-1] in ("missing", "ambiguous"):
+            raise KeyError(f"Git-Objekt nicht gefunden: {spec}")
+        size = int(header[2])
+        data = self._batch.stdout.read(size)
+        self._batch.stdout.read(1)  # abschliessendes "\n"
+        return data
+
+    def close(self):
+        for proc in (self._batch, self._check):
+            if proc is not None:
+                proc.stdin.close()
+                proc.wait()
+                proc.stdout.close()
+        self._batch = self._check = None
@@ -0,0 +1,249 @@
+"""
+Mailversand für die Reporting-Mails (process_all_kantone.py).
+
+- MailDispatcher: hält EINE authentifizierte SMTP-Verbindung über alle
+  Mails eines Laufs offen (STARTTLS und Login nur einmal) und verbindet
+  sich bei einem Fehler neu
+- TokenBucket: Anti-Spam-Taktung – höchstens eine Mail pro
+  MAIL_SEND_INTERVAL Sekunden (Standard 8), aber ohne feste Pause nach
+  jeder Mail; Zeit, die ohnehin mit Rechnen vergeht, zählt mit
+- Outbox: dauerhafter Postausgang (.reporting/outbox.json); Mails werden
+  dort abgelegt, bevor sie versendet werden, und erst nach Erfolg
+  entfernt. Fehlgeschlagene Mails werden beim nächsten Lauf erneut
+  versucht, ohne den Diff neu zu rechnen
+
+Server und Port sind über MAIL_SMTP_HOST/MAIL_SMTP_PORT überschreibbar,
+MAIL_SMTP_STARTTLS=false schaltet STARTTLS ab – so lässt sich der Versand
+gegen einen lokalen SMTP-Server testen, z.B.:
+    pip install aiosmtpd && python3 -m aiosmtpd -n -l localhost:8025
+    MAIL_SMTP_HOST=localhost MAIL_SMTP_PORT=8025 MAIL_SMTP_STARTTLS=false \\
+        MAIL_USER=test@localhost python3 scripts/process_all_kantone.py
+"""
+
+import json
+import os
+import smtplib
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+SMTP_HOST = os.environ.get("MAIL_SMTP_HOST", "asmtp.mail.hostpoint.ch")
+SMTP_PORT = int(os.environ.get("MAIL_SMTP_PORT", "587"))
+SMTP_STARTTLS = os.environ.get("MAIL_SMTP_STARTTLS", "true").lower() == "true"
+
+# Mindestabstand zwischen versendeten Mails, um nicht wie ein Massenversand
+# aus einer Quelle auszusehen (Spam-Filter).
+SEND_INTERVAL_SECONDS = float(os.environ.get("MAIL_SEND_INTERVAL", "8"))
+
+OUTBOX_FILE = ".reporting/outbox.json"
+
+SEND_ATTEMPTS = 2
+RETRY_DELAY_SECONDS = 5
+
+
+class TokenBucket:
+    """Ein Token alle `interval` Sekunden, höchstens `burst` auf Vorrat."""
+
+    def __init__(self, interval: float, burst: int = 1, clock=time.monotonic, sleep=time.sleep):
+        self.interval = interval
+        self.burst = burst
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(burst)
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        if self.interval > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) / self.interval)
+        else:
+            self.tokens = self.burst
+        self.updated = now
+
+    def acquire(self) -> float:
+        """Wartet bis ein Token frei ist, gibt die Wartezeit zurück."""
+        self._refill()
+        waited = 0.0
+        if self.tokens < 1:
+            waited = (1 - self.tokens) * self.interval
+            self.sleep(waited)
+            self._refill()
+        self.tokens = max(0.0, self.tokens - 1)
+        return waited
+
+
+def build_message(sender, subject, html_body, to_addr, cc_addr=None):
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = subject
+    msg["From"] = f"defikarte.ch Reports <{sender}>"
+    msg["To"] = to_addr
+    if cc_addr:
+        msg["Cc"] = cc_addr
+    msg.attach(MIMEText(html_body, "html", "utf-8"))
+    return msg
+
+
+class MailDispatcher:
+    """Versendet Mails über eine wiederverwendete SMTP-Verbindung."""
+
+    def __init__(self, user=None, password=None, host=SMTP_HOST, port=SMTP_PORT,
+                 starttls=SMTP_STARTTLS, bucket=None, dry_run=False):
+        self.user = user
+        self.password = password
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.bucket = bucket or TokenBucket(SEND_INTERVAL_SECONDS)
+        self.dry_run = dry_run
+        self._server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=20)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.user and self.password:
+                server.login(self.user, self.password)
+        except BaseException:
+            server.close()
+            raise
+        return server
+
+    def _drop(self):
+        if self._server is not None:
+            try:
+                self._server.close()
+            finally:
+                self._server = None
+
+    def send(self, subject, html_body, to_addr, cc_addr=None):
+        """Eine Mail versenden; wirft nach SEND_ATTEMPTS Fehlversuchen."""
+        if self.dry_run:
+            print(f"[DRY RUN] Würde Mail senden: '{subject}' an {to_addr}"
+                  + (f" (CC {cc_addr})" if cc_addr else ""))
+            return
+
+        msg = build_message(self.user, subject, html_body, to_addr, cc_addr)
+        recipients = [to_addr] + ([cc_addr] if cc_addr else [])
+
+        waited = self.bucket.acquire()
+        if waited:
+            print(f"  (Taktung: {waited:.1f}s gewartet)")
+
+        # Kurze Retries für transiente Fehler (kurzzeitige Überlastung).
+        # Jeder Fehler verwirft die Verbindung, der nächste Versuch verbindet
+        # neu. Hat der Server eine offen gehaltene Verbindung inzwischen
+        # geschlossen (Idle-Timeout), wird sofort und ohne Fehlversuch neu
+        # verbunden.
+        attempt = 0
+        while True:
+            reused = self._server is not None
+            try:
+                if not reused:
+                    self._server = self._connect()
+                self._server.sendmail(self.user, recipients, msg.as_string())
+                print(f"Mail gesendet an {to_addr}" + (f" (CC {cc_addr})" if cc_addr else ""))
+                return
+            except smtplib.SMTPServerDisconnected as e:
+                self._drop()
+                if reused:
+                    continue
+                error = e
+            except (smtplib.SMTPException, OSError) as e:
+                self._drop()
+                error = e
+            attempt += 1
+            print(f"SMTP-Fehler bei Versuch {attempt}/{SEND_ATTEMPTS} an {to_addr}: {error}")
+            if attempt >= SEND_ATTEMPTS:
+                raise error
+            time.sleep(RETRY_DELAY_SECONDS)
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._drop()
+
+
+class Outbox:
+    """Dauerhafter Postausgang: Liste von Mails als JSON-Datei.
+
+    Jede Mail ist ein Dict mit den Feldern des Aufrufers (Betreff, HTML,
+    welcher SHA-Stand nach dem Versand gespeichert werden soll, ...). Die
+    Datei wird mit committet – Empfängeradressen gehören deshalb NICHT
+    hinein, nur die Namen der Secrets. Ist der Postausgang leer, wird die
+    Datei gelöscht.
+    """
+
+    def __init__(self, path=OUTBOX_FILE):
+        self.path = path
+        self.entries = []
+        self.dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (json.JSONDecodeError, ValueError):
+                print(f"WARNUNG: {path} ist beschädigt und wird ignoriert")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(list(self.entries))
+
+    def add(self, **entry) -> dict:
+        entry.setdefault("id", uuid.uuid4().hex)
+        entry.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+        entry.setdefault("attempts", 0)
+        self.entries.append(entry)
+        self.dirty = True
+        self.save()
+        return entry
+
+    def find(self, **match):
+        for entry in self.entries:
+            if all(entry.get(k) == v for k, v in match.items()):
+                return entry
+        return None
+
+    def remove(self, entry):
+        self.entries = [e for e in self.entries if e["id"] != entry["id"]]
+        self.dirty = True
+        self.save()
+
+    def failed(self, entry, error):
+        entry["attempts"] = entry.get("attempts", 0) + 1
+        # Nur der Fehlertyp: die Meldungen von smtplib enthalten oft die
+        # Empfängeradressen, und die Datei wird committet.
+        entry["last_error"] = type(error).__name__
+        self.dirty = True
+        self.save()
+
+    def save(self):
+        if not self.entries:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(self.path))
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=2)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
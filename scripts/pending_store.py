@@ -0,0 +1,271 @@
+"""
+Pending-Changes für den Wochenmodus ("immediate_new_deleted_weekly_changed")
+als kleine SQLite-Datenbank statt JSON-Datei.
+
+Bisher wurde .reporting/pending_changes_<id>.json bei jedem stündlichen Lauf
+komplett gelesen, im Speicher gemerged und mit indent=2 neu geschrieben –
+die Kosten wuchsen die ganze Woche mit. Jetzt:
+
+- PendingStore.upsert(): ein Eintrag pro OSM-ID, neue Diffs per UPSERT,
+  nur die betroffenen Zeilen werden geschrieben
+- Netto-Änderung pro Feld: jedes Feld merkt sich den Wert vom Wochenanfang
+  (erster Diff) und den aktuellen Wert. Weitere Diffs derselben Woche werden
+  beim Schreiben darauf gefaltet; ist ein Feld wieder beim Ausgangswert,
+  fällt es weg, sind alle Felder zurückgesetzt, der ganze Eintrag
+- entries()/count(): Abfrage-API für build_weekly_report.py (sortiert nach
+  detected_at, Index darauf), Aufwand proportional zu den geänderten Defis
+- Migration: liegt neben der Datenbank noch die alte JSON-Datei, wird sie
+  beim ersten Öffnen übernommen und gelöscht
+- Öffnen allein schreibt nichts: Schema und user_version nur bei älterer
+  Version, count/entries (readonly=True) ganz ohne Schreibzugriff. Sonst
+  entstünde bei jedem Lauf ein neuer Binär-Commit
+
+Die Datenbank liegt unter .reporting/pending_changes_<id>.sqlite und wird
+wie bisher die JSON-Datei mit committet (ohne WAL, damit keine
+Nebendateien entstehen).
+
+Für die Weekly-Workflows:
+    python3 scripts/pending_store.py count .reporting/pending_changes_be.sqlite
+    python3 scripts/pending_store.py clear .reporting/pending_changes_be.sqlite
+"""
+
+import json
+import os
+import re
+import sqlite3
+import sys
+
+from defi_features import RELEVANT_FIELDS
+from geojson_diff import POSITION_FIELD, format_change
+
+# Feldwerte werden als JSON gespeichert, damit None und "None" verschieden
+# bleiben.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending (
+    key               TEXT PRIMARY KEY,
+    name              TEXT,
+    address           TEXT,
+    lon               REAL,
+    lat               REAL,
+    first_detected_at TEXT NOT NULL,
+    detected_at       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pending_detected_at ON pending (detected_at);
+CREATE TABLE IF NOT EXISTS pending_fields (
+    key   TEXT NOT NULL REFERENCES pending (key) ON DELETE CASCADE,
+    field TEXT NOT NULL,
+    old   TEXT,
+    new   TEXT,
+    PRIMARY KEY (key, field)
+);
+"""
+
+SCHEMA_VERSION = 2
+
+COLUMNS = ("key", "name", "address", "lon", "lat", "first_detected_at", "detected_at")
+
+FIELD_ORDER = {f: i for i, f in enumerate((POSITION_FIELD, *RELEVANT_FIELDS))}
+
+# Änderungstext aus geojson_diff.format_change, für Altbestände
+_CHANGE_RE = re.compile(r"^(.+?): '(.*)' → '(.*)'$", re.DOTALL)
+
+
+def pending_path(kid: str) -> str:
+    return f".reporting/pending_changes_{kid}.sqlite"
+
+
+def legacy_json_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".json"
+
+
+def parse_change(text: str):
+    """Änderungstext "feld: 'alt' → 'neu'" -> (feld, alt, neu).
+
+    Nur für Einträge aus der Zeit vor den Feld-Deltas; 'None' wird wieder
+    zu None. Nicht lesbare Texte ergeben None.
+    """
+    m = _CHANGE_RE.match(text)
+    if not m:
+        return None
+    field, old, new = m.groups()
+    return field, None if old == "None" else old, None if new == "None" else new
+
+
+class PendingStore:
+    """Pending-Einträge eines Kantons, Schlüssel ist die OSM-ID.
+
+    Mit readonly=True wird die Datenbank nur gelesen (count, entries); eine
+    fehlende Datenbank gilt dann als leer. Ist noch eine Migration nötig,
+    wird trotzdem schreibend geöffnet.
+    """
+
+    def __init__(self, path: str, readonly: bool = False):
+        self.path = path
+        legacy = legacy_json_path(path)
+        if readonly and not os.path.exists(legacy):
+            if not os.path.exists(path):
+                self.db = sqlite3.connect(":memory:")
+                self.db.executescript(SCHEMA)
+                return
+            self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            if self._version() >= SCHEMA_VERSION:
+                return
+            self.db.close()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self._migrate_schema()
+        self._migrate_json(legacy)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _version(self) -> int:
+        return self.db.execute("PRAGMA user_version").fetchone()[0]
+
+    def _migrate_schema(self):
+        version = self._version()
+        if version >= SCHEMA_VERSION:
+            return
+        legacy = []
+        if version < 2 and self.db.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'pending'").fetchone():
+            # Version 1: Änderungen als fertige Texte in pending.changes
+            columns = ("key", "name", "address", "lon", "lat", "changes", "detected_at")
+            legacy = [
+                dict(zip(columns, row), changes=json.loads(row[5]))
+                for row in self.db.execute(
+                    f"SELECT {', '.join(columns)} FROM pending ORDER BY detected_at")
+            ]
+            with self.db:
+                self.db.execute("DROP TABLE pending")
+        with self.db:
+            self.db.executescript(SCHEMA)
+            self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.upsert(legacy)
+
+    def _migrate_json(self, json_path):
+        if not os.path.exists(json_path):
+            return
+        try:
+            with open(json_path, encoding="utf-8") as f:
+                entries = json.load(f) or []
+        except (json.JSONDecodeError, ValueError):
+            print(f"WARNUNG: {json_path} ist beschädigt und wird nicht übernommen", file=sys.stderr)
+            entries = []
+        # Alte Datei: pro Schlüssel gilt der letzte Eintrag
+        self.upsert(entries)
+        os.remove(json_path)
+        # stderr: "count" gibt auf stdout nur die Zahl aus (Workflow)
+        print(f"{len(entries)} Einträge aus {json_path} nach {self.path} übernommen", file=sys.stderr)
+
+    def upsert(self, entries) -> int:
+        """Diffs in Reihenfolge auf die gespeicherten Netto-Änderungen falten.
+
+        Ein Eintrag enthält "fields" als Liste (feld, alt, neu) – bzw. bei
+        Altbeständen nur die Texte in "changes". Pro Feld bleibt der alte Wert
+        des ersten Diffs stehen und der neue Wert wird ersetzt; ist der neue
+        Wert wieder der alte, fällt das Feld weg. Hat ein Defi keine
+        Netto-Änderung mehr, wird er ganz entfernt. Gibt die Anzahl der
+        verarbeiteten Einträge zurück.
+        """
+        entries = list(entries)
+        with self.db:
+            for e in entries:
+                self._fold(e)
+        return len(entries)
+
+    def _fold(self, e):
+        key = e["key"]
+        deltas = e.get("fields")
+        if deltas is None:
+            deltas = [d for d in map(parse_change, e.get("changes", [])) if d]
+
+        stored = {
+            field: json.loads(old)
+            for field, old in self.db.execute(
+                "SELECT field, old FROM pending_fields WHERE key = ?", (key,))
+        }
+        detected_at = e.get("detected_at", "")
+        self.db.execute(
+            "INSERT INTO pending (key, name, address, lon, lat, first_detected_at, detected_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET name = excluded.name, "
+            "address = excluded.address, lon = excluded.lon, lat = excluded.lat, "
+            "detected_at = excluded.detected_at",
+            (key, e.get("name"), e.get("address"), e.get("lon"), e.get("lat"),
+             detected_at, detected_at),
+        )
+        for field, old, new in deltas:
+            if field in stored:
+                old = stored[field]
+            if old == new:
+                self.db.execute("DELETE FROM pending_fields WHERE key = ? AND field = ?", (key, field))
+            else:
+                self.db.execute(
+                    "INSERT INTO pending_fields (key, field, old, new) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (key, field) DO UPDATE SET new = excluded.new",
+                    (key, field, json.dumps(old, ensure_ascii=False), json.dumps(new, ensure_ascii=False)),
+                )
+        if not self.db.execute("SELECT 1 FROM pending_fields WHERE key = ? LIMIT 1", (key,)).fetchone():
+            self.db.execute("DELETE FROM pending WHERE key = ?", (key,))
+
+    def count(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def entries(self, since: str | None = None) -> list:
+        """Alle Einträge (optional ab detected_at >= since), älteste zuerst.
+
+        Wie früher die JSON-Einträge, "changes" sind die Netto-Änderungen
+        vom Wochenanfang bis jetzt; zusätzlich "fields" als (feld, alt, neu).
+        """
+        where, params = "", ()
+        if since:
+            where, params = " WHERE detected_at >= ?", (since,)
+        result = []
+        by_key = {}
+        for row in self.db.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM pending{where} ORDER BY detected_at, key", params):
+            entry = dict(zip(COLUMNS, row), fields=[])
+            result.append(entry)
+            by_key[entry["key"]] = entry
+        for key, field, old, new in self.db.execute(
+                "SELECT f.key, f.field, f.old, f.new FROM pending_fields f "
+                f"JOIN pending USING (key){where}", params):
+            by_key[key]["fields"].append((field, json.loads(old), json.loads(new)))
+        for entry in result:
+            entry["fields"].sort(key=lambda d: (FIELD_ORDER.get(d[0], len(FIELD_ORDER)), d[0]))
+            entry["changes"] = [format_change(*d) for d in entry["fields"]]
+        return result
+
+    def clear(self):
+        with self.db:
+            self.db.execute("DELETE FROM pending_fields")
+            self.db.execute("DELETE FROM pending")
+        self.db.execute("VACUUM")
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+
+def main():
+    if len(sys.argv) != 3 or sys.argv[1] not in ("count", "clear"):
+        print("Verwendung: pending_store.py count|clear <pending_file.sqlite>")
+        sys.exit(2)
+    command, path = sys.argv[1], sys.argv[2]
+    with PendingStore(path, readonly=command == "count") as store:
+        if command == "count":
+            print(store.count())
+        else:
+            store.clear()
+
+
+if __name__ == "__main__":
+    main()
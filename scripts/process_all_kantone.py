@@ -1,6 +1,6 @@
 """
 Verarbeitet ALLE Kantone aus kantone_config.json in einem einzigen Lauf,
-sequenziell, mit einer kleinen Pause zwischen tatsächlich versendeten Mails.
+mit Anti-Spam-Taktung zwischen tatsächlich versendeten Mails.
 
 Vorteile gegenüber 13 separaten Workflows:
 - Nur EIN Workflow läuft pro Overpass-Run -> keine parallelen SMTP-Verbindungen
@@ -19,101 +19,171 @@ Erwartet folgende Umgebungsvariablen:
 
 Schreibt am Ende STATE_CHANGED=true/false in $GITHUB_ENV, damit der
 Workflow weiss ob ein abschliessender Commit nötig ist.
+
+Der Diff läuft im Prozess (geojson_diff.diff/render_html bzw.
+geojson_diff_be), ohne Python-Subprozess und ohne diff.html-Umweg. Die
+Git-Historie wird über git_history.GitHistory gelesen: ein "git log" für
+alle Kantone, alte Stände über einen "git cat-file --batch"-Prozess direkt
+in den Speicher. Jeder Stand wird pro Worker nur einmal gelesen, auch wenn
+ihn mehrere Kantone verwenden (Cache nach Blob-ID); als JSON geparst werden
+nur die Feature-Zeilen, die sich zwischen altem und neuem Stand
+unterscheiden (defi_features.changed_indexes).
+
+Zwei Stufen:
+1. Diff und HTML aller geänderten Kantone werden parallel in einem
+   Prozess-Pool berechnet (REPORTING_WORKERS, Standard: Anzahl CPUs)
+2. Die Ergebnisse laufen in Config-Reihenfolge in eine einzige
+   Versand-Stufe: Mails gehen zuerst in den Postausgang
+   (.reporting/outbox.json) und werden über eine einzige SMTP-Verbindung
+   getaktet versendet (siehe mail_dispatcher.py), während die übrigen
+   Kantone noch gerechnet werden
+
+Der SHA-Stand eines Kantons wird erst nach erfolgreichem Versand
+gespeichert; schlägt der Versand fehl, bleibt die Mail im Postausgang und
+wird beim nächsten Lauf erneut versucht, ohne den Diff neu zu rechnen.
+
+Laufzeiten (Git-Historie, Diff pro Kanton, Pending-Store, Versand pro Mail)
+landen im Run-Report "reporting" (siehe run_report.py).
 """
 
 import json
 import os
 import subprocess
-import smtplib
+import sys
 import time
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
-CONFIG_FILE = "kantone_config.json"
+# run_report.py liegt im Repo-Root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-# Pause zwischen tatsächlich versendeten Mails, um nicht wie ein
-# Massenversand aus einer Quelle auszusehen (Spam-Filter).
-SEND_DELAY_SECONDS = 8
+from defi_features import changed_indexes, loads_snapshot  # noqa: E402
+from geojson_diff import anchors_path, diff, load_anchors, render_html, save_anchors  # noqa: E402
+from geojson_diff_be import pending_entries, render_immediate_html, update_pending  # noqa: E402
+from git_history import GitHistory  # noqa: E402
+from mail_dispatcher import MailDispatcher, Outbox  # noqa: E402
+from pending_store import pending_path  # noqa: E402
+from run_report import RunReport  # noqa: E402
+
+CONFIG_FILE = "kantone_config.json"
 
 DRY_RUN = os.environ.get("DRY_RUN", "false").lower() == "true"
 
+WORKERS = int(os.environ.get("REPORTING_WORKERS", "0")) or os.cpu_count() or 1
+
+MODES = ("immediate", "immediate_new_deleted_weekly_changed")
+
 
 def load_config():
     with open(CONFIG_FILE, encoding="utf-8") as f:
         return json.load(f)
 
 
-def get_geojson_sha(path):
-    result = subprocess.run(
-        ["git", "log", "-1", "--format=%H", "--", path],
-        capture_output=True, text=True, check=True,
-    )
-    return result.stdout.strip()
+# Pro Worker-Prozess: eigene cat-file-Prozesse und ein Cache Blob-ID ->
+# Stand (Feature-Zeilen bzw. Index, siehe defi_features.loads_snapshot),
+# damit gleiche Stände nur einmal gelesen werden.
+_history = None
+_snapshot_cache = {}
 
 
-def has_changed(sha, path):
-    result = subprocess.run(["git", "diff", "--quiet", f"{sha}^..{sha}", "--", path])
-    return result.returncode != 0
+def snapshot(history, blob):
+    snap = _snapshot_cache.get(blob)
+    if snap is None:
+        snap = _snapshot_cache[blob] = loads_snapshot(history.read_blob(blob))
+    return snap
 
 
-def show_old_version(sha, path, out_path):
-    with open(out_path, "wb") as f:
-        subprocess.run(["git", "show", f"{sha}^:{path}"], stdout=f, check=True)
+def changed_blobs(history, sha, path):
+    """(alt, neu) Blob-IDs, wenn der Commit `sha` die Datei inhaltlich
+    geändert hat, sonst None."""
+    old_blob = history.blob_id(f"{sha}^:{path}")
+    new_blob = history.blob_id(f"{sha}:{path}")
+    if old_blob == new_blob:
+        return None
+    if old_blob is None:
+        raise KeyError(f"kein Vorgängerstand von {path} in {sha[:8]}")
+    return old_blob, new_blob
 
 
-def send_mail(subject, html_body, to_addr, cc_addr=None):
-    if DRY_RUN:
-        print(f"[DRY RUN] Würde Mail senden: '{subject}' an {to_addr}"
-              + (f" (CC {cc_addr})" if cc_addr else ""))
-        return
-
-    user = os.environ["MAIL_USER"]
-    password = os.environ["MAIL_PASS"]
-
-    msg = MIMEMultipart("alternative")
-    msg["Subject"] = subject
-    msg["From"] = f"defikarte.ch Reports <{user}>"
-    msg["To"] = to_addr
+def save_sha(sha_file, sha):
+    os.makedirs(".reporting", exist_ok=True)
+    with open(sha_file, "w", encoding="utf-8") as f:
+        f.write(sha)
+
+
+def analyze(kanton, old_blob, new_blob, anchors=None):
+    """Stufe 1 (im Worker-Prozess): Diff und HTML für einen Kanton.
+
+    Reine Berechnung ohne Nebenwirkungen; das Ergebnis wird in der
+    Versand-Stufe angewendet (apply_result). anchors sind die zuletzt
+    gemeldeten Positionen kleiner Verschiebungen (geojson_diff.diff), der
+    neue Stand steht in "anchors". "seconds" und "features" sind für den
+    Run-Report.
+    """
+    global _history
+    if _history is None:
+        _history = GitHistory()
+
+    t0 = time.monotonic()
+    new = snapshot(_history, new_blob)
+    d = diff(*changed_indexes(snapshot(_history, old_blob), new), anchors)
+    if kanton.get("reporting_mode", "immediate") == "immediate":
+        result = {
+            "subject": f"Änderungen an Defis Kanton {kanton['name']}",
+            "html": render_html(d),
+            "pending": None,
+            "empty": "Diff lief, aber keine relevanten Änderungen.",
+        }
+    else:
+        result = {
+            "subject": f"Neue/gelöschte Defis – {kanton['name']}",
+            "html": render_immediate_html(d),
+            "pending": pending_entries(d),
+            "empty": "Keine sofortigen Änderungen (neu/gelöscht).",
+        }
+    result.update(seconds=time.monotonic() - t0, features=len(new),
+                  anchors=d.anchors if d.anchors != (anchors or {}) else None)
+    return result
+
+
+def stage_mail(outbox, kanton, sha, sha_file, subject, html_body):
+    """Mail für diesen Kanton in den Postausgang legen.
+
+    Gibt False zurück, wenn kein Empfänger konfiguriert ist (dann gibt es
+    nichts zu versenden und der SHA kann sofort gespeichert werden).
+    """
+    kid = kanton["id"]
+    if not os.environ.get(kanton["mail_recipient_secret"], ""):
+        print(f"[{kid}] WARNUNG: kein Empfänger-Secret gefunden "
+              f"({kanton['mail_recipient_secret']})")
+        return False
+    outbox.add(
+        kanton=kid,
+        sha=sha,
+        sha_file=sha_file,
+        subject=subject,
+        html=html_body,
+        recipient_secret=kanton["mail_recipient_secret"],
+        use_cc=bool(kanton.get("use_cc")),
+    )
+    return True
 
-    recipients = [to_addr]
-    if cc_addr:
-        msg["Cc"] = cc_addr
-        recipients.append(cc_addr)
 
-    msg.attach(MIMEText(html_body, "html", "utf-8"))
+def plan(kanton, history, shas, outbox):
+    """Günstige Vorprüfung im Hauptprozess.
 
-    # Kurze Retries für den Fall, dass es sich um einen transienten
-    # Fehler handelt (z.B. kurzzeitige Überlastung). Bei einem
-    # IP-Blacklist-Fehler (gleiche Runner-IP während des ganzen Jobs)
-    # hilft das zwar meist nicht, ist aber ein günstiges Sicherheitsnetz.
-    last_error = None
-    for attempt in range(1, 3):
-        try:
-            with smtplib.SMTP("asmtp.mail.hostpoint.ch", 587, timeout=20) as server:
-                server.starttls()
-                server.login(user, password)
-                server.sendmail(user, recipients, msg.as_string())
-            print(f"Mail gesendet an {to_addr}" + (f" (CC {cc_addr})" if cc_addr else ""))
-            return
-        except smtplib.SMTPException as e:
-            last_error = e
-            print(f"SMTP-Fehler bei Versuch {attempt}/2 an {to_addr}: {e}")
-            if attempt < 2:
-                time.sleep(5)
-
-    # Alle Versuche fehlgeschlagen -> an Aufrufer weitergeben, damit dieser
-    # Kanton übersprungen wird (SHA nicht gespeichert -> wird beim nächsten
-    # Lauf automatisch erneut versucht), aber andere Kantone weiterlaufen.
-    raise last_error
-
-
-def process_immediate(kanton):
-    """Gibt True zurück, wenn der SHA-Stand aktualisiert wurde (Commit nötig)."""
+    Gibt (sha, sha_file, blobs) zurück, oder None wenn für diesen Kanton
+    nichts zu tun ist. blobs ist None, wenn der Commit die Datei inhaltlich
+    nicht verändert hat.
+    """
     kid = kanton["id"]
     geojson_path = f"data/json/{kanton['geojson_file']}"
     sha_file = f".reporting/last_processed_sha_{kid}.txt"
 
-    geojson_sha = get_geojson_sha(geojson_path)
+    geojson_sha = shas.get(geojson_path, "")
+    if not geojson_sha:
+        print(f"[{kid}] WARNUNG: {geojson_path} ist nicht in der Git-Historie")
+        return None
 
     last = ""
     if os.path.exists(sha_file):
@@ -121,146 +191,136 @@ def process_immediate(kanton):
 
     if geojson_sha == last:
         print(f"[{kid}] bereits verarbeitet ({geojson_sha[:8]})")
-        return False
-
-    if has_changed(geojson_sha, geojson_path):
-        old_tmp = f"/tmp/old_{kid}.geojson"
-        show_old_version(geojson_sha, geojson_path, old_tmp)
-
-        subprocess.run(
-            ["python3", "scripts/geojson_diff.py", old_tmp, geojson_path],
-            check=True,
-        )
-
-        if os.path.exists("diff.html"):
-            with open("diff.html", encoding="utf-8") as f:
-                html_body = f.read()
-
-            recipient = os.environ.get(kanton["mail_recipient_secret"], "")
-            cc = os.environ.get("MAIL_COPY") if kanton.get("use_cc") else None
-
-            if recipient:
-                try:
-                    send_mail(
-                        subject=f"Änderungen an Defis Kanton {kanton['name']}",
-                        html_body=html_body,
-                        to_addr=recipient,
-                        cc_addr=cc,
-                    )
-                    time.sleep(SEND_DELAY_SECONDS)
-                except Exception as e:
-                    print(f"[{kid}] FEHLER beim Mailversand: {e}")
-                    print(f"[{kid}] SHA wird NICHT gespeichert - wird beim "
-                          f"nächsten Lauf automatisch erneut versucht.")
-                    os.remove("diff.html")
-                    return False
-            else:
-                print(f"[{kid}] WARNUNG: kein Empfänger-Secret gefunden "
-                      f"({kanton['mail_recipient_secret']})")
-
-            os.remove("diff.html")
-        else:
-            print(f"[{kid}] Diff-Script lief, aber keine relevanten Änderungen.")
-    else:
-        print(f"[{kid}] Kein inhaltlicher Diff trotz neuem SHA.")
+        return None
 
-    os.makedirs(".reporting", exist_ok=True)
-    with open(sha_file, "w", encoding="utf-8") as f:
-        f.write(geojson_sha)
+    if outbox.find(kanton=kid, sha=geojson_sha):
+        print(f"[{kid}] Mail für {geojson_sha[:8]} liegt bereits im Postausgang")
+        return None
 
-    return True
+    return geojson_sha, sha_file, changed_blobs(history, geojson_sha, geojson_path)
 
 
-def process_be_style(kanton):
-    """BE-Stil: sofort neu/gelöscht, geändert wird separat wöchentlich versendet."""
+def apply_result(kanton, sha, sha_file, result, outbox, report):
+    """Stufe 2: Ergebnis eines Kantons anwenden (Pending-Datei, Postausgang
+    oder direkt SHA speichern). Gibt True zurück (Commit nötig)."""
     kid = kanton["id"]
-    geojson_path = f"data/json/{kanton['geojson_file']}"
-    sha_file = f".reporting/last_processed_sha_{kid}.txt"
-    pending_file = f".reporting/pending_changes_{kid}.json"
-
-    geojson_sha = get_geojson_sha(geojson_path)
-
-    last = ""
-    if os.path.exists(sha_file):
-        last = open(sha_file, encoding="utf-8").read().strip()
-
-    if geojson_sha == last:
-        print(f"[{kid}] bereits verarbeitet ({geojson_sha[:8]})")
-        return False
-
-    if has_changed(geojson_sha, geojson_path):
-        old_tmp = f"/tmp/old_{kid}.geojson"
-        show_old_version(geojson_sha, geojson_path, old_tmp)
-
-        subprocess.run(
-            ["python3", "scripts/geojson_diff_be.py", old_tmp, geojson_path, pending_file],
-            check=True,
-        )
-
-        if os.path.exists("diff_immediate.html"):
-            with open("diff_immediate.html", encoding="utf-8") as f:
-                html_body = f.read()
-
-            recipient = os.environ.get(kanton["mail_recipient_secret"], "")
-            cc = os.environ.get("MAIL_COPY") if kanton.get("use_cc") else None
-
-            if recipient:
-                try:
-                    send_mail(
-                        subject=f"Neue/gelöschte Defis – {kanton['name']}",
-                        html_body=html_body,
-                        to_addr=recipient,
-                        cc_addr=cc,
-                    )
-                    time.sleep(SEND_DELAY_SECONDS)
-                except Exception as e:
-                    print(f"[{kid}] FEHLER beim Mailversand: {e}")
-                    print(f"[{kid}] SHA wird NICHT gespeichert - wird beim "
-                          f"nächsten Lauf automatisch erneut versucht.")
-                    os.remove("diff_immediate.html")
-                    return False
-            else:
-                print(f"[{kid}] WARNUNG: kein Empfänger-Secret gefunden "
-                      f"({kanton['mail_recipient_secret']})")
-
-            os.remove("diff_immediate.html")
-        else:
-            print(f"[{kid}] Keine sofortigen Änderungen (neu/gelöscht).")
-    else:
+    if result is None:
         print(f"[{kid}] Kein inhaltlicher Diff trotz neuem SHA.")
+    else:
+        report.add("diff", result["seconds"], kid, features=result["features"],
+                   bytes_out=len(result["html"].encode("utf-8")) if result["html"] else None)
+        if result["anchors"] is not None:
+            save_anchors(anchors_path(kid), result["anchors"])
+        if result["pending"] is not None:
+            pending_file = pending_path(kid)
+            with report.span("pending", kid, features=len(result["pending"])):
+                total = update_pending(pending_file, result["pending"])
+            print(f"[{kid}] Pending changes gespeichert: {len(result['pending'])} neu/aktualisiert, "
+                  f"{total} total in {pending_file}")
+        if result["html"]:
+            if stage_mail(outbox, kanton, sha, sha_file, result["subject"], result["html"]):
+                return True
+        else:
+            print(f"[{kid}] {result['empty']}")
 
-    os.makedirs(".reporting", exist_ok=True)
-    with open(sha_file, "w", encoding="utf-8") as f:
-        f.write(geojson_sha)
-
+    save_sha(sha_file, sha)
     return True
 
 
+def deliver(outbox, dispatcher, tried, report):
+    """Versendet alle Mails im Postausgang, die in diesem Lauf noch nicht
+    versucht wurden, in Reihenfolge.
+
+    Erst nach erfolgreichem Versand wird der SHA-Stand des Kantons
+    gespeichert und die Mail entfernt. Schlägt eine Mail fehl, bleibt sie
+    (und jede spätere Mail desselben Kantons) für den nächsten Lauf liegen,
+    damit ein älterer Stand nie einen neueren überschreibt.
+    """
+    blocked = {e["kanton"] for e in outbox if e["id"] in tried}
+    for entry in outbox:
+        kid = entry["kanton"]
+        if entry["id"] in tried or kid in blocked:
+            continue
+        tried.add(entry["id"])
+        recipient = os.environ.get(entry["recipient_secret"], "")
+        cc = os.environ.get("MAIL_COPY") if entry.get("use_cc") else None
+        try:
+            if not recipient:
+                raise RuntimeError(f"kein Empfänger-Secret gefunden ({entry['recipient_secret']})")
+            with report.span("mail", kid, bytes_out=len(entry["html"].encode("utf-8"))):
+                dispatcher.send(entry["subject"], entry["html"], recipient, cc)
+        except Exception as e:
+            print(f"[{kid}] FEHLER beim Mailversand: {e}")
+            print(f"[{kid}] SHA wird NICHT gespeichert - Mail bleibt im Postausgang "
+                  f"und wird beim nächsten Lauf erneut versucht.")
+            outbox.failed(entry, e)
+            blocked.add(kid)
+            continue
+        save_sha(entry["sha_file"], entry["sha"])
+        outbox.remove(entry)
+
+
 def main():
     config = load_config()
     state_changed = False
-
-    for kanton in config["kantone"]:
-        mode = kanton.get("reporting_mode", "immediate")
-        try:
-            if mode == "immediate":
-                changed = process_immediate(kanton)
-            elif mode == "immediate_new_deleted_weekly_changed":
-                changed = process_be_style(kanton)
-            else:
+    report = RunReport("reporting")
+
+    with report.span("git_history"):
+        history = GitHistory()
+        shas = history.last_commits(f"data/json/{k['geojson_file']}" for k in config["kantone"])
+    outbox = Outbox()
+    if len(outbox):
+        print(f"{len(outbox)} Mail(s) aus früheren Läufen im Postausgang")
+
+    # Vorprüfung: welche Kantone brauchen überhaupt einen Diff?
+    jobs = []
+    with report.span("plan"):
+        for kanton in config["kantone"]:
+            mode = kanton.get("reporting_mode", "immediate")
+            if mode not in MODES:
                 print(f"WARNUNG: Unbekannter reporting_mode '{mode}' für {kanton['id']}")
+                continue
+            try:
+                planned = plan(kanton, history, shas, outbox)
+            except (subprocess.CalledProcessError, OSError, KeyError, ValueError) as e:
+                print(f"FEHLER bei Kanton {kanton['id']}: {e}")
+                continue
+            if planned is not None:
+                jobs.append((kanton, *planned))
+    history.close()
+
+    tried = set()
+    with ProcessPoolExecutor(max_workers=max(1, min(WORKERS, len(jobs)))) as pool, \
+            MailDispatcher(os.environ.get("MAIL_USER"), os.environ.get("MAIL_PASS"),
+                           dry_run=DRY_RUN) as dispatcher:
+        futures = [
+            pool.submit(analyze, kanton, *blobs, load_anchors(anchors_path(kanton["id"]))) if blobs else None
+            for kanton, _, _, blobs in jobs
+        ]
+
+        # Mails aus früheren Läufen zuerst
+        deliver(outbox, dispatcher, tried, report)
+
+        # Ergebnisse in Config-Reihenfolge anwenden und sofort versenden;
+        # die Taktung überlappt so mit der Berechnung der übrigen Kantone.
+        for (kanton, sha, sha_file, _), future in zip(jobs, futures):
+            try:
+                result = future.result() if future else None
+                changed = apply_result(kanton, sha, sha_file, result, outbox, report)
+            except (subprocess.CalledProcessError, OSError, KeyError, ValueError) as e:
+                print(f"FEHLER bei Kanton {kanton['id']}: {e}")
                 changed = False
-        except subprocess.CalledProcessError as e:
-            print(f"FEHLER bei Kanton {kanton['id']}: {e}")
-            changed = False
+            state_changed = state_changed or changed
+            deliver(outbox, dispatcher, tried, report)
 
-        state_changed = state_changed or changed
+    state_changed = state_changed or outbox.dirty
 
     github_env = os.environ.get("GITHUB_ENV")
     if github_env:
         with open(github_env, "a", encoding="utf-8") as f:
             f.write(f"STATE_CHANGED={'true' if state_changed else 'false'}\n")
 
+    report.finish()
     print(f"\nFertig. STATE_CHANGED={state_changed}")
 
 
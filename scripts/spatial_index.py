@@ -0,0 +1,217 @@
+"""
+Räumlicher Index über Defi-Standorte (Koordinaten in WGS84).
+
+- GridIndex: gleichmässiges Gitter in Metern; Punkte werden nach Zelle
+  einsortiert, Nachbarschaftsabfragen prüfen nur die umliegenden Zellen
+  statt aller Paare
+- pairs_within(): alle Punktpaare mit Abstand <= Radius, z.B. für die
+  Duplikat-Erkennung in geojson_validation.py
+- distance_m(): Abstand zweier Punkte in Metern (lokale Projektion,
+  für Distanzen bis einige Kilometer genau genug)
+- haversine_m(): Grosskreis-Abstände für viele Punktpaare auf einmal (mit
+  NumPy vektorisiert), z.B. für verschobene Defis in geojson_diff.py
+- KDTree: statischer 2D-Baum in flachen Arrays für "die k nächsten Defis"
+  bzw. "alle Defis im Umkreis" um einen beliebigen Punkt (defi_lookup.py),
+  mit Grosskreis-Abständen
+
+Verwendung:
+    grid = GridIndex([(d.lon, d.lat) for d in defis], cell_m=10)
+    for i, j, dist in grid.pairs_within(10):
+        ...
+
+    tree = KDTree([(d.lon, d.lat) for d in defis])
+    for i, dist in tree.nearest(8.54, 47.37, k=5):
+        ...
+"""
+
+import heapq
+import math
+from array import array
+from collections import defaultdict
+
+# NumPy ist optional: ohne wird paarweise in Python gerechnet
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Meter pro Grad Breite; pro Grad Länge zusätzlich mal cos(Breite)
+M_PER_DEG_LAT = 110_574.0
+M_PER_DEG_LON_EQUATOR = 111_320.0
+
+# Referenzbreite der lokalen Projektion (Mitte Schweiz)
+REFERENCE_LAT = 46.8
+
+EARTH_RADIUS_M = 6_371_008.8
+
+_KX = M_PER_DEG_LON_EQUATOR * math.cos(math.radians(REFERENCE_LAT))
+_KY = M_PER_DEG_LAT
+
+# Nachbarzellen "vorwärts": jedes Zellenpaar wird genau einmal verglichen
+_FORWARD = ((1, 0), (-1, 1), (0, 1), (1, 1))
+
+
+def distance_m(lon1, lat1, lon2, lat2) -> float:
+    return math.hypot((lon1 - lon2) * _KX, (lat1 - lat2) * _KY)
+
+
+def haversine_m(lons1, lats1, lons2, lats2) -> list:
+    """Grosskreis-Abstand in Metern für jedes Paar (lons1[i], lats1[i]) ->
+    (lons2[i], lats2[i])."""
+    if np is None:
+        result = []
+        for lon1, lat1, lon2, lat2 in zip(lons1, lats1, lons2, lats2):
+            p1, p2 = math.radians(lat1), math.radians(lat2)
+            a = (math.sin((p2 - p1) / 2) ** 2
+                 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+            result.append(2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a))))
+        return result
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(v, dtype=float)) for v in (lons1, lats1, lons2, lats2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return (2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(a)))).tolist()
+
+
+class GridIndex:
+    """Punkte (lon, lat) in Gitterzellen von `cell_m` Metern Kantenlänge."""
+
+    def __init__(self, points, cell_m: float):
+        self.cell_m = cell_m
+        self.points = []
+        self.cells = defaultdict(list)
+        for i, (lon, lat) in enumerate(points):
+            x, y = lon * _KX, lat * _KY
+            self.points.append((x, y))
+            self.cells[(int(x // cell_m), int(y // cell_m))].append(i)
+
+    def pairs_within(self, radius_m: float):
+        """(i, j, Abstand in m) für alle Paare i < j mit Abstand <= radius_m.
+
+        Erfordert radius_m <= cell_m, damit die direkten Nachbarzellen
+        genügen.
+        """
+        if radius_m > self.cell_m:
+            raise ValueError(f"Radius {radius_m} m grösser als Zellgrösse {self.cell_m} m")
+        points = self.points
+        for (cx, cy), ids in self.cells.items():
+            for n, i in enumerate(ids):
+                xi, yi = points[i]
+                for j in ids[n + 1:]:
+                    d = math.hypot(xi - points[j][0], yi - points[j][1])
+                    if d <= radius_m:
+                        yield min(i, j), max(i, j), d
+            for dx, dy in _FORWARD:
+                other = self.cells.get((cx + dx, cy + dy))
+                if not other:
+                    continue
+                for i in ids:
+                    xi, yi = points[i]
+                    for j in other:
+                        d = math.hypot(xi - points[j][0], yi - points[j][1])
+                        if d <= radius_m:
+                            yield min(i, j), max(i, j), d
+
+
+class KDTree:
+    """Punkte (lon, lat) als impliziter KD-Baum: der Knoten eines Bereichs
+    [lo, hi) ist sein Median, abwechselnd nach Länge und Breite geteilt.
+
+    Koordinaten und Indizes liegen in Baum-Reihenfolge in flachen Arrays,
+    es gibt keine Knoten-Objekte. Gesucht, gefiltert und sortiert wird
+    direkt mit dem Haversine-Term hav(d) = hav(Δφ) + cos φ1 cos φ2 hav(Δλ),
+    der monoton im Grosskreis-Abstand ist; die Abstände stimmen also mit
+    haversine_m() überein. Beim Abschneiden eines Teilbaums dienen
+    untere Schranken auf der Kugel (Breite: hav(Δφ); Länge: mit dem
+    kleinsten cos φ, das innerhalb der aktuellen Schranke noch möglich ist),
+    es geht also kein Punkt verloren, auch fern der Referenzbreite.
+    """
+
+    def __init__(self, points):
+        points = list(points)
+        order = list(range(len(points)))
+        stack = [(0, len(order), 0)]
+        while stack:
+            lo, hi, axis = stack.pop()
+            if hi - lo < 2:
+                continue
+            order[lo:hi] = sorted(order[lo:hi], key=lambda i, axis=axis: points[i][axis])
+            mid = (lo + hi) // 2
+            stack.append((lo, mid, 1 - axis))
+            stack.append((mid + 1, hi, 1 - axis))
+        self.lons = array("d", (points[i][0] for i in order))
+        self.lats = array("d", (points[i][1] for i in order))
+        self._cos = array("d", (math.cos(math.radians(lat)) for lat in self.lats))
+        self._ids = array("l", order)
+        self._lon_range = (min(self.lons), max(self.lons)) if points else (0.0, 0.0)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def nearest(self, lon, lat, k: int, accept=None, max_m: float = math.inf):
+        """Die k nächsten Punkte als [(index, Abstand in m)], nächster zuerst.
+
+        accept(index) filtert während der Suche, es kommen also k passende
+        Punkte zurück, sofern es so viele gibt.
+        """
+        return self._search(lon, lat, k, max_m, accept)
+
+    def within(self, lon, lat, radius_m: float, accept=None):
+        """Alle Punkte im Umkreis von radius_m, nächster zuerst."""
+        return self._search(lon, lat, None, radius_m, accept)
+
+    def _search(self, lon, lat, k, max_m, accept):
+        if k is not None and k < 1 or not self._ids:
+            return []
+        lons, lats, coss, ids = self.lons, self.lats, self._cos, self._ids
+        cos_q = math.cos(math.radians(lat))
+        # Über die Datumsgrenze kann ein Punkt näher sein, als Δλ im Baum
+        # vermuten lässt; Δλ nie grösser annehmen als der Weg "aussen herum"
+        lon_min, lon_max = self._lon_range
+        wrap = 360.0 - max(abs(lon_max - lon), abs(lon - lon_min))
+        found = []  # Max-Heap über (-hav(d), Position), höchstens k Einträge
+        bound = _hav_bound(max_m)
+        min_cos = _min_cos(lat, bound)
+        stack = [(0, len(ids), 0)]
+        while stack:
+            lo, hi, axis = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            dlon, dlat = lons[mid] - lon, lats[mid] - lat
+            h = _hav(dlat) + cos_q * coss[mid] * _hav(dlon)
+            if h <= bound and (accept is None or accept(ids[mid])):
+                if k is None or len(found) < k:
+                    heapq.heappush(found, (-h, mid))
+                else:
+                    heapq.heappushpop(found, (-h, mid))
+                if k is not None and len(found) == k and -found[0][0] < bound:
+                    bound = -found[0][0]
+                    min_cos = _min_cos(lat, bound)
+            delta = dlon if axis == 0 else dlat
+            near, far = ((mid + 1, hi), (lo, mid)) if delta < 0 else ((lo, mid), (mid + 1, hi))
+            # Untere Schranke für hav(d) aller Punkte jenseits der Teilungsebene
+            if axis == 0:
+                far_h = cos_q * min_cos * _hav(min(abs(delta), wrap, 180.0))
+            else:
+                far_h = _hav(delta)
+            # Stack: die nahe Seite zuletzt drauf, damit sie zuerst dran ist
+            if far_h <= bound:
+                stack.append((*far, 1 - axis))
+            stack.append((*near, 1 - axis))
+        hits = sorted((-neg_h, ids[p]) for neg_h, p in found)
+        return [(i, 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(h)))) for h, i in hits]
+
+
+def _hav(deg: float) -> float:
+    return math.sin(math.radians(deg) / 2) ** 2
+
+
+def _hav_bound(max_m: float) -> float:
+    """Abstand in m -> hav(Winkel); ab dem halben Erdumfang 1 (alles)."""
+    angle = max_m / EARTH_RADIUS_M
+    return 1.0 if angle >= math.pi else math.sin(angle / 2) ** 2
+
+
+def _min_cos(lat: float, bound: float) -> float:
+    """Kleinstes cos(Breite) eines Punkts mit hav(d) <= bound um `lat`."""
+    reach = math.degrees(2 * math.asin(min(1.0, math.sqrt(bound))))
+    return max(0.0, math.cos(math.radians(min(90.0, abs(lat) + reach))))
@@ -0,0 +1,135 @@
+"""Split-Modus gegen Einzel-Queries: bytegleiche Ausgabe.
+
+Ohne Netz lassen sich die echten Overpass-Grenzen nicht holen, deshalb
+bekommt jedes Gebiet ein unregelmässiges Ersatz-Polygon (mit Loch bzw.
+mehreren Teilflächen). Für dieselbe Grenze wird die Antwort des
+Einzel-Queries unabhängig nachgebaut (Punkt-in-Polygon per Brute Force,
+dann osm_to_geojson.convert wie in overpass_fetch.py) und mit der Datei
+verglichen, die area_split.split() schreibt.
+"""
+
+import json
+import math
+import random
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import area_split  # noqa: E402
+from osm_to_geojson import convert, dumps_geojson, write_geojson  # noqa: E402
+
+# Kanton, mehrere Kantone (Dispo), Stadt mit Mehrfach-Selektor, nationale Quellen
+QUERIES = ("defis_switzerland", "defis_liechtenstein", "defis_kt_zh", "defis_kt_zg",
+           "defis_dispo_srz", "defis_stadt_zug")
+
+
+def load_features(path):
+    return json.loads(path.read_text(encoding="utf-8"))["features"]
+
+
+def to_elements(features):
+    elements = []
+    for f in features:
+        lon, lat = f["geometry"]["coordinates"]
+        tags = {k: v for k, v in f["properties"].items() if k != "id"}
+        elements.append({"type": "node", "id": int(f["id"].split("/")[1]), "lat": lat, "lon": lon, "tags": tags})
+    return {"elements": elements}
+
+
+def blob(rng, lon, lat, radius, n=300):
+    """Unregelmässiger geschlossener Ring um (lon, lat)."""
+    ring = []
+    for i in range(n):
+        a = 2 * math.pi * i / n
+        r = radius * (0.6 + 0.4 * rng.random())
+        ring.append([lon + r * math.cos(a) * 1.5, lat + r * math.sin(a)])
+    return ring + [ring[0]]
+
+
+def ring_contains(ring, lon, lat):
+    inside = False
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+        if (y1 > lat) != (y2 > lat) and lon < (x2 - x1) * (lat - y1) / (y2 - y1) + x1:
+            inside = not inside
+    return inside
+
+
+def multipolygon_contains(coordinates, lon, lat):
+    return any(
+        ring_contains(polygon[0], lon, lat) and not any(ring_contains(h, lon, lat) for h in polygon[1:])
+        for polygon in coordinates
+    )
+
+
+@pytest.fixture()
+def workdir(tmp_path, monkeypatch):
+    rng = random.Random(3)
+    (tmp_path / "queries").mkdir()
+    for name in QUERIES:
+        shutil.copy(ROOT / "queries" / f"{name}.overpassql", tmp_path / "queries")
+    json_dir = tmp_path / "data" / "json"
+    json_dir.mkdir(parents=True)
+
+    national = {}
+    for path in sorted((ROOT / "data" / "json").glob("defis_kt_*.geojson")):
+        for f in load_features(path):
+            national.setdefault(f["id"], f)
+    write_geojson(national.values(), json_dir / "defis_switzerland.geojson")
+    shutil.copy(ROOT / "data" / "json" / "defis_liechtenstein.geojson", json_dir)
+
+    monkeypatch.chdir(tmp_path)
+    boundaries = {}
+    queries = area_split.load_queries()
+    for name in QUERIES:
+        areas, _ = queries[name]
+        for selector in areas:
+            if selector in area_split.SOURCES or selector in boundaries:
+                continue
+            # Ersatz-Grenze um die Defis des Kantons bzw. um Zug
+            kid = dict((k, v) for k, _, v in selector).get("ISO3166-2", "CH-ZG")[3:].lower()
+            pts = [f["geometry"]["coordinates"] for f in load_features(ROOT / "data/json" / f"defis_kt_{kid}.geojson")]
+            lon = sum(p[0] for p in pts) / len(pts)
+            lat = sum(p[1] for p in pts) / len(pts)
+            radius = 0.02 if "name" in dict((k, v) for k, _, v in selector) else 0.25
+            outer = blob(rng, lon, lat, radius)
+            hole = blob(rng, lon + radius * 0.3, lat, radius * 0.15)
+            # Teilflächen dürfen sich nicht überlappen (gültiges MultiPolygon)
+            second = blob(rng, lon - radius * 2.5, lat + radius * 0.8, radius * 0.3)
+            coordinates = [[outer, hole], [second]]
+            boundaries[selector] = coordinates
+            path = area_split.boundary_path(selector)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps({"type": "FeatureCollection", "features": [
+                {"type": "Feature", "properties": {}, "geometry": {"type": "MultiPolygon", "coordinates": coordinates}}
+            ]}), encoding="utf-8")
+    return tmp_path, queries, boundaries, list(national.values())
+
+
+def test_split_matches_single_queries(workdir):
+    tmp_path, queries, boundaries, national = workdir
+    area_split.split(queries)
+
+    for name in QUERIES:
+        if name in area_split.SOURCES.values():
+            continue
+        areas, tag_filters = queries[name]
+        assert not tag_filters
+        inside = [
+            f for f in national
+            if any(multipolygon_contains(boundaries[a], *f["geometry"]["coordinates"]) for a in areas)
+        ]
+        assert inside, name
+        # Was das Einzel-Query über osm_to_geojson geschrieben hätte
+        expected = dumps_geojson(convert(to_elements(inside)))
+        written = (tmp_path / "data" / "json" / f"{name}.geojson").read_text(encoding="utf-8")
+        assert written == expected, name
+
+
+def test_sources_are_not_derived(workdir):
+    _, queries, _, _ = workdir
+    assert area_split.remote_queries(queries) == ["defis_switzerland", "defis_liechtenstein"]
@@ -0,0 +1,76 @@
+"""Hot-Reload von scripts/defi_lookup.py: fehlt eine Datei oder ist sie
+kaputt, bleibt der alte Stand."""
+
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "scripts"))
+
+from defi_lookup import DefiLookup  # noqa: E402
+from osm_to_geojson import dumps_geojson  # noqa: E402
+
+
+def feature(node_id, lon, lat, name):
+    key = f"node/{node_id}"
+    return {"type": "Feature", "id": key,
+            "properties": {"emergency": "defibrillator", "name": name, "id": key},
+            "geometry": {"type": "Point", "coordinates": [lon, lat]}}
+
+
+@pytest.fixture()
+def sources(tmp_path):
+    ch, li = tmp_path / "defis_switzerland.geojson", tmp_path / "defis_liechtenstein.geojson"
+    ch.write_text(dumps_geojson([feature(1, 8.54, 47.37, "Zürich HB")]), encoding="utf-8")
+    li.write_text(dumps_geojson([feature(2, 9.52, 47.14, "Vaduz")]), encoding="utf-8")
+    return ch, li
+
+
+def nearest_name(lookup):
+    return lookup.nearest(47.37, 8.54, k=1)[0]["name"]
+
+
+def test_missing_source_keeps_snapshot(sources):
+    ch, li = sources
+    lookup = DefiLookup((str(ch), str(li)))
+    assert nearest_name(lookup) == "Zürich HB"
+
+    text = ch.read_text(encoding="utf-8")
+    ch.unlink()
+    assert lookup.reload_if_changed() is False
+    assert nearest_name(lookup) == "Zürich HB" and lookup.health()["defis"] == 2
+
+    ch.write_text(text[: len(text) // 2], encoding="utf-8")  # halb geschrieben
+    assert lookup.reload_if_changed() is False
+    assert nearest_name(lookup) == "Zürich HB"
+
+    ch.write_text(dumps_geojson([feature(3, 8.55, 47.37, "Central")]), encoding="utf-8")
+    assert lookup.reload_if_changed() is True
+    assert nearest_name(lookup) == "Central"
+
+
+def test_missing_source_at_start_raises(sources, tmp_path):
+    _, li = sources
+    with pytest.raises(FileNotFoundError):
+        DefiLookup((str(tmp_path / "fehlt.geojson"), str(li)))
+
+
+def test_watch_thread_survives_failed_reload(sources):
+    ch, li = sources
+    lookup = DefiLookup((str(ch), str(li)))
+    lookup.watch(interval=0.01)
+    try:
+        ch.unlink()
+        time.sleep(0.1)
+        assert lookup._watcher.is_alive() and nearest_name(lookup) == "Zürich HB"
+        ch.write_text(dumps_geojson([feature(3, 8.55, 47.37, "Central")]), encoding="utf-8")
+        deadline = time.monotonic() + 5
+        while nearest_name(lookup) != "Central" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert nearest_name(lookup) == "Central"
+    finally:
+        lookup.close()
@@ -0,0 +1,115 @@
+"""geojson_diff.diff: Verschiebungen (auch in vielen kleinen Schritten) und
+der Diff über nur die geänderten Zeilen (defi_features.changed_indexes)."""
+
+import copy
+import json
+import random
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "scripts"))
+
+from defi_features import changed_indexes, from_collection, index, loads, loads_snapshot  # noqa: E402
+from geojson_diff import MOVE_THRESHOLD_M, diff, load_anchors, save_anchors  # noqa: E402
+from osm_to_geojson import dumps_geojson  # noqa: E402
+
+# Ein Schritt nach Norden: 40% der Schwelle (Meter pro Grad Breite auf der Kugel)
+STEP_M = MOVE_THRESHOLD_M * 0.4
+STEP_DEG = STEP_M / 111_195
+
+
+def snapshot(lat, name="Gemeindehaus", node_id=1):
+    feature = {
+        "type": "Feature",
+        "id": f"node/{node_id}",
+        "properties": {"id": f"node/{node_id}", "emergency": "defibrillator", "name": name},
+        "geometry": {"type": "Point", "coordinates": [8.5, lat]},
+    }
+    return index(from_collection({"features": [feature]}))
+
+
+def test_small_steps_add_up_to_a_move():
+    anchors = {}
+    lats = [47.0 + i * STEP_DEG for i in range(4)]  # 0, 0.4, 0.8, 1.2 x Schwelle
+    reports = []
+    for old, new in zip(lats, lats[1:]):
+        d = diff(snapshot(old), snapshot(new), anchors)
+        anchors = d.anchors
+        reports.append(d.moved)
+    assert reports[0] == [] and reports[1] == []
+    (old, new, distance, _), = reports[2]
+    assert round(distance, 3) == round(3 * STEP_M, 3)
+    # Gemeldet ab der letzten gemeldeten Position, nicht ab dem Vorgänger
+    assert (old.lon, old.lat) == (8.5, 47.0)
+    assert anchors == {}
+
+
+def test_anchor_survives_field_changes_and_clears_on_return():
+    d = diff(snapshot(47.0), snapshot(47.0 + STEP_DEG))
+    assert d.anchors == {"node/1": [8.5, 47.0]}
+    # Nur Name geändert: Anker bleibt, Änderung wird gemeldet
+    d = diff(snapshot(47.0 + STEP_DEG), snapshot(47.0 + STEP_DEG, name="Schule"), d.anchors)
+    assert d.anchors == {"node/1": [8.5, 47.0]} and len(d.changed) == 1
+    # Zurück an die gemeldete Position: nichts zu merken
+    d = diff(snapshot(47.0 + STEP_DEG, name="Schule"), snapshot(47.0, name="Schule"), d.anchors)
+    assert d.anchors == {} and not d.moved
+
+
+def test_removed_defi_drops_anchor():
+    anchors = {"node/1": [8.5, 47.0], "node/2": [8.6, 47.1]}
+    d = diff(snapshot(47.0), snapshot(47.0, node_id=3), anchors)
+    assert "node/1" not in d.anchors and d.anchors["node/2"] == [8.6, 47.1]
+
+
+def test_anchor_file_roundtrip(tmp_path):
+    path = str(tmp_path / ".reporting" / "move_anchors_zh.json")
+    assert load_anchors(path) == {}
+    save_anchors(path, {"node/1": [8.5, 47.0]})
+    assert load_anchors(path) == {"node/1": [8.5, 47.0]}
+    save_anchors(path, {})
+    assert not Path(path).exists()
+
+
+def summary(d):
+    return (
+        [x.key for x in d.added], [x.key for x in d.removed],
+        [(o.key, n.key, c) for o, n, c in d.changed],
+        [(o.key, (o.lon, o.lat), round(m, 6), c) for o, _, m, c in d.moved],
+        d.anchors,
+    )
+
+
+def test_changed_lines_give_same_diff():
+    old = json.loads((ROOT / "data" / "json" / "defis_kt_zg.geojson").read_text(encoding="utf-8"))["features"]
+    rng = random.Random(5)
+    new = copy.deepcopy(old)
+    for f in rng.sample(new, 10):
+        f["properties"]["name"] = "Umbenannt"
+    for f in rng.sample(new, 5):
+        f["properties"]["note"] = "nicht relevant"
+    for f in rng.sample(new, 5):
+        f["geometry"]["coordinates"][1] += rng.choice((0.0001, 0.01))
+    for f in rng.sample(new, 3):
+        new.remove(f)
+    added = copy.deepcopy(old[0])
+    added["id"] = added["properties"]["id"] = "node/99999999999"  # wird zur letzten Zeile
+    new.append(added)
+    anchors = {old[1]["id"]: [8.0, 47.0], old[2]["id"]: [8.0, 47.0]}
+    new = [f for f in new if f["id"] != old[2]["id"]]
+
+    old_text, new_text = dumps_geojson(old), dumps_geojson(new)
+    expected = summary(diff(index(loads(old_text)), index(loads(new_text)), anchors))
+    assert expected[0] and expected[1] and expected[2] and expected[3]
+
+    old_snap, new_snap = loads_snapshot(old_text), loads_snapshot(new_text)
+    assert isinstance(old_snap, frozenset) and len(new_snap) == len(new)
+    old_idx, new_idx = changed_indexes(old_snap, new_snap)
+    assert len(new_idx) < 40
+    assert summary(diff(old_idx, new_idx, anchors)) == expected
+
+    # Älterer Stand in anderem Format: voller Index auf beiden Seiten
+    legacy = loads_snapshot(json.dumps({"type": "FeatureCollection", "features": old}, indent=2))
+    assert isinstance(legacy, dict)
+    assert summary(diff(*changed_indexes(legacy, new_snap), anchors)) == expected
@@ -0,0 +1,93 @@
+"""Augmented Diff (incremental_update.py) gegen den vollständigen Download.
+
+Dieselben OSM-Objekte einmal als Overpass-JSON ("out body; >; out skel qt;")
+durch convert() und einmal als adiff mit "out geom" durch apply_adiff():
+die geschriebenen Dateien müssen bytegleich sein, auch für Ways und
+Relationen.
+"""
+
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from incremental_update import adiff_query, apply_adiff, parse_adiff  # noqa: E402
+from osm_to_geojson import convert, dumps_geojson  # noqa: E402
+
+# Nodes 1-4: Umriss eines Gebäudes (geschlossen), 5: Eingang, 6: Einzel-Defi
+NODES = {
+    1: (47.3769, 8.5417), 2: (47.3771, 8.5422), 3: (47.3775, 8.5419),
+    4: (47.3773, 8.5411), 5: (47.3770, 8.5415), 6: (46.9480, 7.4474),
+}
+DEFI = {"emergency": "defibrillator"}
+
+FULL = {"elements": [
+    {"type": "node", "id": 6, "lat": NODES[6][0], "lon": NODES[6][1], "tags": {**DEFI, "name": "Bahnhof"}},
+    {"type": "way", "id": 10, "nodes": [1, 2, 3, 4, 1], "tags": {**DEFI, "name": "Schulhaus"}},
+    {"type": "relation", "id": 20, "tags": {**DEFI, "name": "Spital", "type": "site"}, "members": [
+        {"type": "node", "ref": 5, "role": "entrance"},
+        {"type": "way", "ref": 10, "role": ""},
+    ]},
+    # "out skel qt"
+    *({"type": "node", "id": nid, "lat": lat, "lon": lon} for nid, (lat, lon) in NODES.items() if nid != 6),
+]}
+
+
+def tags_xml(tags):
+    return "".join(f'<tag k="{k}" v="{v}"/>' for k, v in tags.items())
+
+
+def nd_xml(ids, with_ref=True):
+    # In Relations-Membern liefert Overpass die Nodes ohne ref
+    refs = [f' ref="{i}"' if with_ref else "" for i in ids]
+    return "".join(f'<nd{ref} lat="{NODES[i][0]}" lon="{NODES[i][1]}"/>' for i, ref in zip(ids, refs))
+
+
+def adiff(actions):
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><osm version="0.6">'
+        '<meta osm_base="2026-10-12T10:00:00Z"/>' + "".join(actions) + "</osm>"
+    )
+
+
+def create(el_xml):
+    return f'<action type="create">{el_xml}</action>'
+
+
+WAY = f'<way id="10">{nd_xml([1, 2, 3, 4, 1])}{tags_xml({**DEFI, "name": "Schulhaus"})}</way>'
+RELATION = (
+    '<relation id="20">'
+    f'<member type="node" ref="5" role="entrance" lat="{NODES[5][0]}" lon="{NODES[5][1]}"/>'
+    f'<member type="way" ref="10" role="">{nd_xml([1, 2, 3, 4, 1], with_ref=False)}</member>'
+    f'{tags_xml({**DEFI, "name": "Spital", "type": "site"})}</relation>'
+)
+NODE = f'<node id="6" lat="{NODES[6][0]}" lon="{NODES[6][1]}">{tags_xml({**DEFI, "name": "Bahnhof"})}</node>'
+
+
+def test_adiff_matches_full_download():
+    osm_base, actions = parse_adiff(adiff([create(NODE), create(WAY), create(RELATION)]))
+    assert osm_base == "2026-10-12T10:00:00Z"
+    store = {}
+    assert apply_adiff(store, actions) == {"create": 3, "modify": 0, "delete": 0}
+    assert dumps_geojson(store.values()) == dumps_geojson(convert(FULL))
+
+
+def test_modify_and_delete():
+    store = {f["id"]: f for f in convert(FULL)}
+    moved = WAY.replace(f'lat="{NODES[3][0]}"', 'lat="47.3785"')
+    _, actions = parse_adiff(adiff([
+        f'<action type="modify"><old>{WAY}</old><new>{moved}</new></action>',
+        f'<action type="delete"><old>{NODE}</old><new><node id="6" visible="false"/></new></action>',
+    ]))
+    assert apply_adiff(store, actions) == {"create": 0, "modify": 1, "delete": 1}
+    assert sorted(store) == ["relation/20", "way/10"]
+    lat = store["way/10"]["geometry"]["coordinates"][1]
+    assert lat == (2 * NODES[1][0] + NODES[2][0] + 47.3785 + NODES[4][0]) / 5
+
+
+def test_adiff_query_requests_geometry():
+    query = (ROOT / "queries" / "defis_switzerland.overpassql").read_text(encoding="utf-8")
+    text = adiff_query(query, "2026-10-12T10:00:00Z")
+    assert '[out:xml][adiff:"2026-10-12T10:00:00Z"]' in text
+    assert text.endswith("out geom;") and "out body" not in text and "out center" not in text
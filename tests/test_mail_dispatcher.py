@@ -0,0 +1,184 @@
+"""Mailversand (scripts/mail_dispatcher.py) gegen einen lokalen SMTP-Stub.
+
+Der Stub spricht gerade genug SMTP für smtplib (ohne STARTTLS und Login)
+und läuft in einem Thread auf localhost. Der Dispatcher findet ihn über
+MAIL_SMTP_HOST/MAIL_SMTP_PORT/MAIL_SMTP_STARTTLS, wie beim lokalen Testen
+im Modul-Docstring beschrieben. Die Taktung läuft auf einer Fake-Uhr.
+"""
+
+import importlib
+import json
+import socketserver
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "scripts"))
+
+import mail_dispatcher  # noqa: E402
+from process_all_kantone import deliver  # noqa: E402
+from run_report import RunReport  # noqa: E402
+
+SENDER = "reports@example.org"
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode("ascii"))
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        delivered = 0
+        recipients = []
+        self.reply("220 stub ESMTP")
+        for raw in self.rfile:
+            command = raw.decode("utf-8").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb in ("EHLO", "HELO"):
+                self.reply("250 stub")
+            elif verb == "MAIL":
+                recipients = []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                address = command.partition(":")[2].strip().strip("<>")
+                if address in server.refuse:
+                    self.reply("550 no such user")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 go ahead")
+                lines = []
+                for data in self.rfile:
+                    if data == b".\r\n":
+                        break
+                    lines.append(data)
+                server.messages.append((recipients, b"".join(lines).decode("utf-8")))
+                self.reply("250 queued")
+                delivered += 1
+                if server.drop_after and delivered >= server.drop_after:
+                    return  # Server schliesst die Verbindung (Idle-Timeout o.ä.)
+            elif verb in ("RSET", "NOOP"):
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 not implemented")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture()
+def smtp():
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPHandler)
+    server.daemon_threads = True
+    server.connections = 0
+    server.messages = []
+    server.refuse = set()
+    server.drop_after = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def md(smtp, monkeypatch):
+    """mail_dispatcher, neu geladen mit den Overrides auf den Stub."""
+    monkeypatch.setenv("MAIL_SMTP_HOST", "127.0.0.1")
+    monkeypatch.setenv("MAIL_SMTP_PORT", str(smtp.server_address[1]))
+    monkeypatch.setenv("MAIL_SMTP_STARTTLS", "false")
+    module = importlib.reload(mail_dispatcher)
+    monkeypatch.setattr(module, "RETRY_DELAY_SECONDS", 0)
+    yield module
+    monkeypatch.undo()
+    importlib.reload(mail_dispatcher)
+
+
+def dispatcher(md, clock):
+    return md.MailDispatcher(SENDER, None, bucket=md.TokenBucket(8, clock=clock, sleep=clock.sleep))
+
+
+def test_pacing_over_one_connection(md, smtp):
+    clock = FakeClock()
+    with dispatcher(md, clock) as d:
+        for i in range(3):
+            d.send(f"Mail {i}", "<p>x</p>", "a@example.org")
+        assert clock.sleeps == [8, 8]
+        # Zeit, die ohnehin vergeht, zählt mit
+        clock.now += 5
+        d.send("Mail 3", "<p>x</p>", "a@example.org")
+        assert clock.sleeps == [8, 8, 3]
+        # Kein Vorrat über burst hinaus
+        clock.now += 60
+        d.send("Mail 4", "<p>x</p>", "a@example.org")
+        d.send("Mail 5", "<p>x</p>", "a@example.org")
+        assert clock.sleeps == [8, 8, 3, 8]
+    assert len(smtp.messages) == 6 and smtp.connections == 1
+    assert smtp.messages[0][0] == ["a@example.org"] and "Subject: Mail 0" in smtp.messages[0][1]
+
+
+def test_reconnect_after_server_drops(md, smtp, capsys):
+    smtp.drop_after = 1
+    with dispatcher(md, FakeClock()) as d:
+        for i in range(3):
+            d.send(f"Mail {i}", "<p>x</p>", "a@example.org", "cc@example.org")
+    assert [m[0] for m in smtp.messages] == [["a@example.org", "cc@example.org"]] * 3
+    assert smtp.connections == 3
+    # Neu verbunden ohne Fehlversuch
+    assert "SMTP-Fehler" not in capsys.readouterr().out
+
+
+def test_failure_raises_after_attempts(md, smtp):
+    smtp.refuse.add("gone@example.org")
+    with dispatcher(md, FakeClock()) as d, pytest.raises(md.smtplib.SMTPRecipientsRefused):
+        d.send("Mail", "<p>x</p>", "gone@example.org")
+    assert smtp.messages == [] and smtp.connections == md.SEND_ATTEMPTS
+
+
+def test_sha_saved_only_after_successful_send(md, smtp, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("MAIL_RECIPIENT_ZH", "zh@example.org")
+    monkeypatch.setenv("MAIL_RECIPIENT_BE", "be@example.org")
+    smtp.refuse.add("be@example.org")
+
+    outbox = md.Outbox()
+    for kid, sha in (("be", "b1"), ("zh", "z1"), ("be", "b2")):
+        outbox.add(kanton=kid, sha=sha, sha_file=f".reporting/last_sha_{kid}.txt", subject=f"Änderungen {kid}",
+                   html="<p>x</p>", recipient_secret=f"MAIL_RECIPIENT_{kid.upper()}", use_cc=False)
+
+    with dispatcher(md, FakeClock()) as d:
+        deliver(outbox, d, set(), RunReport("reporting"))
+    assert (tmp_path / ".reporting" / "last_sha_zh.txt").read_text() == "z1"
+    assert not (tmp_path / ".reporting" / "last_sha_be.txt").exists()
+    # Die spätere BE-Mail wartet hinter der fehlgeschlagenen
+    assert [(e["sha"], e["attempts"]) for e in md.Outbox()] == [("b1", 1), ("b2", 0)]
+    assert "example.org" not in json.dumps(json.loads(Path(md.OUTBOX_FILE).read_text(encoding="utf-8")))
+
+    # Nächster Lauf: Server nimmt wieder an, Reihenfolge bleibt erhalten
+    smtp.refuse.clear()
+    outbox = md.Outbox()
+    with dispatcher(md, FakeClock()) as d:
+        deliver(outbox, d, set(), RunReport("reporting"))
+    # b1 vor b2, sonst stünde jetzt der ältere Stand in der Datei
+    assert (tmp_path / ".reporting" / "last_sha_be.txt").read_text() == "b2"
+    assert len(outbox) == 0 and not Path(md.OUTBOX_FILE).exists()
+    assert [m[0] for m in smtp.messages] == [["zh@example.org"], ["be@example.org"], ["be@example.org"]]
@@ -0,0 +1,60 @@
+"""Auswertung von opening_hours-Werten (opening_hours.py)."""
+
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from opening_hours import always_open, is_open  # noqa: E402
+
+# 2026-10-12 ist ein Montag
+MO, TU, SA, SU = (datetime(2026, 10, d) for d in (12, 13, 17, 18))
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("24/7", True),
+    ("24 / 7", True),
+    ("Mo-Su 00:00-24:00", True),
+    ("00:00-23:59", True),
+    ("Mo-Fr 00:00-24:00; Sa-Su 00:00-24:00", True),
+    ("Mo-Su 12:00-12:00", False),
+    ("00:00-00:00", False),
+    ("Mo-Su 00:00-24:00; PH off", False),
+    ("Mo-Fr 08:00-17:00", False),
+    ("sunrise-sunset", None),
+    ("", None),
+    (None, None),
+])
+def test_always_open(value, expected):
+    assert always_open(value) is expected
+
+
+def test_overnight_spans_next_day():
+    value = "Mo-Su 22:00-02:00"
+    assert is_open(value, TU.replace(hour=1)) is True
+    assert is_open(value, MO.replace(hour=1)) is True  # Überhang vom Sonntag
+    assert is_open(value, TU.replace(hour=3)) is False
+
+
+def test_later_rule_overrides_overnight_spill():
+    value = "Mo-Su 22:00-02:00; Su off"
+    assert is_open(value, SU.replace(hour=1)) is False
+    assert is_open(value, SU.replace(hour=23)) is False
+    assert is_open(value, SA.replace(hour=23)) is True
+    # Der Überhang vom (geschlossenen) Sonntag fällt weg
+    assert is_open(value, MO.replace(hour=1)) is False
+
+
+def test_spill_from_later_rule_is_kept():
+    value = "Mo-Fr 08:00-12:00; Sa 20:00-03:00"
+    assert is_open(value, SU.replace(hour=2)) is True
+    assert is_open(value, SU.replace(hour=4)) is False
+
+
+def test_additive_rule_and_zero_length_span():
+    value = "Mo-Fr 08:00-12:00, Sa 09:00-09:00"
+    assert is_open(value, MO.replace(hour=9)) is True
+    assert is_open(value, SA.replace(hour=9)) is False
@@ -0,0 +1,93 @@
+"""osm_to_geojson.py gegen die bestehenden data/json-Dateien.
+
+Die Dateien stammen aus der npm-CLI osmtogeojson. Aus ihren Features wird
+die Overpass-Antwort ("elements") rekonstruiert, die das jeweilige Query
+geliefert hat; convert() muss daraus wieder genau dieselben Features machen.
+"""
+
+import json
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from osm_to_geojson import convert, dumps_geojson, feature_sort_key  # noqa: E402
+
+GOLDEN = sorted((ROOT / "data" / "json").glob("*.geojson"))
+CANONICAL_HEADER = '{"type":"FeatureCollection","features":[\n'
+
+
+def to_elements(features, seed=0):
+    """GeoJSON-Features -> Overpass-Elemente, in zufälliger Reihenfolge."""
+    elements = []
+    for feature in features:
+        osm_type, _, osm_id = feature["id"].partition("/")
+        assert osm_type == "node", "Golden-Dateien enthalten nur Nodes"
+        lon, lat = feature["geometry"]["coordinates"]
+        tags = {k: v for k, v in feature["properties"].items() if k != "id"}
+        elements.append({"type": "node", "id": int(osm_id), "lat": lat, "lon": lon, "tags": tags})
+    random.Random(seed).shuffle(elements)
+    return {"version": 0.6, "elements": elements}
+
+
+@pytest.mark.parametrize("path", GOLDEN, ids=lambda p: p.stem)
+def test_matches_osmtogeojson_output(path):
+    text = path.read_text(encoding="utf-8")
+    expected = json.loads(text)["features"]
+    result = convert(to_elements(expected))
+
+    by_id = {f["id"]: f for f in result}
+    assert sorted(by_id) == sorted(f["id"] for f in expected)
+    for feature in expected:
+        got = by_id[feature["id"]]
+        assert got == feature
+        # Auch die Reihenfolge der Properties (Tags sortiert, "id" zuletzt)
+        assert list(got["properties"]) == list(feature["properties"])
+
+    dumped = dumps_geojson(result)
+    assert dumped == dumps_geojson(expected)
+    assert json.loads(dumped)["features"] == sorted(expected, key=feature_sort_key)
+    if text.startswith(CANONICAL_HEADER):
+        # Schon vom Python-Konverter geschrieben: bytegleich
+        assert dumped == text
+
+
+def test_way_and_relation_centroids():
+    data = {"elements": [
+        {"type": "way", "id": 10, "nodes": [1, 2, 3], "tags": {"emergency": "defibrillator"}},
+        {"type": "relation", "id": 20, "tags": {"emergency": "defibrillator", "name": "R"},
+         "members": [{"type": "node", "ref": 4, "role": ""}, {"type": "way", "ref": 10, "role": ""}]},
+        {"type": "node", "id": 5, "lat": 47.5, "lon": 8.5, "tags": {"emergency": "defibrillator"}},
+        # "out skel qt": Nodes ohne Tags, nur als Stützpunkte
+        {"type": "node", "id": 1, "lat": 47.0, "lon": 8.0},
+        {"type": "node", "id": 2, "lat": 47.0, "lon": 8.3},
+        {"type": "node", "id": 3, "lat": 47.3, "lon": 8.3},
+        {"type": "node", "id": 4, "lat": 47.4, "lon": 8.4},
+    ]}
+    features = {f["id"]: f for f in convert(data)}
+    assert sorted(features) == ["node/5", "relation/20", "way/10"]
+    way = features["way/10"]["geometry"]["coordinates"]
+    assert way == pytest.approx([8.2, 47.1])
+    relation = features["relation/20"]["geometry"]["coordinates"]
+    assert relation == pytest.approx([(8.4 + 8.2) / 2, (47.4 + 47.1) / 2])
+    assert list(features["relation/20"]["properties"]) == ["emergency", "name", "id"]
+    assert dumps_geojson(features.values()).splitlines()[1].startswith('{"type":"Feature","id":"node/5"')
+
+
+def test_out_center_and_tagged_node_wins():
+    data = {"elements": [
+        {"type": "node", "id": 7, "lat": 47.0, "lon": 8.0},
+        {"type": "node", "id": 7, "lat": 47.0, "lon": 8.0, "tags": {"emergency": "defibrillator"}},
+        {"type": "way", "id": 11, "center": {"lat": 46.5, "lon": 7.5}, "tags": {"emergency": "defibrillator"}},
+    ]}
+    features = {f["id"]: f for f in convert(data)}
+    assert features["node/7"]["properties"] == {"emergency": "defibrillator", "id": "node/7"}
+    assert features["way/11"]["geometry"]["coordinates"] == [7.5, 46.5]
+
+
+def test_empty_collection():
+    assert dumps_geojson(convert({"elements": []})) == CANONICAL_HEADER + "]}\n"
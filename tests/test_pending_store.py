@@ -0,0 +1,135 @@
+"""Pending-Store (scripts/pending_store.py): Falten, Migrationen, keine
+unnötigen Schreibzugriffe auf die committete Datenbank."""
+
+import hashlib
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from geojson_diff_be import update_pending  # noqa: E402
+from pending_store import SCHEMA_VERSION, PendingStore  # noqa: E402
+
+
+def entry(key="node/1", fields=(), detected_at="2026-10-12T10:00:00+00:00", **extra):
+    return {"key": key, "name": "Gemeindehaus", "address": None, "lon": 8.5, "lat": 47.0,
+            "fields": [list(f) for f in fields], "detected_at": detected_at, **extra}
+
+
+def file_hash(path) -> str:
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+def test_opening_current_store_does_not_write(tmp_path):
+    path = str(tmp_path / "pending_changes_be.sqlite")
+    with PendingStore(path) as store:
+        store.upsert([entry(fields=[("name", "A", "B")])])
+    before = file_hash(path)
+
+    with PendingStore(path) as store:
+        store.upsert([])
+    with PendingStore(path, readonly=True) as store:
+        assert store.count() == 1
+        assert store.entries()[0]["fields"] == [("name", "A", "B")]
+    assert update_pending(path, []) == 1
+    assert file_hash(path) == before
+
+
+def test_readonly_missing_store_is_empty(tmp_path):
+    path = tmp_path / "pending_changes_be.sqlite"
+    with PendingStore(str(path), readonly=True) as store:
+        assert store.count() == 0 and store.entries() == []
+    assert not path.exists()
+
+
+def test_fold_keeps_first_old_and_last_new(tmp_path):
+    with PendingStore(str(tmp_path / "p.sqlite")) as store:
+        store.upsert([
+            entry(fields=[("name", "A", "B")]),
+            entry(fields=[("name", "B", "C"), ("operator", None, "Gemeinde")],
+                  detected_at="2026-10-13T10:00:00+00:00"),
+        ])
+        (e,) = store.entries()
+    assert e["fields"] == [("name", "A", "C"), ("operator", None, "Gemeinde")]
+    assert e["changes"] == ["name: 'A' → 'C'", "operator: 'None' → 'Gemeinde'"]
+    assert (e["first_detected_at"], e["detected_at"]) == ("2026-10-12T10:00:00+00:00", "2026-10-13T10:00:00+00:00")
+
+
+def test_revert_drops_field_and_entry(tmp_path):
+    with PendingStore(str(tmp_path / "p.sqlite")) as store:
+        store.upsert([
+            entry(fields=[("name", "A", "B"), ("access", "yes", "private")]),
+            entry(fields=[("name", "B", "A")]),
+        ])
+        assert [e["fields"] for e in store.entries()] == [[("access", "yes", "private")]]
+        store.upsert([entry(fields=[("access", "private", "yes")])])
+        assert store.count() == 0
+
+
+def test_add_then_remove(tmp_path):
+    with PendingStore(str(tmp_path / "p.sqlite")) as store:
+        store.upsert([entry(fields=[("phone", None, "+41 44 000 00 00")])])
+        assert store.count() == 1
+        store.upsert([entry(fields=[("phone", "+41 44 000 00 00", None)])])
+        assert store.count() == 0 and store.entries() == []
+
+
+def test_position_is_folded_like_a_field(tmp_path):
+    with PendingStore(str(tmp_path / "p.sqlite")) as store:
+        store.upsert([
+            entry(fields=[("position", [8.5, 47.0], [8.5, 47.001])]),
+            entry(fields=[("position", [8.5, 47.001], [8.5, 47.002])]),
+        ])
+        (e,) = store.entries()
+    assert e["fields"] == [("position", [8.5, 47.0], [8.5, 47.002])]
+
+
+def test_migrates_v1_schema(tmp_path):
+    path = tmp_path / "p.sqlite"
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE pending (key TEXT PRIMARY KEY, name TEXT, address TEXT, lon REAL, "
+               "lat REAL, changes TEXT, detected_at TEXT)")
+    db.executemany("INSERT INTO pending VALUES (?, ?, ?, ?, ?, ?, ?)", [
+        ("node/1", "Schule", None, 8.5, 47.0, json.dumps(["name: 'Alt' → 'Schule'", "nicht lesbar"]),
+         "2026-10-12T10:00:00+00:00"),
+        ("node/2", "Bad", None, 8.6, 47.1, json.dumps(["access: 'None' → 'yes'"]), "2026-10-12T11:00:00+00:00"),
+    ])
+    db.commit()
+    db.close()
+
+    with PendingStore(str(path)) as store:
+        entries = store.entries()
+    assert [(e["key"], e["fields"]) for e in entries] == [
+        ("node/1", [("name", "Alt", "Schule")]),
+        ("node/2", [("access", None, "yes")]),
+    ]
+    db = sqlite3.connect(path)
+    assert db.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    db.close()
+
+
+def test_migrates_legacy_json(tmp_path):
+    path = tmp_path / "pending_changes_be.sqlite"
+    legacy = tmp_path / "pending_changes_be.json"
+    legacy.write_text(json.dumps([
+        entry(fields=[("name", "A", "B")]),
+        {**entry(key="node/2"), "fields": None, "changes": ["operator: 'X' → 'Y'"]},
+        # Pro Schlüssel gilt der letzte Eintrag, hier gefaltet zurück auf A
+        entry(fields=[("name", "B", "A")], detected_at="2026-10-13T10:00:00+00:00"),
+    ]), encoding="utf-8")
+
+    # Auch readonly: die Migration braucht Schreibzugriff und läuft trotzdem
+    with PendingStore(str(path), readonly=True) as store:
+        assert [(e["key"], e["fields"]) for e in store.entries()] == [("node/2", [("operator", "X", "Y")])]
+    assert not legacy.exists() and path.exists()
+
+
+def test_broken_legacy_json_is_dropped(tmp_path):
+    path = tmp_path / "pending_changes_be.sqlite"
+    legacy = tmp_path / "pending_changes_be.json"
+    legacy.write_text("{kaputt", encoding="utf-8")
+    with PendingStore(str(path)) as store:
+        assert store.count() == 0
+    assert not legacy.exists()
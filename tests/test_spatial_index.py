@@ -0,0 +1,81 @@
+"""KDTree gegen Brute Force mit haversine_m, auch fern der Referenzbreite."""
+
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from spatial_index import KDTree, haversine_m  # noqa: E402
+
+N_POINTS = 10_000
+N_QUERIES = 60
+
+
+@pytest.fixture(scope="module")
+def points():
+    rng = random.Random(42)
+    # Etwas grösser als die Schweiz, damit die Ränder (45.8 / 47.8) drin sind
+    return [(rng.uniform(5.5, 10.8), rng.uniform(45.6, 48.0)) for _ in range(N_POINTS)]
+
+
+@pytest.fixture(scope="module")
+def tree(points):
+    return KDTree(points)
+
+
+def brute_force(points, lon, lat):
+    lons, lats = zip(*points)
+    distances = haversine_m([lon] * len(points), [lat] * len(points), lons, lats)
+    return sorted(zip(distances, range(len(points))))
+
+
+def queries(seed):
+    rng = random.Random(seed)
+    for _ in range(N_QUERIES):
+        yield rng.uniform(5.9, 10.5), rng.choice((45.85, 47.75, rng.uniform(45.8, 47.8)))
+
+
+@pytest.mark.parametrize("radius_m", [250, 3000])
+def test_within_matches_brute_force(points, tree, radius_m):
+    for lon, lat in queries(radius_m):
+        expected = {i for d, i in brute_force(points, lon, lat) if d <= radius_m}
+        result = tree.within(lon, lat, radius_m)
+        assert {i for i, _ in result} == expected
+        assert all(d <= radius_m for _, d in result)
+
+
+@pytest.mark.parametrize("k", [1, 5, 20])
+def test_nearest_matches_brute_force(points, tree, k):
+    for lon, lat in queries(k):
+        expected = brute_force(points, lon, lat)[:k]
+        result = tree.nearest(lon, lat, k)
+        assert [d for _, d in result] == pytest.approx([d for d, _ in expected], abs=1e-6)
+        # Gleichstände ausgenommen, müssen es dieselben Punkte sein
+        assert {i for i, _ in result} == {i for _, i in expected}
+
+
+def test_nearest_with_filter(points, tree):
+    accept = lambda i: i % 3 == 0  # noqa: E731
+    for lon, lat in queries(7):
+        expected = [(d, i) for d, i in brute_force(points, lon, lat) if accept(i)][:5]
+        assert [i for i, _ in tree.nearest(lon, lat, 5, accept)] == [i for _, i in expected]
+
+
+def test_far_from_reference_latitude():
+    # Kleine Wolke bei 60° N: die alte feste Projektion verzerrte hier ~40%
+    rng = random.Random(1)
+    pts = [(rng.uniform(10.0, 10.2), rng.uniform(59.9, 60.1)) for _ in range(2000)]
+    tree = KDTree(pts)
+    for _ in range(50):
+        lon, lat = rng.uniform(10.0, 10.2), rng.uniform(59.9, 60.1)
+        expected = {i for d, i in brute_force(pts, lon, lat) if d <= 2000}
+        assert {i for i, _ in tree.within(lon, lat, 2000)} == expected
+
+
+def test_empty_and_degenerate():
+    assert KDTree([]).nearest(8.5, 47.3, 3) == []
+    assert KDTree([(8.5, 47.3)]).nearest(8.5, 47.3, 0) == []
+    assert KDTree([(8.5, 47.3)]).nearest(8.5, 47.3, 3) == [(0, 0.0)]